@@ -1,7 +1,7 @@
 """
 Admin API routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import Optional
@@ -10,6 +10,7 @@ from app.api.deps import get_current_admin_user
 from app.models.user import User
 from app.models.video import Video
 from app.models.message import Message
+from app.models.conversation_summary import ConversationSummary
 from app.models.suspension import Suspension
 from app.models.rating import RatingCriterion
 from app.schemas.user import UserCreate
@@ -20,6 +21,12 @@ from app.core.pdf_generator import create_champions_pdf
 from app.core.device import unbind_device
 from app.core.aws import delete_file_from_s3
 from app.core.cache import unapproved_cache
+from app.core.pagination import paginate, MAX_PAGE_LIMIT
+from app.core.principal_cache import invalidate_user
+from app.core.transcode_queue import queue_stats, job_usage_summary
+from app.core.video_assets import release_asset, delete_asset_files
+from app.core.storage_lifecycle import run_storage_lifecycle
+from app.models.transcode_job import TranscodeJob
 from app.models.telegram_settings import TelegramSettings
 from app.models.device_binding import DeviceBinding
 from app.models.comment import Comment
@@ -27,6 +34,7 @@ from app.models.video import VideoLike
 from app.models.rating import DynamicVideoRating
 from app.models.post import Post
 from app.models.star_bank import StarBank
+from app.models.star_total import UserStarTotal
 from datetime import datetime, timedelta
 from collections import defaultdict
 from sqlalchemy import and_
@@ -44,13 +52,10 @@ async def get_admin_stats(
     total_students = db.query(User).filter(User.role == 'student').count()
     
     # Use cache for pending videos count
-    cache_key = 'unapproved_videos'
-    cached_value = unapproved_cache.get(cache_key)
-    if cached_value is not None:
-        pending_videos = cached_value
-    else:
-        pending_videos = db.query(Video).filter(Video.is_approved == False).count()
-        unapproved_cache.set(cache_key, pending_videos)
+    pending_videos = await unapproved_cache.get_or_load_async(
+        'unapproved_videos',
+        lambda: db.query(Video).filter(Video.is_approved == False).count()
+    )
     
     unread_messages = db.query(Message).filter(Message.is_read == False).count()
     
@@ -70,6 +75,50 @@ async def get_ops_metrics(
     return request_metrics.snapshot()
 
 
+@router.get("/ops/transcoding")
+async def get_transcoding_summary(
+    days: int = Query(7, ge=1, le=90),
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Transcoding queue state, live progress and resource usage (admin only)"""
+    running = db.query(TranscodeJob, Video).join(
+        Video, TranscodeJob.video_id == Video.id
+    ).filter(TranscodeJob.status == 'running').order_by(TranscodeJob.started_at).all()
+    
+    return {
+        "queue": queue_stats(db),
+        "usage": job_usage_summary(db, days),
+        "running": [
+            {
+                "job_id": job.id,
+                "video_id": video.id,
+                "title": video.title,
+                "attempts": job.attempts,
+                "worker": job.locked_by,
+                "started_at": job.started_at,
+                "percent": video.processing_progress,
+                "fps": video.processing_fps,
+                "speed": video.processing_speed,
+                "out_time": video.processing_out_time
+            }
+            for job, video in running
+        ]
+    }
+
+
+@router.get("/ops/storage-lifecycle")
+async def get_storage_lifecycle_report(
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Dry run of the archived video storage lifecycle: sources and HLS trees
+    the next run would reclaim, with byte totals (admin only)
+    """
+    return run_storage_lifecycle(db, dry_run=True)
+
+
 @router.get("/champions")
 async def get_champions(
     current_user: User = Depends(get_current_admin_user),
@@ -164,6 +213,9 @@ async def suspend_user(
     
     db.commit()
     
+    # Cached principals carry the suspension end date
+    invalidate_user(user)
+    
     return {
         "message": f"User suspended for {days} days",
         "end_date": end_date.isoformat()
@@ -174,10 +226,12 @@ async def suspend_user(
 async def get_students_report(
     class_name: Optional[str] = None,
     section_name: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
-    """Get students report"""
+    """Get students report, paginated by username when `limit` is given"""
     query = db.query(User).filter(User.role == 'student')
     
     if class_name:
@@ -185,9 +239,15 @@ async def get_students_report(
     if section_name:
         query = query.filter(User.section_name == section_name)
     
-    students = query.all()
+    if limit is None:
+        students = query.all()
+        next_cursor = None
+    else:
+        students, next_cursor = paginate(
+            query, [(User.username, False), (User.id, False)], limit, cursor
+        )
     
-    return [
+    result = [
         {
             "id": s.id,
             "username": s.username,
@@ -198,6 +258,10 @@ async def get_students_report(
         }
         for s in students
     ]
+    
+    if limit is None:
+        return result
+    return {"items": result, "next_cursor": next_cursor}
 
 
 @router.post("/telegram/send-champions")
@@ -351,11 +415,13 @@ async def start_new_year(
         # 1. Delete all transient content
         db.query(Video).delete()
         db.query(Message).delete()
+        db.query(ConversationSummary).delete()
         db.query(Comment).delete()
         db.query(VideoLike).delete()
         db.query(DynamicVideoRating).delete()
         db.query(Post).delete()
         db.query(StarBank).delete()
+        db.query(UserStarTotal).delete()
         
         # 2. Reset Student Data
         students = db.query(User).filter(User.role == 'student').all()
@@ -440,6 +506,9 @@ async def lift_suspension(
     db.query(Suspension).filter(Suspension.user_id == user_id).delete()
     db.commit()
     
+    # Cached principals carry the suspension end date
+    invalidate_user(student)
+    
     return {
         "status": "success",
         "message": "تم رفع الإيقاف عن الطالب."
@@ -497,8 +566,10 @@ async def delete_student(
         raise HTTPException(status_code=404, detail="Student not found")
     
     try:
-        # 1. Delete all videos and their files
+        # 1. Delete all videos and their files (files shared with other
+        # users' identical uploads are kept until their last video goes)
         videos = db.query(Video).filter(Video.user_id == user_id).all()
+        unused_files = []
         for video in videos:
             # Delete comments on this video
             db.query(Comment).filter(Comment.video_id == video.id).delete()
@@ -506,9 +577,8 @@ async def delete_student(
             db.query(VideoLike).filter(VideoLike.video_id == video.id).delete()
             # Delete ratings on this video
             db.query(DynamicVideoRating).filter(DynamicVideoRating.video_id == video.id).delete()
-            # Delete video file from S3
-            if video.filepath:
-                delete_file_from_s3(video.filepath)
+            # Release the stored source/HLS output
+            unused_files.append(release_asset(db, video))
         
         # Delete videos from database
         db.query(Video).filter(Video.user_id == user_id).delete()
@@ -516,7 +586,12 @@ async def delete_student(
         # 2. Delete comments made by student
         db.query(Comment).filter(Comment.user_id == user_id).delete()
         
-        # 3. Delete likes made by student
+        # 3. Delete likes made by student (and keep like counters in sync)
+        liked_video_ids = db.query(VideoLike.video_id).filter(VideoLike.user_id == user_id)
+        db.query(Video).filter(Video.id.in_(liked_video_ids.scalar_subquery())).update(
+            {Video.likes_count: Video.likes_count - 1},
+            synchronize_session=False
+        )
         db.query(VideoLike).filter(VideoLike.user_id == user_id).delete()
         
         # 4. Delete messages
@@ -524,6 +599,9 @@ async def delete_student(
         db.query(Message).filter(
             (Message.sender_id == user_id) | (Message.receiver_id == user_id)
         ).delete()
+        db.query(ConversationSummary).filter(
+            (ConversationSummary.user_low_id == user_id) | (ConversationSummary.user_high_id == user_id)
+        ).delete()
         
         # 5. Delete suspensions
         db.query(Suspension).filter(Suspension.user_id == user_id).delete()
@@ -542,12 +620,16 @@ async def delete_student(
         # 9. Delete star bank
         from app.models.star_bank import StarBank
         db.query(StarBank).filter(StarBank.user_id == user_id).delete()
+        db.query(UserStarTotal).filter(UserStarTotal.user_id == user_id).delete()
         
         # 10. Delete student account
         db.delete(student)
         
         db.commit()
         
+        for files in unused_files:
+            delete_asset_files(files)
+        
         return {
             "status": "success",
             "message": "تم حذف حساب الطالب بنجاح"
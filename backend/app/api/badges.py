@@ -14,6 +14,7 @@ from app.models.video import Video
 from app.models.rating import DynamicVideoRating, RatingCriterion
 from app.models.star_bank import StarBank
 from app.services.champion_service import get_week_start_date_saturday, calculate_weekly_stars
+from app.services import leaderboard_service
 
 router = APIRouter(prefix="/api/badges", tags=["badges"])
 
@@ -134,43 +135,5 @@ async def get_leaderboard(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get star leaderboard"""
-    # Query total stars per user
-    query = db.query(
-        Video.user_id,
-        func.sum(func.cast(DynamicVideoRating.is_awarded, Integer)).label('total_stars')
-    ).join(
-        DynamicVideoRating, Video.id == DynamicVideoRating.video_id
-    ).filter(
-        Video.is_approved == True
-    ).group_by(
-        Video.user_id
-    ).order_by(
-        func.sum(func.cast(DynamicVideoRating.is_awarded, Integer)).desc()
-    )
-    
-    results = query.limit(limit).all()
-    
-    # Get user details
-    leaderboard = []
-    for rank, (user_id, total_stars) in enumerate(results, 1):
-        user = db.query(User).filter(User.id == user_id).first()
-        if user:
-            # Apply filters if provided
-            if class_name and user.class_name != class_name:
-                continue
-            if section_name and user.section_name != section_name:
-                continue
-            
-            leaderboard.append({
-                "rank": rank,
-                "user_id": user_id,
-                "username": user.username,
-                "full_name": user.full_name,
-                "class_name": user.class_name,
-                "section_name": user.section_name,
-                "total_stars": total_stars or 0,
-                "profile_image": user.profile_image
-            })
-    
-    return leaderboard
+    """Get star leaderboard (read from materialized user_star_totals)"""
+    return leaderboard_service.get_leaderboard(db, class_name, section_name, limit)
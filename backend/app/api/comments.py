@@ -1,15 +1,16 @@
 """
 Comments API routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional
 from app.database import get_db
 from app.api.deps import get_current_active_user, get_current_admin_user
 from app.models.user import User
 from app.models.comment import Comment
 from app.models.video import Video
 from app.schemas.comment import Comment as CommentSchema, CommentCreate, CommentUpdate
+from app.core.pagination import paginate, MAX_PAGE_LIMIT
 
 router = APIRouter(prefix="/api/comments", tags=["comments"])
 
@@ -17,22 +18,32 @@ router = APIRouter(prefix="/api/comments", tags=["comments"])
 @router.get("/video/{video_id}")
 async def get_video_comments(
     video_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get comments for a video"""
+    """Get comments for a video, paginated when `limit` is given"""
     video = db.query(Video).filter(Video.id == video_id).first()
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
     
-    comments = db.query(Comment).filter(Comment.video_id == video_id).order_by(
-        Comment.is_pinned.desc(), Comment.timestamp.asc()
-    ).all()
+    query = db.query(Comment).options(joinedload(Comment.user)).filter(Comment.video_id == video_id)
+    # Pinned comments first, then oldest to newest
+    order = [(Comment.is_pinned, True), (Comment.timestamp, False), (Comment.id, False)]
+    
+    if limit is None:
+        comments = query.order_by(
+            Comment.is_pinned.desc(), Comment.timestamp.asc(), Comment.id.asc()
+        ).all()
+        next_cursor = None
+    else:
+        comments, next_cursor = paginate(query, order, limit, cursor)
     
     # Add user information to comments
     result = []
     for comment in comments:
-        user = db.query(User).filter(User.id == comment.user_id).first()
+        user = comment.user
         comment_dict = {
             "id": comment.id,
             "content": comment.content,
@@ -51,7 +62,9 @@ async def get_video_comments(
         }
         result.append(comment_dict)
     
-    return result
+    if limit is None:
+        return result
+    return {"items": result, "next_cursor": next_cursor}
 
 
 @router.post("", response_model=CommentSchema)
@@ -6,18 +6,19 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.core.security import decode_token
+from app.core.principal_cache import Principal, get_cached_principal, cache_principal
 from app.models.user import User
 from app.schemas.auth import TokenData
 
 security = HTTPBearer()
 
 
-async def get_current_user(
+async def get_current_principal(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> User:
+) -> Principal:
     """
-    Get current authenticated user from JWT token
+    Authenticate the JWT and resolve the user with their suspension state
     Checks session_revocation_token to ensure session is still valid
     """
     credentials_exception = HTTPException(
@@ -40,13 +41,21 @@ async def get_current_user(
     if username is None:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
-    
-    # Check session revocation token
     # The token should contain the session_revocation_token at the time it was issued
     token_revocation = payload.get("revocation_token", 0)
+    
+    # Principals are cached per (sub, revocation_token); revoking sessions
+    # updates the user row, which invalidates the cached entry
+    principal = get_cached_principal(db, username, token_revocation)
+    cached = principal is not None
+    if not cached:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            raise credentials_exception
+        principal = Principal(user=user)
+    user = principal.user
+    
+    # Check session revocation token
     if user.session_revocation_token and user.session_revocation_token > token_revocation:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -54,39 +63,61 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    return user
+    if not cached:
+        principal.suspended_until = _get_active_suspension_end(db, user.id)
+        cache_principal(user, token_revocation, principal.suspended_until)
+    
+    return principal
 
 
-async def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal)
 ) -> User:
     """
-    Get current active user (not suspended)
-    Also checks profile completion for students
+    Get current authenticated user from JWT token
     """
-    # Check if user is suspended
+    return principal.user
+
+
+def _get_active_suspension_end(db: Session, user_id: int):
+    """End date of the user's active suspension, or None"""
     from app.models.suspension import Suspension
     from datetime import datetime
     from sqlalchemy import and_
     
     active_suspension = db.query(Suspension).filter(
         and_(
-            Suspension.user_id == current_user.id,
+            Suspension.user_id == user_id,
             Suspension.end_date > datetime.utcnow()
         )
-    ).first()
+    ).order_by(Suspension.end_date.desc()).first()
     
-    if active_suspension:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail=f"User is suspended until {active_suspension.end_date}"
-        )
+    return active_suspension.end_date if active_suspension else None
+
+
+async def get_current_active_user(
+    principal: Principal = Depends(get_current_principal)
+) -> User:
+    """
+    Get current active user (not suspended)
+    Also checks profile completion for students
+    """
+    # Check if user is suspended (end date resolved with the principal)
+    from datetime import datetime, timezone
+    
+    suspended_until = principal.suspended_until
+    if suspended_until is not None:
+        now = datetime.now(timezone.utc) if suspended_until.tzinfo else datetime.utcnow()
+        if suspended_until > now:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"User is suspended until {suspended_until}"
+            )
     
     # Check profile completion for students (except for profile update endpoint)
     # This check will be done at the route level where needed
     
-    return current_user
+    return principal.user
 
 
 async def get_current_admin_user(
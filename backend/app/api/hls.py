@@ -1,19 +1,174 @@
 """
 HLS Streaming API routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse, Response
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import Response, RedirectResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from typing import Optional
+import asyncio
 import os
+import re
 
 from app.database import get_db
-from app.api.deps import get_current_active_user
+from app.api.deps import get_current_active_user, get_current_principal
 from app.models.user import User
 from app.models.video import Video
-from app.core.hls_processor import hls_processor
+from app.core.hls_processor import hls_processor, HLS_THUMBNAIL, HLS_SPRITE, HLS_PREVIEW_TRACK
+from app.core.transcode_queue import enqueue_transcode, get_video_job
+from app.core.aws import HAS_AWS_CREDENTIALS, generate_presigned_url, get_s3_object_bytes
+from app.core.hls_storage import remote_storage_enabled, hls_key, SEGMENT_CACHE_CONTROL, PLAYLIST_CACHE_CONTROL
+from app.core.hls_delivery import hls_file_response
+from app.core.security import create_hls_token, verify_hls_token
+from app.core.video_assets import reset_asset
+from app.core.storage_lifecycle import rehydrate_output, mark_restored, output_is_cold
+from app.config import settings
 
 router = APIRouter(prefix="/api/hls", tags=["hls"])
 
+RENDITION_NAME = re.compile(r"^\d{3,4}p$")
+
+# Files served from the top of a video's HLS directory besides segments
+PREVIEW_MEDIA_TYPES = {
+    HLS_THUMBNAIL: "image/jpeg",
+    HLS_SPRITE: "image/jpeg",
+    HLS_PREVIEW_TRACK: "text/vtt",
+}
+
+# Segments fetched with bearer auth instead of a signed URL are not versioned
+AUTHENTICATED_CACHE_CONTROL = "private, max-age=86400"
+
+# Poster images are public (used in <img> tags, like /hls/ on local storage);
+# short lifetime because reprocessing replaces them
+THUMBNAIL_CACHE_CONTROL = "public, max-age=3600"
+
+# Playlist and segment routes also accept signed URLs without a bearer token
+optional_security = HTTPBearer(auto_error=False)
+
+
+def _get_accessible_video(video_id: int, current_user: User, db: Session) -> Video:
+    video = db.query(Video).filter(Video.id == video_id).first()
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    
+    # Check if video is accessible
+    if not video.is_approved and video.user_id != current_user.id and current_user.role != 'admin':
+        raise HTTPException(status_code=403, detail="Video not accessible")
+    return video
+
+
+def _output_id(video: Video) -> int:
+    """Id of the HLS output directory (shared by identical uploads)"""
+    if video.asset_id and video.asset:
+        return video.asset.output_video_id
+    return video.id
+
+
+def _output_version(video_id: int) -> int:
+    """Generation of a video's HLS output (changes when it is reprocessed)"""
+    try:
+        return int(os.stat(hls_processor.get_playlist_path(video_id)).st_mtime)
+    except OSError:
+        return 0
+
+
+def _sign_playlist(content: str, token: str, uri_prefix: str = "") -> str:
+    """
+    Append the signed token to every URI line of a playlist
+    uri_prefix makes relative URIs absolute (output of another video id).
+    """
+    lines = []
+    for line in content.splitlines():
+        if line and not line.startswith("#") and "?" not in line:
+            line = f"{uri_prefix}{line}?token={token}"
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+async def _authorize_file_request(
+    video_id: int,
+    token: Optional[str],
+    credentials: Optional[HTTPAuthorizationCredentials],
+    db: Session
+) -> Optional[str]:
+    """
+    Authorize a variant playlist, segment or preview request
+    
+    A valid signed token is checked without the database. Otherwise the
+    bearer token and video access are checked like for the master playlist.
+    
+    Returns:
+        The valid signed token, or None when authorized by bearer token
+    """
+    if token and verify_hls_token(video_id, token):
+        return token
+    if credentials is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    current_user = await get_current_active_user(await get_current_principal(credentials, db))
+    _get_accessible_video(video_id, current_user, db)
+    return None
+
+
+def _remote_playlist(
+    video_id: int,
+    relative_path: str,
+    segment_prefix: Optional[str] = None,
+    token: Optional[str] = None,
+    uri_prefix: str = ""
+) -> Response:
+    """
+    Serve a playlist uploaded to S3 (HLS_STORAGE=s3)
+    With segment_prefix, segment URIs are replaced by presigned URLs so the
+    player can fetch them from a private bucket directly; otherwise (master
+    playlist) the signed token is appended to the variant playlist URIs.
+    """
+    content = get_s3_object_bytes(hls_key(video_id, relative_path))
+    if content is None:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+    
+    if segment_prefix is not None:
+        lines = []
+        for line in content.decode().splitlines():
+            if line and not line.startswith("#"):
+                line = generate_presigned_url(hls_key(video_id, segment_prefix + line)) or line
+            lines.append(line)
+        content = ("\n".join(lines) + "\n").encode()
+    elif token:
+        content = _sign_playlist(content.decode(), token, uri_prefix).encode()
+    
+    return Response(
+        content=content,
+        media_type="application/vnd.apple.mpegurl",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+def _remote_preview_track(video_id: int) -> Response:
+    """
+    Serve the WebVTT thumbnails track uploaded to S3 with the sprite
+    reference replaced by a presigned URL (keeping the #xywh= fragments)
+    """
+    content = get_s3_object_bytes(hls_key(video_id, HLS_PREVIEW_TRACK))
+    if content is None:
+        raise HTTPException(status_code=404, detail="Preview track not found")
+    
+    sprite_url = generate_presigned_url(hls_key(video_id, HLS_SPRITE))
+    if sprite_url:
+        content = content.decode().replace(f"{HLS_SPRITE}#", f"{sprite_url}#").encode()
+    return Response(content=content, media_type="text/vtt")
+
+
+def _remote_redirect(video_id: int, relative_path: str) -> RedirectResponse:
+    """Redirect to a presigned URL of an uploaded HLS file"""
+    url = generate_presigned_url(hls_key(video_id, relative_path))
+    if not url:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    return RedirectResponse(url=url)
+
 
 @router.get("/{video_id}/status")
 async def get_processing_status(
@@ -29,17 +184,43 @@ async def get_processing_status(
         raise HTTPException(status_code=404, detail="Video not found")
     
     # Check actual file status
-    file_status = hls_processor.get_processing_status(video_id)
+    output_id = _output_id(video)
+    file_status = hls_processor.get_processing_status(output_id)
+    if file_status["status"] == "pending" and video.processing_status == 'ready' and remote_storage_enabled():
+        # Output was uploaded to object storage and removed locally
+        file_status = {"status": "ready", "video_id": video_id, "storage": "s3"}
+    job = get_video_job(db, video_id)
     
     return {
         "video_id": video_id,
         "processing_status": video.processing_status,
+        "progress_percent": 100 if video.processing_status == 'ready' else video.processing_progress,
+        "progress": {
+            "fps": video.processing_fps,
+            "speed": video.processing_speed,
+            "out_time": video.processing_out_time
+        },
+        "streamable": video.processing_status == 'ready' or (
+            video.processing_status == 'processing' and hls_processor.is_streamable(output_id)
+        ),
         "hls_path": video.hls_path,
+        "storage_tier": video.storage_tier,
         "thumbnail_path": video.thumbnail_path,
-        "file_status": file_status
+        "preview_track_url": file_status.get("preview_track_url"),
+        "file_status": file_status,
+        "job": {
+            "status": job.status,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "last_error": job.last_error,
+            "wall_seconds": job.wall_seconds,
+            "cpu_seconds": job.cpu_seconds,
+            "output_bytes": job.output_bytes
+        } if job else None
     }
 
 
+@router.get("/{video_id}/master.m3u8")
 @router.get("/{video_id}/playlist.m3u8")
 async def get_playlist(
     video_id: int,
@@ -47,32 +228,54 @@ async def get_playlist(
     db: Session = Depends(get_db)
 ):
     """
-    Get HLS playlist file
+    Get HLS master playlist (variant playlists are resolved relative to it)
+    Variant URIs carry a signed, expiring token, so the variant playlists and
+    segments are then served without a database lookup.
     Note: In production, this should be served directly by Nginx
     """
-    video = db.query(Video).filter(Video.id == video_id).first()
-    if not video:
-        raise HTTPException(status_code=404, detail="Video not found")
-    
-    # Check if video is accessible
-    if not video.is_approved and video.user_id != current_user.id and current_user.role != 'admin':
-        raise HTTPException(status_code=403, detail="Video not accessible")
+    video = _get_accessible_video(video_id, current_user, db)
     
-    # Check if HLS is ready
-    if video.processing_status != 'ready':
+    # Check if HLS is ready; while transcoding, the EVENT playlist is
+    # served as soon as FFmpeg has published the master playlist
+    output_id = _output_id(video)
+    streaming_early = video.processing_status == 'processing' and hls_processor.is_streamable(output_id)
+    if video.processing_status != 'ready' and not streaming_early:
         raise HTTPException(
             status_code=202, 
             detail=f"Video is still processing: {video.processing_status}"
         )
     
-    playlist_path = hls_processor.get_playlist_path(video_id)
+    output_missing = not os.path.isdir(hls_processor.get_video_output_dir(output_id))
+    if output_missing and output_is_cold(db, video):
+        # Archived long ago: bring the tree back from cold storage first
+        try:
+            await asyncio.to_thread(rehydrate_output, output_id)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Could not restore video from archive storage: {e}")
+        mark_restored(db, video)
+        db.commit()
+    
+    # Deduplicated uploads point at the output directory of the first
+    # video with the same content, through absolute, signed URIs
+    uri_prefix = f"/api/hls/{output_id}/" if output_id != video_id else ""
+    
+    playlist_path = hls_processor.get_playlist_path(output_id)
     if not os.path.exists(playlist_path):
+        if remote_storage_enabled():
+            return await asyncio.to_thread(
+                _remote_playlist,
+                output_id, "master.m3u8", token=create_hls_token(output_id), uri_prefix=uri_prefix
+            )
         raise HTTPException(status_code=404, detail="Playlist not found")
     
-    return FileResponse(
-        playlist_path,
+    with open(playlist_path) as f:
+        content = f.read()
+    token = create_hls_token(output_id, _output_version(output_id))
+    
+    return Response(
+        content=_sign_playlist(content, token, uri_prefix),
         media_type="application/vnd.apple.mpegurl",
-        headers={"Cache-Control": "no-cache"}
+        headers={"Cache-Control": PLAYLIST_CACHE_CONTROL}
     )
 
 
@@ -80,42 +283,119 @@ async def get_playlist(
 async def get_segment(
     video_id: int,
     segment: str,
-    current_user: User = Depends(get_current_active_user),
+    request: Request,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
     db: Session = Depends(get_db)
 ):
     """
-    Get HLS segment file (.ts)
+    Get HLS segment file (.ts), thumbnail, preview sprite or WebVTT thumbnails track
+    Authorized by the signed token from the playlist or by bearer token;
+    the thumbnail is public.
     Note: In production, this should be served directly by Nginx
     """
     # Validate segment filename
-    if not segment.endswith('.ts') and segment != 'thumbnail.jpg':
+    if not segment.endswith('.ts') and segment not in PREVIEW_MEDIA_TYPES:
         raise HTTPException(status_code=400, detail="Invalid segment request")
     
-    video = db.query(Video).filter(Video.id == video_id).first()
-    if not video:
-        raise HTTPException(status_code=404, detail="Video not found")
-    
-    # Check access
-    if not video.is_approved and video.user_id != current_user.id and current_user.role != 'admin':
-        raise HTTPException(status_code=403, detail="Video not accessible")
+    is_thumbnail = segment == HLS_THUMBNAIL
+    signed_token = None
+    if not is_thumbnail:
+        signed_token = await _authorize_file_request(video_id, token, credentials, db)
     
     segment_path = os.path.join(hls_processor.get_video_output_dir(video_id), segment)
     if not os.path.exists(segment_path):
+        if remote_storage_enabled():
+            if segment == HLS_PREVIEW_TRACK:
+                return await asyncio.to_thread(_remote_preview_track, video_id)
+            return await asyncio.to_thread(_remote_redirect, video_id, segment)
+        raise HTTPException(status_code=404, detail="Segment not found")
+    
+    if segment == HLS_PREVIEW_TRACK:
+        # Sprite references need the token too
+        with open(segment_path) as f:
+            content = f.read()
+        sprite_token = signed_token or create_hls_token(video_id, _output_version(video_id))
+        content = content.replace(f"{HLS_SPRITE}#", f"{HLS_SPRITE}?token={sprite_token}#")
+        return Response(content=content, media_type="text/vtt", headers={"Cache-Control": PLAYLIST_CACHE_CONTROL})
+    
+    if is_thumbnail:
+        cache_control = THUMBNAIL_CACHE_CONTROL
+    else:
+        cache_control = SEGMENT_CACHE_CONTROL if signed_token else AUTHENTICATED_CACHE_CONTROL
+    return hls_file_response(
+        request,
+        hls_processor.output_base_dir,
+        f"{video_id}/{segment}",
+        PREVIEW_MEDIA_TYPES.get(segment, "video/mp2t"),
+        cache_control
+    )
+
+
+@router.get("/{video_id}/{rendition}/{filename}")
+async def get_rendition_file(
+    video_id: int,
+    rendition: str,
+    filename: str,
+    request: Request,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db)
+):
+    """
+    Get a rendition's variant playlist or segment (e.g. 480p/segment_000.ts)
+    Authorized by the signed token from the master playlist or by bearer token.
+    Note: In production, this should be served directly by Nginx
+    """
+    # Validate rendition and file names
+    if not RENDITION_NAME.match(rendition):
+        raise HTTPException(status_code=400, detail="Invalid rendition")
+    if not filename.endswith('.ts') and filename != 'playlist.m3u8':
+        raise HTTPException(status_code=400, detail="Invalid segment request")
+    
+    signed_token = await _authorize_file_request(video_id, token, credentials, db)
+    
+    file_path = os.path.join(hls_processor.get_video_output_dir(video_id), rendition, filename)
+    if not os.path.exists(file_path):
+        if remote_storage_enabled():
+            if filename.endswith('.m3u8'):
+                return await asyncio.to_thread(
+                    _remote_playlist, video_id, f"{rendition}/{filename}", segment_prefix=f"{rendition}/"
+                )
+            return await asyncio.to_thread(_remote_redirect, video_id, f"{rendition}/{filename}")
         raise HTTPException(status_code=404, detail="Segment not found")
     
-    media_type = "video/mp2t" if segment.endswith('.ts') else "image/jpeg"
-    return FileResponse(segment_path, media_type=media_type)
+    if filename.endswith('.m3u8'):
+        # Segment URIs carry the same token (a fresh one for bearer requests)
+        with open(file_path) as f:
+            content = f.read()
+        segment_token = signed_token or create_hls_token(video_id, _output_version(video_id))
+        return Response(
+            content=_sign_playlist(content, segment_token),
+            media_type="application/vnd.apple.mpegurl",
+            headers={"Cache-Control": PLAYLIST_CACHE_CONTROL}
+        )
+    
+    return hls_file_response(
+        request,
+        hls_processor.output_base_dir,
+        f"{video_id}/{rendition}/{filename}",
+        "video/mp2t",
+        SEGMENT_CACHE_CONTROL if signed_token else AUTHENTICATED_CACHE_CONTROL
+    )
 
 
 @router.post("/{video_id}/reprocess")
 async def reprocess_video(
     video_id: int,
+    force: bool = False,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Re-process a video to HLS (admin only)
-    Useful if processing failed
+    Useful if processing failed. A video whose content was already encoded
+    successfully is relinked to that output unless force is set.
     """
     if current_user.role != 'admin':
         raise HTTPException(status_code=403, detail="Admin only")
@@ -124,26 +404,46 @@ async def reprocess_video(
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
     
-    if not os.path.exists(video.filepath):
-        raise HTTPException(status_code=404, detail="Source video file not found")
+    # Stored paths are relative to UPLOAD_FOLDER; fall back to S3 keys
+    source_path = video.filepath
+    if not os.path.isabs(source_path):
+        source_path = os.path.join(settings.UPLOAD_FOLDER, video.filepath)
+    if not os.path.exists(source_path):
+        if not HAS_AWS_CREDENTIALS:
+            raise HTTPException(status_code=404, detail="Source video file not found")
+        source_path = video.filepath
+    
+    asset = video.asset if video.asset_id else None
+    output_id = _output_id(video)
     
-    # Delete existing HLS files
-    hls_processor.delete_hls_files(video_id)
+    if asset and asset.status == 'ready' and not force and (
+        hls_processor.is_streamable(output_id) or remote_storage_enabled()
+    ):
+        video.processing_status = 'ready'
+        video.processing_progress = 100
+        video.hls_path = asset.hls_path
+        video.thumbnail_path = asset.thumbnail_path
+        db.commit()
+        return {"status": "reused", "video_id": video_id}
     
-    # Reset status
+    for job_video_id in {video_id, output_id}:
+        job = get_video_job(db, job_video_id)
+        if job and job.status == 'running':
+            raise HTTPException(status_code=409, detail="Video is already being processed")
+    
+    # Delete existing HLS files (the shared output too: it is re-encoded
+    # for every video with the same content) so none of it is served as
+    # the new output
+    for old_output_id in {video_id, output_id}:
+        if not await asyncio.to_thread(hls_processor.delete_hls_files, old_output_id):
+            raise HTTPException(status_code=500, detail="Could not delete the previous HLS output")
+    if asset:
+        reset_asset(db, asset, video_id)
+    
+    # Reset status and queue ahead of regular uploads
     video.processing_status = 'pending'
     video.hls_path = None
+    enqueue_transcode(db, video_id, source_path, priority=10)
     db.commit()
     
-    # Import and start background task
-    from fastapi import BackgroundTasks
-    from app.database import SessionLocal
-    from app.core.hls_processor import process_video_background
-    import asyncio
-    
-    # Run in background
-    asyncio.create_task(
-        process_video_background(video.filepath, video_id, SessionLocal)
-    )
-    
     return {"status": "reprocessing", "video_id": video_id}
@@ -1,82 +1,102 @@
 """
 Messages API routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import insert, literal, select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
 from app.database import get_db
 from app.api.deps import get_current_active_user, get_current_admin_user
 from app.models.user import User
 from app.models.message import Message
 from app.schemas.message import Message as MessageSchema, MessageCreate
+from app.schemas.pagination import CursorPage
 from app.core.cache import unread_cache
+from app.core.pagination import paginate, MAX_PAGE_LIMIT
+from app.api.websocket import manager
+from app.services.message_service import conversation_inbox, record_messages, mark_conversation_read
 
 router = APIRouter(prefix="/api/messages", tags=["messages"])
 
 
+def _conversation_entry(row) -> dict:
+    user = row.User
+    entry = {
+        "id": user.id,
+        "username": user.username,
+        "full_name": user.full_name,
+        "profile_image": user.profile_image,
+        "role": user.role,
+        "unread_count": row.unread_count,
+        "last_message_at": row.last_message_at,
+        "last_message_preview": row.last_message_preview,
+        "last_sender_id": row.last_sender_id
+    }
+    if user.role == 'student':
+        entry["class_name"] = user.class_name
+        entry["section_name"] = user.section_name
+    return entry
+
+
 @router.get("/conversations")
 async def get_conversations(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get list of conversations"""
+    """
+    Get list of conversations, most recent activity first
+    Paginated when `limit` is given (admins only).
+    """
     if current_user.role == 'admin':
-        # Get all students
-        students = db.query(User).filter(User.role == 'student').all()
-        return [
-            {
-                "id": student.id,
-                "username": student.username,
-                "full_name": student.full_name,
-                "class_name": student.class_name,
-                "section_name": student.section_name,
-                "profile_image": student.profile_image,
-                "role": student.role,
-                "unread_count": db.query(Message).filter(
-                    Message.receiver_id == current_user.id,
-                    Message.sender_id == student.id,
-                    Message.is_read == False
-                ).count()
-            }
-            for student in students
-        ]
+        # All students with their conversation summary, in one query
+        query, order = conversation_inbox(db, current_user.id, 'student')
+        if limit is None:
+            rows = query.order_by(*[column.desc() for column, _ in order]).all()
+            return [_conversation_entry(row) for row in rows]
+        
+        rows, next_cursor = paginate(
+            query, order, limit, cursor,
+            key=lambda row: [row.last_activity, row.User.id]
+        )
+        return {"items": [_conversation_entry(row) for row in rows], "next_cursor": next_cursor}
     else:
         # Get admin
-        admin = db.query(User).filter(User.role == 'admin').first()
-        if not admin:
+        query, _ = conversation_inbox(db, current_user.id, 'admin')
+        row = query.order_by(User.id).first()
+        if not row:
             return []
-        
-        return [{
-            "id": admin.id,
-            "username": admin.username,
-            "full_name": admin.full_name,
-            "profile_image": admin.profile_image,
-            "role": admin.role,
-            "unread_count": db.query(Message).filter(
-                Message.receiver_id == current_user.id,
-                Message.sender_id == admin.id,
-                Message.is_read == False
-            ).count()
-        }]
+        return [_conversation_entry(row)]
 
 
-@router.get("/{user_id}", response_model=List[MessageSchema])
+@router.get("/{user_id}", response_model=Union[CursorPage[MessageSchema], List[MessageSchema]])
 async def get_messages(
     user_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get messages with a specific user"""
+    """Get messages with a specific user, paginated when `limit` is given"""
     # Verify user exists
     other_user = db.query(User).filter(User.id == user_id).first()
     if not other_user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Get messages between current user and other user
-    messages = db.query(Message).filter(
+    query = db.query(Message).filter(
         ((Message.sender_id == current_user.id) & (Message.receiver_id == user_id)) |
         ((Message.sender_id == user_id) & (Message.receiver_id == current_user.id))
-    ).order_by(Message.timestamp.asc()).all()
+    )
+    
+    if limit is None:
+        messages = query.order_by(Message.timestamp.asc(), Message.id.asc()).all()
+        next_cursor = None
+    else:
+        messages, next_cursor = paginate(
+            query, [(Message.timestamp, False), (Message.id, False)], limit, cursor
+        )
     
     # Mark messages as read
     db.query(Message).filter(
@@ -84,12 +104,15 @@ async def get_messages(
         Message.sender_id == user_id,
         Message.is_read == False
     ).update({"is_read": True})
+    mark_conversation_read(db, current_user.id, user_id)
     db.commit()
     
     # Invalidate cache after marking as read
     unread_cache.delete(f"unread_{current_user.id}")
     
-    return messages
+    if limit is None:
+        return messages
+    return {"items": messages, "next_cursor": next_cursor}
 
 
 @router.post("", response_model=MessageSchema)
@@ -114,6 +137,15 @@ async def send_message(
             content=message_data.content
         )
         db.add(message)
+        db.flush()
+        db.refresh(message)
+        record_messages(db, [{
+            "id": message.id,
+            "sender_id": message.sender_id,
+            "receiver_id": message.receiver_id,
+            "content": message.content,
+            "timestamp": message.timestamp
+        }])
         db.commit()
         db.refresh(message)
         
@@ -130,31 +162,52 @@ async def send_message(
         if not message_data.class_name:
             raise HTTPException(status_code=400, detail="Class name required for group messages")
         
-        # Get students in class/section
-        query = db.query(User).filter(
+        # One INSERT ... SELECT for every student in the class/section
+        audience = select(
+            literal(current_user.id), User.id, literal(message_data.content), literal(False)
+        ).where(
             User.role == 'student',
             User.class_name == message_data.class_name
         )
-        
         if message_data.section_name:
-            query = query.filter(User.section_name == message_data.section_name)
-        
-        students = query.all()
+            audience = audience.where(User.section_name == message_data.section_name)
         
-        # Create messages for all students
-        messages = []
-        for student in students:
-            msg = Message(
-                sender_id=current_user.id,
-                receiver_id=student.id,
-                content=message_data.content
-            )
-            db.add(msg)
-            messages.append(msg)
+        stmt = insert(Message).from_select(
+            [Message.sender_id, Message.receiver_id, Message.content, Message.is_read], audience
+        ).returning(Message.id, Message.receiver_id, Message.timestamp)
+        rows = db.execute(stmt).all()
+        if not rows:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="No students found in this class")
         
+        messages = [
+            {
+                "id": row.id,
+                "sender_id": current_user.id,
+                "receiver_id": row.receiver_id,
+                "content": message_data.content,
+                "timestamp": row.timestamp,
+                "is_read": False
+            }
+            for row in rows
+        ]
+        record_messages(db, messages)
         db.commit()
         
-        return messages[0] if messages else None
+        # Invalidate unread counters of all receivers at once, after the
+        # commit so a concurrent read cannot re-cache the old count
+        unread_cache.delete_many([f"unread_{row.receiver_id}" for row in rows])
+        
+        # Push to connected students (on any worker)
+        await manager.send_individual_messages({
+            message["receiver_id"]: {
+                "type": "new_message",
+                "message": {**message, "timestamp": message["timestamp"].isoformat()}
+            }
+            for message in messages
+        })
+        
+        return messages[0]
     
     else:
         raise HTTPException(status_code=400, detail="Invalid message type")
@@ -166,16 +219,12 @@ async def get_unread_count(
     db: Session = Depends(get_db)
 ):
     """Get unread message count (with caching)"""
-    cache_key = f"unread_{current_user.id}"
-    cached_value = unread_cache.get(cache_key)
-    if cached_value is not None:
-        return {"unread_count": cached_value}
-    
-    count = db.query(Message).filter(
-        Message.receiver_id == current_user.id,
-        Message.is_read == False
-    ).count()
-    
-    unread_cache.set(cache_key, count)
+    count = await unread_cache.get_or_load_async(
+        f"unread_{current_user.id}",
+        lambda: db.query(Message).filter(
+            Message.receiver_id == current_user.id,
+            Message.is_read == False
+        ).count()
+    )
     return {"unread_count": count}
 
@@ -1,13 +1,15 @@
 """
 Posts API routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional, Union
 from app.database import get_db
 from app.api.deps import get_current_active_user, get_current_admin_user
 from app.models.user import User
 from app.models.post import Post
+from app.schemas.pagination import CursorPage
+from app.core.pagination import paginate, MAX_PAGE_LIMIT
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/posts", tags=["posts"])
@@ -29,15 +31,25 @@ class PostResponse(BaseModel):
         from_attributes = True
 
 
-@router.get("", response_model=List[PostResponse])
+@router.get("", response_model=Union[CursorPage[PostResponse], List[PostResponse]])
 async def get_posts(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get all posts (admin posts only)"""
-    posts = db.query(Post).join(User).filter(
+    """Get all posts (admin posts only), paginated when `limit` is given"""
+    query = db.query(Post).join(User).options(joinedload(Post.user)).filter(
         User.role == 'admin'
-    ).order_by(Post.timestamp.desc()).all()
+    )
+    
+    if limit is None:
+        posts = query.order_by(Post.timestamp.desc(), Post.id.desc()).all()
+        next_cursor = None
+    else:
+        posts, next_cursor = paginate(
+            query, [(Post.timestamp, True), (Post.id, True)], limit, cursor
+        )
     
     result = []
     for post in posts:
@@ -50,7 +62,9 @@ async def get_posts(
             "full_name": post.user.full_name
         })
     
-    return result
+    if limit is None:
+        return result
+    return {"items": result, "next_cursor": next_cursor}
 
 
 @router.post("", response_model=PostResponse)
@@ -9,6 +9,7 @@ from app.api.deps import get_current_admin_user
 from app.models.user import User
 from app.models.video import Video
 from app.models.rating import RatingCriterion, DynamicVideoRating
+from app.services.leaderboard_service import apply_star_delta, rebuild_star_totals
 from app.schemas.rating import RatingCriterion as RatingCriterionSchema, RatingCriterionCreate, VideoRating, VideoRatingCreate
 
 router = APIRouter(prefix="/api/ratings", tags=["ratings"])
@@ -59,6 +60,9 @@ async def delete_criterion(
     db.delete(criterion)
     db.commit()
     
+    # Ratings for this criterion were cascaded away
+    rebuild_star_totals(db)
+    
     return {"status": "success", "message": "Criterion deleted"}
 
 
@@ -85,6 +89,16 @@ async def rate_video(
     max_stars = len(criteria)
     total_stars = 0
     
+    # Existing ratings for this video, keyed by criterion
+    existing_ratings = {
+        r.criterion_id: r
+        for r in db.query(DynamicVideoRating).filter(DynamicVideoRating.video_id == video_id).all()
+    }
+    
+    # Star changes for the materialized leaderboard
+    manhaji_delta = 0
+    ithrai_delta = 0
+    
     # Update ratings
     for criterion in criteria:
         is_awarded = rating_data.ratings.get(criterion.key, 0)
@@ -92,10 +106,13 @@ async def rate_video(
             total_stars += 1
         
         # Upsert rating
-        existing = db.query(DynamicVideoRating).filter(
-            DynamicVideoRating.video_id == video_id,
-            DynamicVideoRating.criterion_id == criterion.id
-        ).first()
+        existing = existing_ratings.get(criterion.id)
+        
+        delta = (1 if is_awarded == 1 else 0) - (1 if existing and existing.is_awarded else 0)
+        if criterion.video_type == 'منهجي':
+            manhaji_delta += delta
+        else:
+            ithrai_delta += delta
         
         if existing:
             existing.is_awarded = is_awarded
@@ -109,6 +126,11 @@ async def rate_video(
             )
             db.add(new_rating)
     
+    # Update leaderboard totals in the same transaction
+    if video.is_approved and (manhaji_delta or ithrai_delta):
+        db.flush()
+        apply_star_delta(db, video.user_id, manhaji_delta, ithrai_delta)
+    
     db.commit()
     
     # Check for superhero status (اثرائي with all stars)
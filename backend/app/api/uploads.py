@@ -1,21 +1,26 @@
 """
 File upload API routes
 """
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Header, HTTPException, status, Request
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
-import tempfile
+from typing import Optional
+import asyncio
+import hashlib
 import os
-import shutil
+import uuid
 from app.database import get_db, SessionLocal
 from app.api.deps import get_current_active_user
 from app.models.user import User
 from app.models.video import Video
+from app.models.upload_session import UploadSession
 from app.core.aws import upload_file_to_s3, get_file_url, generate_presigned_url, generate_presigned_upload_url
-from app.core.utils import allowed_file, get_video_duration, secure_filename_arabic
+from app.core.utils import allowed_file, get_video_duration, secure_filename_arabic, save_upload_stream, UploadTooLargeError
 from app.core.cache import unapproved_cache
-from app.core.hls_processor import process_video_background
+from app.core.transcode_queue import enqueue_transcode
+from app.core.video_assets import attach_asset, asset_source_path
+from app.core.chunk_store import chunk_store, byte_ranges, ChunkChecksumError, ChunkSizeError
 from app.config import settings
 from pydantic import BaseModel
 import boto3
@@ -31,6 +36,12 @@ class UploadCompletionRequest(BaseModel):
     video_id: int
     s3_key: str
 
+class ResumableUploadCreate(BaseModel):
+    filename: str
+    total_size: int  # bytes
+    title: str
+    video_type: str = "منهجي"
+
 router = APIRouter(prefix="/api/uploads", tags=["uploads"])
 
 # Videos are now stored in settings.UPLOAD_FOLDER/videos/{user_id}/
@@ -90,7 +101,6 @@ async def get_presigned_upload_url(
 @router.post("/upload-complete")
 async def complete_upload(
     request: UploadCompletionRequest,
-    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -110,31 +120,17 @@ async def complete_upload(
     video.processing_status = 'pending'
     # Check approval (admins auto-approved)
     video.is_approved = (current_user.role == 'admin')
-    db.commit()
 
-    # Trigger Processing
-    # Need to download from S3 to local temp for processing if we use ffmpeg local
-    # For now, we assume the processing task handles pulling from S3 if needed
-    # WARNING: process_video_background currently expects a LOCAL path. 
-    # We might need to refactor hls_processor or download it there.
-    # For the sake of this task, I will queue the job and assume hls_processor needs attention or I fix it.
-    
-    # Let's fix process_video_background call logic here:
-    # We pass the S3 key acting as path, and the processor should handle it.
-    
-    background_tasks.add_task(
-        process_video_background,
-        request.s3_key, # Pass S3 key instead of local path
-        video.id,
-        SessionLocal
-    )
+    # Queue processing; the worker pulls the S3 key when it is not a local path
+    enqueue_transcode(db, video.id, request.s3_key, cleanup_source=True)
+    db.commit()
     
     return {"status": "processing_queued", "video_id": video.id}
 
 
 @router.post("/video")
 async def upload_video(
-    background_tasks: BackgroundTasks,
+    request: Request,
     title: str = Form(...),
     video_type: str = Form(...),
     video_file: UploadFile = File(...),
@@ -159,103 +155,372 @@ async def upload_video(
             detail="Invalid video type. Must be 'منهجي' or 'اثرائي'"
         )
     
-    # Read file content
-    file_content = await video_file.read()
-    file_size_mb = len(file_content) / (1024 * 1024)
+    max_bytes = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    too_large_detail = f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE_MB}MB"
+    
+    # Reject early when the client declares an oversized body
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 1024 * 1024:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=too_large_detail)
+    
+    local_path, relative_path = _local_video_path(current_user.id, video_file.filename)
+    partial_path = local_path + ".part"
+    
+    try:
+        # Stream the upload to disk in chunks, aborting once it exceeds the limit,
+        # hashing it on the way for deduplication
+        hasher = hashlib.sha256()
+        try:
+            size = await save_upload_stream(video_file, partial_path, max_bytes, hasher=hasher)
+        except UploadTooLargeError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=too_large_detail)
+        
+        return _register_local_video(
+            partial_path, local_path, relative_path, title, video_type,
+            current_user, db, sha256=hasher.hexdigest(), size=size
+        )
+    
+    except HTTPException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    except Exception as e:
+        # Clean up on unexpected error
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Upload failed: {str(e)}"
+        )
+
+
+def _local_video_path(user_id: int, filename: str):
+    """
+    Build (absolute path, relative path) for a new video file
+    Stored in UPLOAD_FOLDER/videos/{user_id}/ for correct serving
+    """
+    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    safe_filename = secure_filename_arabic(filename)
+    
+    video_dir = os.path.join(settings.UPLOAD_FOLDER, "videos", str(user_id))
+    os.makedirs(video_dir, exist_ok=True)
+    
+    local_filename = f"{timestamp}_{safe_filename}"
+    # Relative path for database (used by get_file_url)
+    return os.path.join(video_dir, local_filename), f"videos/{user_id}/{local_filename}"
+
+
+def _register_local_video(
+    partial_path: str,
+    local_path: str,
+    relative_path: str,
+    title: str,
+    video_type: str,
+    current_user: User,
+    db: Session,
+    sha256: Optional[str] = None,
+    size: Optional[int] = None,
+    upload_session: Optional[UploadSession] = None
+) -> dict:
+    """
+    Validate a fully received video file, move it to its permanent name,
+    create the Video record and queue HLS processing
+    With sha256, an upload identical to a stored one reuses its source file
+    and HLS output instead (the received copy is discarded).
+    With upload_session, the resumable session is marked completed in the
+    same commit as the video.
+    """
+    # Check video duration on the file on disk
+    duration = get_video_duration(partial_path)
+    if duration is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Could not read video file. File may be corrupted."
+        )
+    
+    # Validate duration based on video type
+    max_duration = settings.VIDEO_MAX_DURATION_MANHAJI if video_type == 'منهجي' else settings.VIDEO_MAX_DURATION_ITHRAI
+    if duration > max_duration:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Video duration ({int(duration)}s) exceeds maximum ({max_duration}s) for {video_type}"
+        )
+    
+    # Create video record with pending status
+    is_approved = current_user.role == 'admin'
+    video = Video(
+        title=title,
+        filepath=relative_path,  # Store relative path, not absolute
+        user_id=current_user.id,
+        video_type=video_type,
+        is_approved=is_approved,
+        processing_status='pending'
+    )
+    db.add(video)
+    db.flush()
+    
+    needs_transcode = True
+    if sha256:
+        needs_transcode = attach_asset(db, video, sha256, size or os.path.getsize(partial_path), relative_path)
+    
+    if video.filepath == relative_path:
+        # Move to permanent name (same directory, atomic rename)
+        os.replace(partial_path, local_path)
+    else:
+        # Same bytes are already stored
+        os.remove(partial_path)
+    
+    # Queue HLS processing in the same transaction as the video record
+    # (keep source for re-processing if needed)
+    if needs_transcode:
+        source_path = asset_source_path(video.asset) if video.asset else local_path
+        enqueue_transcode(db, video.id, source_path, cleanup_source=False)
+    if upload_session is not None:
+        upload_session.status = 'completed'
+        upload_session.video_id = video.id
+    db.commit()
+    db.refresh(video)
+    
+    # Invalidate cache if video is not approved
+    if not is_approved:
+        unapproved_cache.delete('unapproved_videos')
+    
+    return {
+        "status": "success",
+        "message": f"Video uploaded successfully ({int(duration)}s). Processing for streaming...",
+        "video_id": video.id,
+        "is_approved": is_approved,
+        "processing_status": video.processing_status
+    }
+
+
+# ============ Resumable Uploads ============
+
+def _get_upload_session(
+    db: Session,
+    upload_id: str,
+    current_user: User,
+    for_update: bool = False
+) -> UploadSession:
+    """Load an upload session owned by the current user (optionally row-locked)"""
+    query = db.query(UploadSession).filter(UploadSession.id == upload_id)
+    if for_update:
+        query = query.with_for_update()
+    session = query.first()
+    if not session or session.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+def _upload_session_state(session: UploadSession) -> dict:
+    """Received chunks/byte ranges so a client can resume where it stopped"""
+    received = chunk_store.received_chunks(session.id)
+    return {
+        "upload_id": session.id,
+        "status": session.status,
+        "video_id": session.video_id,
+        "total_size": session.total_size,
+        "chunk_size": session.chunk_size,
+        "chunk_count": session.chunk_count,
+        "received_chunks": sorted(received),
+        "received_ranges": [list(r) for r in byte_ranges(received, session.chunk_size)],
+        "received_bytes": sum(received.values()),
+        "missing_chunks": [i for i in range(session.chunk_count) if i not in received]
+    }
+
+
+@router.post("/sessions", status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    request: ResumableUploadCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Start a resumable upload
+    The file is then sent as numbered chunks of `chunk_size` bytes
+    (only the last chunk may be shorter).
+    """
+    if not allowed_file(request.filename, settings.ALLOWED_VIDEO_EXTENSIONS):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid file type. Allowed: mp4, mov, avi"
+        )
+    
+    if request.video_type not in ['منهجي', 'اثرائي']:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid video type. Must be 'منهجي' or 'اثرائي'"
+        )
     
-    # Validate file size
-    if file_size_mb > settings.MAX_UPLOAD_SIZE_MB:
+    if request.total_size <= 0 or request.total_size > settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE_MB}MB"
         )
     
-    # Save to temporary file for duration check
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(video_file.filename)[1]) as temp_file:
-        temp_file.write(file_content)
-        temp_path = temp_file.name
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=current_user.id,
+        filename=request.filename,
+        title=request.title,
+        video_type=request.video_type,
+        total_size=request.total_size,
+        chunk_size=settings.UPLOAD_CHUNK_SIZE_MB * 1024 * 1024,
+        status='active'
+    )
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    
+    return _upload_session_state(session)
+
+
+@router.get("/sessions/{upload_id}")
+async def get_upload_session(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Get the chunks and byte ranges received so far"""
+    session = _get_upload_session(db, upload_id, current_user)
+    return _upload_session_state(session)
+
+
+@router.put("/sessions/{upload_id}/chunks/{index}")
+async def upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    x_chunk_sha256: str = Header(..., description="Hex SHA-256 of the chunk body"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload one chunk (idempotent: re-sending a stored chunk is a no-op)
+    The body is the raw chunk bytes; X-Chunk-SHA256 is verified before
+    the chunk is accepted.
+    """
+    session = _get_upload_session(db, upload_id, current_user)
+    if session.status != 'active':
+        raise HTTPException(status_code=409, detail="Upload session is already completed")
+    if index < 0 or index >= session.chunk_count:
+        raise HTTPException(status_code=400, detail="Invalid chunk index")
+    
+    # Release the DB connection while the body streams in
+    expected_size = session.expected_chunk_size(index)
+    db.close()
     
     try:
-        # Check video duration
-        duration = get_video_duration(temp_path)
-        if duration is None:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Could not read video file. File may be corrupted."
-            )
-        
-        # Validate duration based on video type
-        max_duration = settings.VIDEO_MAX_DURATION_MANHAJI if video_type == 'منهجي' else settings.VIDEO_MAX_DURATION_ITHRAI
-        if duration > max_duration:
-            # Clean up and reject
-            os.remove(temp_path)
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Video duration ({int(duration)}s) exceeds maximum ({max_duration}s) for {video_type}"
-            )
-        
-        # Generate unique filename for local storage
-        timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        safe_filename = secure_filename_arabic(video_file.filename)
-        
-        # Store in UPLOAD_FOLDER/videos/{user_id}/ for correct serving
-        video_dir = os.path.join(settings.UPLOAD_FOLDER, "videos", str(current_user.id))
-        os.makedirs(video_dir, exist_ok=True)
-        
-        local_filename = f"{timestamp}_{safe_filename}"
-        local_path = os.path.join(video_dir, local_filename)
-        
-        # Relative path for database (used by get_file_url)
-        relative_path = f"videos/{current_user.id}/{local_filename}"
-        
-        # Move temp file to permanent location
-        shutil.move(temp_path, local_path)
+        size = await chunk_store.write_chunk(
+            upload_id, index, request.stream(), expected_size, x_chunk_sha256
+        )
+    except ChunkSizeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ChunkChecksumError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    return {"upload_id": upload_id, "index": index, "size": size}
+
+
+def _complete_claimed_upload(upload_id: str, current_user: User) -> dict:
+    """
+    Assemble a claimed ('completing') upload and register its video, in a
+    worker thread with its own database session
+    The video, its transcode job and the completed session are written in
+    one commit; on failure the claim is released so the client can retry.
+    """
+    db = SessionLocal()
+    partial_path = None
+    try:
+        session = db.query(UploadSession).filter(UploadSession.id == upload_id).first()
+        local_path, relative_path = _local_video_path(current_user.id, session.filename)
+        partial_path = local_path + ".part"
         
-        # Create video record with pending status
-        is_approved = current_user.role == 'admin'
-        video = Video(
-            title=title,
-            filepath=relative_path,  # Store relative path, not absolute
-            user_id=current_user.id,
-            video_type=video_type,
-            is_approved=is_approved,
-            processing_status='pending'
+        hasher = hashlib.sha256()
+        size = chunk_store.assemble(upload_id, session.chunk_count, partial_path, hasher=hasher)
+        return _register_local_video(
+            partial_path, local_path, relative_path, session.title, session.video_type,
+            current_user, db, sha256=hasher.hexdigest(), size=size, upload_session=session
         )
-        db.add(video)
+    except Exception:
+        db.rollback()
+        if partial_path and os.path.exists(partial_path):
+            os.remove(partial_path)
+        db.query(UploadSession).filter(
+            UploadSession.id == upload_id,
+            UploadSession.status == 'completing'
+        ).update({UploadSession.status: 'active'}, synchronize_session=False)
         db.commit()
-        db.refresh(video)
-        
-        # Invalidate cache if video is not approved
-        if not is_approved:
-            unapproved_cache.delete('unapproved_videos')
-        
-        # Start HLS processing in background
-        background_tasks.add_task(
-            process_video_background,
-            local_path,
-            video.id,
-            SessionLocal,
-            cleanup_source=False  # Keep source for re-processing if needed
+        raise
+    finally:
+        db.close()
+
+
+@router.post("/sessions/{upload_id}/complete")
+async def complete_upload_session(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Assemble all chunks and hand the video to HLS processing
+    The session is first claimed with a conditional UPDATE (active ->
+    completing), so only one of concurrent completions of the same upload
+    does the work; the others get 409 while it runs, and the result once
+    it is completed. Sessions left 'completing' by a crash expire with the
+    other stale sessions.
+    """
+    session = _get_upload_session(db, upload_id, current_user)
+    if session.status == 'completed':
+        return {"status": "success", "video_id": session.video_id, "processing_status": "pending"}
+    
+    missing = _upload_session_state(session)["missing_chunks"]
+    if missing:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Upload is incomplete", "missing_chunks": missing}
         )
-        
-        return {
-            "status": "success",
-            "message": f"Video uploaded successfully ({int(duration)}s). Processing for streaming...",
-            "video_id": video.id,
-            "is_approved": is_approved,
-            "processing_status": "pending"
-        }
     
+    claimed = db.query(UploadSession).filter(
+        UploadSession.id == upload_id,
+        UploadSession.status == 'active'
+    ).update({UploadSession.status: 'completing'}, synchronize_session=False)
+    db.commit()
+    if not claimed:
+        db.refresh(session)
+        if session.status == 'completed':
+            return {"status": "success", "video_id": session.video_id, "processing_status": "pending"}
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+    # Release the DB connection while the file is assembled
+    db.close()
+    
+    try:
+        # Assembling, hashing and probing up to MAX_FILE_SIZE blocks: keep it off the event loop
+        result = await asyncio.to_thread(_complete_claimed_upload, upload_id, current_user)
     except HTTPException:
         raise
     except Exception as e:
-        # Clean up on unexpected error
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Upload failed: {str(e)}"
         )
+    
+    await asyncio.to_thread(chunk_store.delete, upload_id)
+    return result
+
+
+@router.delete("/sessions/{upload_id}")
+async def abort_upload_session(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Abort a resumable upload and delete its chunks"""
+    session = _get_upload_session(db, upload_id, current_user)
+    chunk_store.delete(upload_id)
+    db.delete(session)
+    db.commit()
+    return {"status": "success"}
 
 
 @router.post("/profile-image")
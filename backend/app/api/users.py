@@ -1,14 +1,17 @@
 """
 Users API routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status, File, Form, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, status, File, Form, UploadFile, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from app.database import get_db
 from app.api.deps import get_current_active_user, get_current_admin_user
 from app.models.user import User
 from app.schemas.user import User as UserSchema, UserUpdate
+from app.schemas.pagination import CursorPage
 from app.core.security import get_password_hash
+from app.core.pagination import paginate, MAX_PAGE_LIMIT
+from app.services.leaderboard_service import sync_user_class
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
@@ -31,15 +34,17 @@ async def get_current_user_info(
     return current_user
 
 
-@router.get("", response_model=List[UserSchema])
+@router.get("", response_model=Union[CursorPage[UserSchema], List[UserSchema]])
 async def get_users(
     role: Optional[str] = None,
     class_name: Optional[str] = None,
     section_name: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Get list of users"""
+    """Get list of users, paginated by username when `limit` is given"""
     query = db.query(User)
     
     if role:
@@ -55,7 +60,13 @@ async def get_users(
     if current_user.role == 'student':
         query = query.filter(User.role == 'student')
     
-    return query.all()
+    if limit is None:
+        return query.all()
+    
+    users, next_cursor = paginate(
+        query, [(User.username, False), (User.id, False)], limit, cursor
+    )
+    return {"items": users, "next_cursor": next_cursor}
 
 
 @router.get("/{username}", response_model=UserSchema)
@@ -173,6 +184,9 @@ async def update_current_user(
     
     print(f"Final is_profile_complete: {current_user.is_profile_complete}")
     
+    # Keep leaderboard class/section in sync
+    sync_user_class(db, current_user)
+    
     db.commit()
     db.refresh(current_user)
     
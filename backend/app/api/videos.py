@@ -2,36 +2,46 @@
 Video API routes
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, or_
-from typing import Optional, List
+from typing import Optional, List, Union
 from datetime import datetime, timedelta
+import asyncio
 from app.database import get_db
 from app.api.deps import get_current_active_user, get_current_admin_user
 from app.models.user import User
 from app.models.video import Video, VideoLike
 from app.schemas.video import Video as VideoSchema
-from app.core.aws import get_file_url, delete_file_from_s3, generate_presigned_url
+from app.schemas.pagination import CursorPage
+from app.core.pagination import paginate, MAX_PAGE_LIMIT
+from app.core.aws import get_file_url, generate_presigned_url
 from app.core.cache import unapproved_cache
+from app.core.video_assets import release_asset, delete_asset_files
+from app.core.like_counter import like_counter
+from app.services.video_service import build_video_feed
+from app.services.leaderboard_service import refresh_user_star_totals
 from app.config import settings
 
 router = APIRouter(prefix="/api/videos", tags=["videos"])
 
 
-@router.get("", response_model=List[VideoSchema])
+@router.get("", response_model=Union[CursorPage[VideoSchema], List[VideoSchema]])
 async def get_videos(
     class_name: Optional[str] = Query(None),
     section_name: Optional[str] = Query(None),
     video_type: Optional[str] = Query(None),
     is_archived: bool = Query(False),
     is_approved: Optional[bool] = Query(None),  # Added filter
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Get videos with optional filters
+    Pass `limit` (and `cursor` from the previous page) for keyset pagination
     """
-    query = db.query(Video).filter(Video.is_archived == is_archived)
+    query = db.query(Video).options(joinedload(Video.user)).filter(Video.is_archived == is_archived)
     
     # Only show approved videos to students
     if current_user.role == 'student':
@@ -39,10 +49,12 @@ async def get_videos(
     
     # Admin filters
     if current_user.role == 'admin':
+        if class_name or section_name:
+            query = query.join(User, Video.user_id == User.id)
         if class_name:
-            query = query.join(User).filter(User.class_name == class_name)
+            query = query.filter(User.class_name == class_name)
         if section_name:
-            query = query.join(User).filter(User.section_name == section_name)
+            query = query.filter(User.section_name == section_name)
         # Allow admin to filter by approval status
         if is_approved is not None:
              query = query.filter(Video.is_approved == is_approved)
@@ -50,46 +62,18 @@ async def get_videos(
     if video_type:
         query = query.filter(Video.video_type == video_type)
     
-    videos = query.order_by(Video.timestamp.desc()).all()
+    if limit is None:
+        videos = query.order_by(Video.timestamp.desc(), Video.id.desc()).all()
+        # Likes, user likes and ratings are fetched in grouped queries
+        return build_video_feed(db, videos, current_user.id)
     
-    # Add file URLs and likes
-    result = []
-    for video in videos:
-        # Count likes
-        likes_count = db.query(VideoLike).filter(VideoLike.video_id == video.id).count()
-        # Check if current user liked
-        user_likes = db.query(VideoLike).filter(
-            VideoLike.video_id == video.id,
-            VideoLike.user_id == current_user.id
-        ).first() is not None
-        
-        video_dict = {
-            "id": video.id,
-            "title": video.title,
-            "filepath": video.filepath,
-            "file_url": get_file_url(video.filepath),
-            "user_id": video.user_id,
-            "timestamp": video.timestamp,
-            "video_type": video.video_type,
-            "is_approved": video.is_approved,
-            "is_archived": video.is_archived,
-            "likes_count": likes_count,
-            "user_likes": user_likes,
-            "publisher_name": video.user.full_name or video.user.username,
-            "publisher_image": video.user.profile_image,
-            "ratings": [
-                {
-                    "id": r.id,
-                    "criterion_id": r.criterion_id,
-                    "criterion_name": r.criterion.name,
-                    "is_awarded": r.is_awarded
-                }
-                for r in video.ratings
-            ]
-        }
-        result.append(video_dict)
-    
-    return result
+    videos, next_cursor = paginate(
+        query, [(Video.timestamp, True), (Video.id, True)], limit, cursor
+    )
+    return {
+        "items": build_video_feed(db, videos, current_user.id),
+        "next_cursor": next_cursor
+    }
 
 
 @router.get("/{video_id}", response_model=VideoSchema)
@@ -134,6 +118,12 @@ async def get_video(
     return video_dict
 
 
+def _commit_like(db: Session, video_id: int, delta: int):
+    """Commit a like toggle, then buffer its counter delta (blocking)"""
+    db.commit()
+    like_counter.add(video_id, delta)
+
+
 @router.post("/{video_id}/like")
 async def like_video(
     video_id: int,
@@ -162,13 +152,12 @@ async def like_video(
         db.add(new_like)
         user_likes = True
     
-    db.commit()
-    
-    likes_count = db.query(VideoLike).filter(VideoLike.video_id == video_id).count()
+    # Counter update is buffered and flushed by the scheduler
+    await asyncio.to_thread(_commit_like, db, video_id, 1 if user_likes else -1)
     
     return {
         "status": "success",
-        "likes_count": likes_count,
+        "likes_count": max(0, video.likes_count + like_counter.pending(video_id)),
         "user_likes": user_likes
     }
 
@@ -186,7 +175,11 @@ async def approve_video(
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
     
+    was_approved = video.is_approved
     video.is_approved = True
+    if not was_approved:
+        # Ratings on this video now count towards the leaderboard
+        refresh_user_star_totals(db, video.user_id)
     db.commit()
     
     # Invalidate cache
@@ -212,6 +205,7 @@ async def archive_video(
         raise HTTPException(status_code=400, detail="Cannot archive unapproved video")
     
     video.is_archived = True
+    video.archived_at = datetime.utcnow()
     db.commit()
     
     return {"status": "success", "message": "Video archived"}
@@ -231,6 +225,7 @@ async def unarchive_video(
         raise HTTPException(status_code=404, detail="Video not found")
     
     video.is_archived = False
+    video.archived_at = None
     db.commit()
     
     return {"status": "success", "message": "Video unarchived"}
@@ -253,13 +248,19 @@ async def delete_video(
     if current_user.role != 'admin' and video.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this video")
     
-    # Delete from S3
-    delete_file_from_s3(video.filepath)
+    # Source file and HLS output are shared by identical uploads: only
+    # delete them once no other video uses them
+    unused_files = release_asset(db, video)
     
     # Delete from database (cascade will handle related records)
+    owner_id = video.user_id
     db.delete(video)
+    db.flush()
+    refresh_user_star_totals(db, owner_id)
     db.commit()
     
+    delete_asset_files(unused_files)
+    
     return {"status": "success", "message": "Video deleted"}
 
 
@@ -4,16 +4,24 @@ Real-time messaging with typing indicators and read receipts
 """
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set
 from datetime import datetime
 import json
 import logging
 import asyncio
+import os
+import socket
+import time
+import uuid
 
-from app.database import get_db, SessionLocal
+from app.config import settings
+from app.database import get_db
 from app.models.user import User
 from app.models.message import Message
 from app.core.security import decode_token
+from app.core.ws_backplane import create_backplane
+from app.core.chat_writer import chat_writer, run_in_session, mark_messages_read
+from app.core.ws_broadcast import audience_index, SocketSender, serialize_message
 
 logger = logging.getLogger(__name__)
 
@@ -21,75 +29,237 @@ router = APIRouter(tags=["websocket"])
 
 
 class ConnectionManager:
-    """Manages WebSocket connections for real-time chat"""
+    """
+    Manages WebSocket connections for real-time chat
+
+    Each worker process holds only its own sockets. Messages are published
+    on the backplane (core/ws_backplane.py) and every worker delivers them
+    to the recipients connected to it. Presence is shared the same way:
+    workers announce users coming online / going offline and periodically
+    publish their full set of online users, so is_online() and
+    get_online_users() cover all workers.
     
-    def __init__(self):
+    Payloads are serialized once by the publisher and only enqueued on each
+    recipient socket's bounded queue (core/ws_broadcast.py); class-wide
+    broadcasts are resolved by each worker against its audience index.
+    """
+    
+    def __init__(self, backplane=None):
         # user_id -> set of WebSocket connections (user can be connected from multiple tabs)
         self.active_connections: Dict[int, Set[WebSocket]] = {}
+        # socket -> its outbound queue and writer task
+        self.senders: Dict[WebSocket, SocketSender] = {}
         # user_id -> set of user_ids they're typing to
         self.typing_indicators: Dict[int, Set[int]] = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.backplane = backplane
+        # worker_id -> user_ids online on that worker, and when it was last heard from
+        self.remote_presence: Dict[str, Set[int]] = {}
+        self.remote_seen: Dict[str, float] = {}
+        self._started = False
+        self._presence_task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Subscribe to the backplane and start sharing presence"""
+        if self._started:
+            return
+        if self.backplane is None:
+            self.backplane = create_backplane(settings.WS_BACKPLANE, settings.WS_BACKPLANE_URL)
+        await self.backplane.start(self._on_backplane_message)
+        self._started = True
+        self._presence_task = asyncio.create_task(self._presence_loop())
+        # Ask the other workers for their online users
+        await self._publish({"kind": "presence_request", "worker": self.worker_id})
+        logger.info(f"WebSocket backplane '{settings.WS_BACKPLANE}' started for worker {self.worker_id}")
+    
+    async def stop(self):
+        if not self._started:
+            return
+        if self._presence_task:
+            self._presence_task.cancel()
+        try:
+            await self._publish({"kind": "worker_stopped", "worker": self.worker_id})
+        except Exception as e:
+            logger.warning(f"Failed to announce worker shutdown: {e}")
+        self._started = False
+        await self.backplane.stop()
+    
+    async def _publish(self, message: dict):
+        if self._started:
+            await self.backplane.publish(message)
+        else:
+            # Backplane not running (e.g. outside the app lifespan): this process only
+            await self._on_backplane_message(message)
+    
+    async def _on_backplane_message(self, message: dict):
+        """Handle a message published by any worker (this one included)"""
+        kind = message.get("kind")
+        if kind == "deliver":
+            for user_id in message["user_ids"]:
+                self._enqueue_user(user_id, message["text"])
+            return
+        if kind == "deliver_each":
+            for user_id, text in message["texts"].items():
+                self._enqueue_user(int(user_id), text)
+            return
+        if kind == "broadcast":
+            await self._deliver_broadcast(message)
+            return
+        
+        worker = message.get("worker")
+        if worker == self.worker_id:
+            return
+        if kind == "presence":
+            users = self.remote_presence.setdefault(worker, set())
+            users.update(message.get("online", []))
+            users.difference_update(message.get("offline", []))
+            self.remote_seen[worker] = time.monotonic()
+        elif kind == "presence_sync":
+            self.remote_presence[worker] = set(message["users"])
+            self.remote_seen[worker] = time.monotonic()
+        elif kind == "presence_request":
+            await self._publish_presence()
+        elif kind == "worker_stopped":
+            self.remote_presence.pop(worker, None)
+            self.remote_seen.pop(worker, None)
+    
+    async def _publish_presence(self):
+        await self._publish({
+            "kind": "presence_sync",
+            "worker": self.worker_id,
+            "users": list(self.active_connections.keys())
+        })
     
-    async def connect(self, websocket: WebSocket, user_id: int):
+    async def _presence_loop(self):
+        """Publish this worker's online users and forget workers that went silent"""
+        interval = settings.WS_PRESENCE_SYNC_SECONDS
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._publish_presence()
+            except Exception as e:
+                logger.warning(f"Failed to publish presence: {e}")
+            expired_before = time.monotonic() - 3 * interval
+            for worker, seen in list(self.remote_seen.items()):
+                if seen < expired_before:
+                    self.remote_presence.pop(worker, None)
+                    self.remote_seen.pop(worker, None)
+    
+    async def connect(self, websocket: WebSocket, user: User):
         """Accept connection and track the user"""
         await websocket.accept()
+        user_id = user.id
+        # The profile was just loaded: refresh its broadcast audiences
+        audience_index.update_user(user_id, user.role, user.class_name, user.section_name)
+        self.senders[websocket] = SocketSender(websocket, self._on_send_failure)
         if user_id not in self.active_connections:
             self.active_connections[user_id] = set()
+            await self._publish({"kind": "presence", "worker": self.worker_id, "online": [user_id]})
         self.active_connections[user_id].add(websocket)
         logger.info(f"User {user_id} connected. Total connections: {len(self.active_connections)}")
     
-    def disconnect(self, websocket: WebSocket, user_id: int):
+    async def disconnect(self, websocket: WebSocket, user_id: int):
         """Remove connection when user disconnects"""
-        if user_id in self.active_connections:
+        sender = self.senders.pop(websocket, None)
+        if sender:
+            sender.close()
+        if websocket in self.active_connections.get(user_id, ()):
             self.active_connections[user_id].discard(websocket)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
+                self.typing_indicators.pop(user_id, None)
+                await self._publish({"kind": "presence", "worker": self.worker_id, "offline": [user_id]})
         logger.info(f"User {user_id} disconnected. Total connections: {len(self.active_connections)}")
     
+    def _on_send_failure(self, websocket: WebSocket):
+        """A send failed or timed out: drop the socket"""
+        asyncio.create_task(self._close_socket(websocket, 1011, "Send failed"))
+    
+    async def _close_socket(self, websocket: WebSocket, code: int, reason: str):
+        user_id = next((uid for uid, sockets in self.active_connections.items() if websocket in sockets), None)
+        try:
+            await websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+        if user_id is not None:
+            await self.disconnect(websocket, user_id)
+    
+    def _enqueue(self, websocket: WebSocket, text: str):
+        sender = self.senders.get(websocket)
+        if sender is None or sender.enqueue(text):
+            return
+        if settings.WS_SLOW_CONSUMER == "drop":
+            logger.debug(f"Slow WebSocket consumer, dropped message ({sender.dropped} so far)")
+            return
+        logger.warning("Disconnecting slow WebSocket consumer")
+        self.senders.pop(websocket, None)
+        sender.close()
+        asyncio.create_task(self._close_socket(websocket, 1013, "Too slow"))
+    
+    def _enqueue_user(self, user_id: int, text: str):
+        """Queue serialized text on the connections of a user held by this worker"""
+        for connection in list(self.active_connections.get(user_id, ())):
+            self._enqueue(connection, text)
+    
+    async def send_to_socket(self, websocket: WebSocket, message: dict):
+        """Reply on one socket (ordered with the messages already queued on it)"""
+        self._enqueue(websocket, serialize_message(message))
+    
+    async def send_to_users(self, message: dict, user_ids: List[int]):
+        """Send message to several users, wherever they are connected"""
+        if user_ids:
+            await self._publish({"kind": "deliver", "user_ids": list(user_ids), "text": serialize_message(message)})
+    
     async def send_personal_message(self, message: dict, user_id: int):
-        """Send message to a specific user (all their connections)"""
-        if user_id in self.active_connections:
-            disconnected = []
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.warning(f"Failed to send to user {user_id}: {e}")
-                    disconnected.append(connection)
-            # Clean up disconnected sockets
-            for conn in disconnected:
-                self.active_connections[user_id].discard(conn)
+        """Send message to a specific user (all their connections, on any worker)"""
+        await self.send_to_users(message, [user_id])
+    
+    async def send_individual_messages(self, messages: Dict[int, dict]):
+        """Send a different message to each user (one backplane publish for all)"""
+        if messages:
+            await self._publish({
+                "kind": "deliver_each",
+                "texts": {str(user_id): serialize_message(message) for user_id, message in messages.items()}
+            })
+    
+    async def _deliver_broadcast(self, message: dict):
+        """Queue a broadcast on this worker's sockets in its audience"""
+        if audience_index.needs_load():
+            await run_in_session(audience_index.load)
+        audience = audience_index.members(
+            class_name=message.get("class_name"),
+            section_name=message.get("section_name"),
+            role=message.get("role")
+        )
+        text = message["text"]
+        for user_id in audience.intersection(self.active_connections.keys()):
+            self._enqueue_user(user_id, text)
     
     async def broadcast_to_class(self, message: dict, class_name: str, section_name: str = None):
         """Broadcast message to all users in a class (and optionally section)"""
-        db = SessionLocal()
-        try:
-            query = db.query(User).filter(User.class_name == class_name)
-            if section_name:
-                query = query.filter(User.section_name == section_name)
-            users = query.all()
-            
-            for user in users:
-                await self.send_personal_message(message, user.id)
-        finally:
-            db.close()
+        await self._publish({
+            "kind": "broadcast",
+            "class_name": class_name,
+            "section_name": section_name,
+            "text": serialize_message(message)
+        })
     
     async def broadcast_to_all_students(self, message: dict):
         """Broadcast message to all connected students"""
-        db = SessionLocal()
-        try:
-            students = db.query(User).filter(User.role == 'student').all()
-            for student in students:
-                await self.send_personal_message(message, student.id)
-        finally:
-            db.close()
+        await self._publish({"kind": "broadcast", "role": "student", "text": serialize_message(message)})
     
     def is_online(self, user_id: int) -> bool:
-        """Check if a user is currently online"""
-        return user_id in self.active_connections and len(self.active_connections[user_id]) > 0
+        """Check if a user is currently online (on any worker)"""
+        if user_id in self.active_connections and len(self.active_connections[user_id]) > 0:
+            return True
+        return any(user_id in users for users in self.remote_presence.values())
     
     def get_online_users(self) -> List[int]:
-        """Get list of online user IDs"""
-        return list(self.active_connections.keys())
+        """Get list of online user IDs (on any worker)"""
+        online = set(self.active_connections.keys())
+        for users in self.remote_presence.values():
+            online |= users
+        return list(online)
     
     async def set_typing(self, from_user_id: int, to_user_id: int, is_typing: bool):
         """Set typing indicator and notify the recipient"""
@@ -143,16 +313,19 @@ async def websocket_chat(
     - typing: Typing indicator
     - read: Mark messages as read
     - online_status: Request online status
+    
+    Database work runs in the chat thread pool (core/chat_writer.py); the
+    socket does not hold a session while it is open.
     """
-    db = SessionLocal()
     try:
         # Authenticate user
-        user = get_user_from_token(token, db)
+        user = await run_in_session(lambda db: get_user_from_token(token, db))
         if not user or user.id != user_id:
             await websocket.close(code=4001, reason="Unauthorized")
             return
+        is_admin = user.role == "admin"
         
-        await manager.connect(websocket, user_id)
+        await manager.connect(websocket, user)
         
         # Notify others that user is online
         await manager.send_personal_message({
@@ -172,24 +345,25 @@ async def websocket_chat(
                     content = data.get("content")
                     
                     if receiver_id and content:
-                        # Save to database
-                        new_message = Message(
-                            sender_id=user_id,
-                            receiver_id=receiver_id,
-                            content=content
-                        )
-                        db.add(new_message)
-                        db.commit()
-                        db.refresh(new_message)
-                        
+                        # Save to database (batched with concurrent messages)
+                        try:
+                            new_message = await chat_writer.write(user_id, receiver_id, content)
+                        except Exception:
+                            # e.g. unknown receiver_id; other messages of the batch were saved
+                            await manager.send_to_socket(websocket, {
+                                "type": "message_failed",
+                                "receiver_id": receiver_id
+                            })
+                            continue
+
                         message_data = {
                             "type": "new_message",
                             "message": {
-                                "id": new_message.id,
+                                "id": new_message["id"],
                                 "sender_id": user_id,
                                 "receiver_id": receiver_id,
                                 "content": content,
-                                "timestamp": new_message.timestamp.isoformat(),
+                                "timestamp": new_message["timestamp"].isoformat(),
                                 "is_read": False
                             }
                         }
@@ -199,7 +373,7 @@ async def websocket_chat(
                         # Send confirmation to sender
                         await manager.send_personal_message({
                             "type": "message_sent",
-                            "message_id": new_message.id,
+                            "message_id": new_message["id"],
                             "receiver_id": receiver_id
                         }, user_id)
                         
@@ -220,14 +394,7 @@ async def websocket_chat(
                     
                     if message_ids:
                         now = datetime.utcnow()
-                        db.query(Message).filter(
-                            Message.id.in_(message_ids),
-                            Message.receiver_id == user_id
-                        ).update({
-                            Message.is_read: True,
-                            Message.read_at: now
-                        }, synchronize_session=False)
-                        db.commit()
+                        await run_in_session(mark_messages_read, user_id, message_ids, now)
                         
                         # Notify sender that messages were read
                         if sender_id:
@@ -244,12 +411,12 @@ async def websocket_chat(
                     online_status = {
                         uid: manager.is_online(uid) for uid in user_ids
                     }
-                    await websocket.send_json({
+                    await manager.send_to_socket(websocket, {
                         "type": "online_status",
                         "status": online_status
                     })
                 
-                elif message_type == "broadcast" and user.role == "admin":
+                elif message_type == "broadcast" and is_admin:
                     # Admin broadcast to specific class or all students
                     content = data.get("content")
                     target_class = data.get("class_name")
@@ -269,7 +436,7 @@ async def websocket_chat(
                             await manager.broadcast_to_all_students(broadcast_msg)
         
         except WebSocketDisconnect:
-            manager.disconnect(websocket, user_id)
+            await manager.disconnect(websocket, user_id)
             # Notify others that user is offline
             await manager.send_personal_message({
                 "type": "user_offline",
@@ -278,9 +445,7 @@ async def websocket_chat(
     
     except Exception as e:
         logger.exception(f"WebSocket error for user {user_id}: {e}")
-        manager.disconnect(websocket, user_id)
-    finally:
-        db.close()
+        await manager.disconnect(websocket, user_id)
 
 
 @router.get("/api/chat/online-users")
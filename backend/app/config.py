@@ -33,6 +33,7 @@ class Settings(BaseSettings):
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
     S3_BUCKET_NAME: str = "basamaljanaby-media"
     CLOUDFRONT_DOMAIN: Optional[str] = None
+    S3_ENDPOINT_URL: Optional[str] = None  # S3-compatible endpoint (e.g. http://minio:9000) instead of AWS
     
     # CORS
     CORS_ORIGINS: list[str] = ["https://basamaljanaby.com", "http://localhost:3000", "http://localhost:5173"]
@@ -42,16 +43,74 @@ class Settings(BaseSettings):
     ALLOWED_IMAGE_EXTENSIONS: set[str] = {"png", "jpg", "jpeg", "gif"}
     ALLOWED_VIDEO_EXTENSIONS: set[str] = {"mp4", "mov", "avi"}
     UPLOAD_FOLDER: str = "/app/data/uploads"  # Persistent volume path
+    UPLOAD_CHUNK_SIZE_MB: int = 5  # Chunk size for resumable uploads
+    UPLOAD_SESSION_EXPIRE_HOURS: int = 24  # Unfinished resumable uploads are removed after this
     
     # Video Limits
     VIDEO_MAX_DURATION_MANHAJI: int = 60  # seconds
     VIDEO_MAX_DURATION_ITHRAI: int = 240  # seconds
     
+    # HLS rendition ladder (short-side heights; renditions above the source are skipped)
+    HLS_RENDITIONS: str = "240,480,720"
+    HLS_REMUX_COMPLIANT: bool = True  # Stream-copy H.264/AAC uploads instead of building the ladder
+    HLS_REMUX_MAX_BITRATE_KBPS: int = 6000  # Sources above this are transcoded even when compliant
+    HLS_STORAGE: str = "local"  # local (served from /app/hls) or s3 (uploaded under hls/{video_id}/)
+    HLS_UPLOAD_CONCURRENCY: int = 4  # Parallel segment uploads per video in s3 mode
+    HLS_SOURCE_URL_EXPIRE_SECONDS: int = 21600  # Presigned source URL lifetime for FFmpeg reads
+    HLS_PREVIEWS: bool = True  # Sprite sheet + WebVTT thumbnails track for seek previews
+    HLS_PREVIEW_INTERVAL_SECONDS: int = 2  # Seconds between sprite tiles (raised for long videos)
+    HLS_TOKEN_EXPIRE_SECONDS: int = 7200  # Lifetime of the signed token in playlist/segment URLs
+    HLS_ACCEL_REDIRECT_PREFIX: Optional[str] = None  # e.g. /internal-hls/ to hand file transfers to nginx
+    
+    # Transcoding queue
+    TRANSCODE_WORKER_MODE: str = "embedded"  # embedded (inside the API process) or external (python -m app.worker)
+    TRANSCODE_JOBS_PER_CORE: float = 0.5  # Concurrent FFmpeg jobs allowed per CPU core
+    TRANSCODE_MAX_CONCURRENCY: int = 0  # Hard cap on concurrent jobs (0 = derive from cores)
+    TRANSCODE_MAX_ATTEMPTS: int = 3
+    TRANSCODE_RETRY_BACKOFF_SECONDS: int = 30  # Doubled after every failed attempt
+    TRANSCODE_POLL_INTERVAL_SECONDS: float = 2.0
+    TRANSCODE_STALE_AFTER_SECONDS: int = 120  # Running jobs without a heartbeat for this long are requeued
+    
     # Archive
     VIDEO_ARCHIVE_DAYS: int = 7
     
+    # Storage lifecycle of archived videos (days since archiving; 0 disables a step)
+    LIFECYCLE_DELETE_SOURCE_DAYS: int = 30  # Drop the uploaded source once its HLS output exists
+    LIFECYCLE_COLD_HLS_DAYS: int = 90  # Move the local HLS tree to cold object storage
+    COLD_STORAGE_BUCKET: Optional[str] = None  # Defaults to S3_BUCKET_NAME
+    COLD_STORAGE_CLASS: str = "STANDARD_IA"  # Needs immediate reads: trees are restored when played
+    
+    # Caches (local, sqlite or redis; shared backends reach every worker)
+    CACHE_BACKEND: str = "local"
+    CACHE_URL: Optional[str] = None  # SQLite file path or redis:// URL
+    UNREAD_CACHE_TTL: int = 15
+    UNAPPROVED_CACHE_TTL: int = 10
+    PRINCIPAL_CACHE_TTL: int = 30
+    
+    # Like counters
+    LIKE_FLUSH_INTERVAL_SECONDS: int = 2
+    
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 100
+    RATE_LIMIT_UPLOADS_PER_MINUTE: int = 10
+    RATE_LIMIT_UPLOAD_CHUNKS_PER_MINUTE: int = 120
+    RATE_LIMIT_HLS_PER_MINUTE: int = 600
+    RATE_LIMIT_BACKEND: str = "local"  # local, sqlite or redis
+    RATE_LIMIT_URL: Optional[str] = None  # SQLite file path or redis:// URL
+    
+    # WebSocket fan-out across workers
+    WS_BACKPLANE: str = "memory"  # memory (one process), local (workers on one host) or redis
+    WS_BACKPLANE_URL: Optional[str] = None  # Unix socket path or redis:// URL
+    WS_PRESENCE_SYNC_SECONDS: int = 15
+    WS_SEND_QUEUE_SIZE: int = 64  # Messages queued per socket before it counts as a slow consumer
+    WS_SEND_TIMEOUT_SECONDS: int = 10
+    WS_SLOW_CONSUMER: str = "disconnect"  # disconnect or drop (skip messages while the queue is full)
+    WS_AUDIENCE_REFRESH_SECONDS: int = 300  # Reload of the class/section index (changes from other workers)
+    
+    # Chat persistence (off the event loop)
+    CHAT_DB_THREADS: int = 4  # Keep below DB_POOL_SIZE + DB_MAX_OVERFLOW
+    CHAT_WRITE_BATCH_MS: int = 5  # Messages arriving within this window share one INSERT
+    CHAT_WRITE_MAX_BATCH: int = 200
     
     # Telegram
     TELEGRAM_BOT_TOKEN: Optional[str] = None
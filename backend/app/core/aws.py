@@ -27,6 +27,7 @@ if HAS_AWS_CREDENTIALS:
         's3',
         aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
         aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        endpoint_url=settings.S3_ENDPOINT_URL,  # S3-compatible server (e.g. MinIO) when set
         config=boto_config
     )
 
@@ -71,12 +72,61 @@ def upload_file_to_s3(file_content: bytes, s3_key: str, content_type: str) -> bo
         return False
 
 
-def delete_file_from_s3(s3_key: str) -> bool:
+def upload_local_file_to_s3(
+    local_path: str,
+    s3_key: str,
+    content_type: str,
+    cache_control: Optional[str] = None,
+    bucket: Optional[str] = None,
+    storage_class: Optional[str] = None
+):
+    """
+    Upload a file from disk to S3 (streamed, multipart for large files)
+    Raises on failure so callers can retry or fail the job.
+    """
+    extra_args = {'ContentType': content_type, 'ACL': 'private'}
+    if cache_control:
+        extra_args['CacheControl'] = cache_control
+    if storage_class:
+        extra_args['StorageClass'] = storage_class
+    s3_client.upload_file(local_path, bucket or settings.S3_BUCKET_NAME, s3_key, ExtraArgs=extra_args)
+
+
+def download_s3_file(s3_key: str, local_path: str, bucket: Optional[str] = None):
+    """Download an S3 object to disk (streamed); raises on failure"""
+    s3_client.download_file(bucket or settings.S3_BUCKET_NAME, s3_key, local_path)
+
+
+def get_s3_object_bytes(s3_key: str) -> Optional[bytes]:
+    """Read a (small) S3 object, or None if it does not exist"""
+    try:
+        response = s3_client.get_object(Bucket=settings.S3_BUCKET_NAME, Key=s3_key)
+        return response['Body'].read()
+    except ClientError as e:
+        print(f"Error reading from S3: {e}")
+        return None
+
+
+def delete_prefix_from_s3(prefix: str) -> bool:
+    """Delete every S3 object under a key prefix"""
+    try:
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=settings.S3_BUCKET_NAME, Prefix=prefix):
+            keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+            if keys:
+                s3_client.delete_objects(Bucket=settings.S3_BUCKET_NAME, Delete={'Objects': keys})
+        return True
+    except ClientError as e:
+        print(f"Error deleting prefix from S3: {e}")
+        return False
+
+
+def delete_file_from_s3(s3_key: str, bucket: Optional[str] = None) -> bool:
     """Delete file from S3 bucket or Local Storage"""
     if HAS_AWS_CREDENTIALS:
         try:
             s3_client.delete_object(
-                Bucket=settings.S3_BUCKET_NAME,
+                Bucket=bucket or settings.S3_BUCKET_NAME,
                 Key=s3_key
             )
             return True
@@ -1,23 +1,69 @@
 """
 TTL Cache for lightweight DB read caching
+
+Backends are pluggable so caches can be shared between uvicorn workers:
+- local:  in-process LRU (default, per worker)
+- sqlite: shared SQLite file on the host (CACHE_URL is the file path)
+- redis:  Redis-compatible server (CACHE_URL is the redis:// URL)
+
+With a shared backend every worker reads and invalidates the same entries,
+so a delete in one worker is seen by all others.
 """
-from threading import Lock
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock, local
+from typing import Optional, Any, Callable, List
+import asyncio
+import json
+import sqlite3
 import time
-import os
-from typing import Optional, Any
+from app.config import settings
 
 
-class TTLCache:
-    """Thread-safe TTL cache for lightweight DB read caching."""
-    
-    def __init__(self, ttl_seconds: int = 10, max_entries: int = 128):
-        self.ttl = ttl_seconds
-        self.max_entries = max_entries
-        self._data: dict = {}
+class CacheBackend(ABC):
+    """Interface for cache storage backends. Values must be JSON-serializable."""
+
+    shared = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: float, max_entries: int, prefix: str = ""):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+    def delete_many(self, keys: List[str]):
+        for key in keys:
+            self.delete(key)
+
+    @abstractmethod
+    def clear(self, prefix: str = ""):
+        pass
+
+    @abstractmethod
+    def acquire_lock(self, key: str, ttl: float) -> bool:
+        """Try to take a short-lived lock used for single-flight loading"""
+        pass
+
+    @abstractmethod
+    def release_lock(self, key: str):
+        pass
+
+
+class LocalLRUBackend(CacheBackend):
+    """Thread-safe in-process LRU with per-entry expiry (one instance per cache)."""
+
+    def __init__(self):
+        self._data: OrderedDict = OrderedDict()
+        self._locks: dict = {}
         self._lock = Lock()
 
     def get(self, key: str) -> Optional[Any]:
-        """Get value from cache if not expired"""
         now = time.time()
         with self._lock:
             payload = self._data.get(key)
@@ -27,33 +73,249 @@ class TTLCache:
             if expires < now:
                 self._data.pop(key, None)
                 return None
+            self._data.move_to_end(key)
             return value
 
-    def set(self, key: str, value: Any):
-        """Set value in cache with TTL"""
-        expires = time.time() + self.ttl
+    def set(self, key: str, value: Any, ttl: float, max_entries: int, prefix: str = ""):
+        expires = time.time() + ttl
         with self._lock:
-            if len(self._data) >= self.max_entries:
-                # Remove oldest entry
-                oldest_key = next(iter(self._data))
-                self._data.pop(oldest_key, None)
             self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            # Evict least recently used entry
+            while len(self._data) > max_entries:
+                self._data.popitem(last=False)
 
     def delete(self, key: str):
-        """Delete key from cache"""
         with self._lock:
             self._data.pop(key, None)
 
+    def delete_many(self, keys: List[str]):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self, prefix: str = ""):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                self._data.pop(key, None)
+
+    def acquire_lock(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if self._locks.get(key, 0) > now:
+                return False
+            self._locks[key] = now + ttl
+            return True
+
+    def release_lock(self, key: str):
+        with self._lock:
+            self._locks.pop(key, None)
+
+
+class SQLiteBackend(CacheBackend):
+    """Cache shared by all workers on one host through a SQLite file."""
+
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_locks ("
+            "key TEXT PRIMARY KEY, expires REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._conn().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND expires >= ?",
+            (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: float, max_entries: int, prefix: str = ""):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value), now + ttl)
+        )
+        conn.execute("DELETE FROM cache_entries WHERE expires < ?", (now,))
+        # Evict the entries closest to expiry when this cache is over capacity
+        conn.execute(
+            "DELETE FROM cache_entries WHERE key IN ("
+            "SELECT key FROM cache_entries WHERE key LIKE ? "
+            "ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (prefix + "%", max_entries)
+        )
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def delete_many(self, keys: List[str]):
+        # Stay below SQLite's bound parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            self._conn().execute(
+                f"DELETE FROM cache_entries WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            )
+
+    def clear(self, prefix: str = ""):
+        self._conn().execute("DELETE FROM cache_entries WHERE key LIKE ?", (prefix + "%",))
+
+    def acquire_lock(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_locks WHERE key = ? AND expires < ?", (key, now))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO cache_locks (key, expires) VALUES (?, ?)",
+            (key, now + ttl)
+        )
+        return cursor.rowcount == 1
+
+    def release_lock(self, key: str):
+        self._conn().execute("DELETE FROM cache_locks WHERE key = ?", (key,))
+
+
+class RedisBackend(CacheBackend):
+    """Cache shared through a Redis-compatible server (requires the redis package)."""
+
+    shared = True
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: float, max_entries: int, prefix: str = ""):
+        # Redis enforces memory limits itself (maxmemory-policy), only TTL is set here
+        self._client.set(key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+    def delete_many(self, keys: List[str]):
+        if keys:
+            self._client.delete(*keys)
+
+    def clear(self, prefix: str = ""):
+        keys = list(self._client.scan_iter(match=prefix + "*"))
+        if keys:
+            self._client.delete(*keys)
+
+    def acquire_lock(self, key: str, ttl: float) -> bool:
+        return bool(self._client.set("lock:" + key, "1", nx=True, px=max(1, int(ttl * 1000))))
+
+    def release_lock(self, key: str):
+        self._client.delete("lock:" + key)
+
+
+def create_cache_backend(name: str, url: Optional[str] = None) -> CacheBackend:
+    """Create a cache backend by name ('local', 'sqlite' or 'redis')"""
+    if name == "sqlite":
+        return SQLiteBackend(url or "/tmp/app_cache.sqlite3")
+    if name == "redis":
+        return RedisBackend(url or "redis://localhost:6379/0")
+    return LocalLRUBackend()
+
+
+class TTLCache:
+    """TTL cache for lightweight DB read caching on top of a pluggable backend."""
+
+    def __init__(
+        self,
+        ttl_seconds: int = 10,
+        max_entries: int = 128,
+        namespace: str = "default",
+        backend: Optional[CacheBackend] = None
+    ):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.prefix = f"{namespace}:"
+        self.backend = backend or LocalLRUBackend()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get value from cache if not expired"""
+        return self.backend.get(self.prefix + key)
+
+    def set(self, key: str, value: Any):
+        """Set value in cache with TTL"""
+        self.backend.set(self.prefix + key, value, self.ttl, self.max_entries, self.prefix)
+
+    def delete(self, key: str):
+        """Delete key from cache (visible to all workers with a shared backend)"""
+        self.backend.delete(self.prefix + key)
+
+    def delete_many(self, keys: List[str]):
+        """Delete several keys in one backend operation"""
+        self.backend.delete_many([self.prefix + key for key in keys])
+
     def clear(self):
         """Clear all cache entries"""
-        with self._lock:
-            self._data.clear()
+        self.backend.clear(self.prefix)
 
+    def _load(self, key: str, loader: Callable[[], Any]) -> Any:
+        value = loader()
+        if value is not None:
+            self.set(key, value)
+        return value
 
-# Cache instances
-UNREAD_CACHE_TTL = int(os.getenv('UNREAD_CACHE_TTL', '15'))
-UNAPPROVED_CACHE_TTL = int(os.getenv('UNAPPROVED_CACHE_TTL', '10'))
+    async def get_or_load_async(self, key: str, loader: Callable[[], Any], wait_timeout: float = 1.0) -> Any:
+        """
+        Get value from cache or load it with single-flight protection.
+        Concurrent misses for the same key (in any worker, with a shared
+        backend) run the loader once; the others wait up to wait_timeout for
+        the value, yielding to the event loop, before loading themselves.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        full_key = self.prefix + key
+        if self.backend.acquire_lock(full_key, wait_timeout):
+            try:
+                value = self.get(key)
+                if value is None:
+                    value = self._load(key, loader)
+                return value
+            finally:
+                self.backend.release_lock(full_key)
+
+        deadline = time.time() + wait_timeout
+        while time.time() < deadline:
+            await asyncio.sleep(0.01)
+            value = self.get(key)
+            if value is not None:
+                return value
 
-unread_cache = TTLCache(ttl_seconds=UNREAD_CACHE_TTL, max_entries=2048)
-unapproved_cache = TTLCache(ttl_seconds=UNAPPROVED_CACHE_TTL, max_entries=16)
+        return self._load(key, loader)
 
+
+# Cache instances
+unread_cache = TTLCache(
+    ttl_seconds=settings.UNREAD_CACHE_TTL, max_entries=2048, namespace='unread',
+    backend=create_cache_backend(settings.CACHE_BACKEND, settings.CACHE_URL)
+)
+unapproved_cache = TTLCache(
+    ttl_seconds=settings.UNAPPROVED_CACHE_TTL, max_entries=16, namespace='unapproved',
+    backend=create_cache_backend(settings.CACHE_BACKEND, settings.CACHE_URL)
+)
@@ -0,0 +1,155 @@
+"""
+Chat persistence off the event loop
+
+WebSocket handlers never touch a session directly: database work runs in
+a small dedicated thread pool with a short-lived session per call, so a
+slow commit only occupies a pool thread and idle sockets hold no database
+connection. New messages go through a micro-batching writer: messages
+arriving within CHAT_WRITE_BATCH_MS of each other are inserted with one
+INSERT ... RETURNING in a single transaction.
+"""
+import asyncio
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+from sqlalchemy import insert, update
+from app.config import settings
+from app.database import SessionLocal
+from app.models.message import Message
+from app.services.message_service import record_messages, decrement_unread
+
+logger = logging.getLogger(__name__)
+
+chat_db_executor = ThreadPoolExecutor(max_workers=settings.CHAT_DB_THREADS, thread_name_prefix="chat-db")
+
+
+def _with_session(fn: Callable, *args) -> Any:
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_in_session(fn: Callable, *args) -> Any:
+    """Run fn(db, *args) in the chat thread pool with its own session"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(chat_db_executor, _with_session, fn, *args)
+
+
+class ChatMessageWriter:
+    """
+    Groups messages sent at about the same time into one INSERT transaction
+
+    One batch is written at a time, in arrival order; messages queued while
+    a batch is being written form the next one.
+    """
+
+    def __init__(self, window_ms: int, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def write(self, sender_id: int, receiver_id: int, content: str) -> dict:
+        """
+        Persist a message
+
+        Returns:
+            dict with the id and timestamp of the stored message
+        """
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(({
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "content": content,
+            "is_read": False
+        }, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                saved = await run_in_session(self._insert_batch, [row for row, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    logger.error(f"Failed to save chat message: {e}", exc_info=True)
+                    self._resolve(batch[0][1], error=e)
+                    continue
+                # One bad row (e.g. an unknown receiver) must not fail the others:
+                # write them one by one so only the offending senders get the error
+                logger.warning(f"Failed to save {len(batch)} chat messages as a batch, retrying one by one: {e}")
+                await self._insert_each(batch)
+                continue
+
+            for (_, future), row in zip(batch, saved):
+                self._resolve(future, row)
+
+    async def _insert_each(self, batch: List[tuple]):
+        for row, future in batch:
+            try:
+                saved = await run_in_session(self._insert_batch, [row])
+            except Exception as e:
+                logger.error(f"Failed to save chat message: {e}", exc_info=True)
+                self._resolve(future, error=e)
+                continue
+            self._resolve(future, saved[0])
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: dict = None, error: Exception = None):
+        # The sender may have gone away (cancelled) while the batch was written
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    @staticmethod
+    def _insert_batch(db, rows: List[dict]) -> List[dict]:
+        result = db.execute(
+            insert(Message).returning(Message.id, Message.timestamp, sort_by_parameter_order=True),
+            rows
+        )
+        saved = [{"id": row.id, "timestamp": row.timestamp} for row in result]
+        record_messages(db, [{**row, **saved_row} for row, saved_row in zip(rows, saved)])
+        db.commit()
+        return saved
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+def mark_messages_read(db, receiver_id: int, message_ids: List[int], read_at) -> int:
+    """Mark messages received by a user as read"""
+    result = db.execute(
+        update(Message).where(
+            Message.id.in_(message_ids),
+            Message.receiver_id == receiver_id,
+            Message.is_read == False
+        ).values(is_read=True, read_at=read_at).returning(Message.sender_id)
+    )
+    read_counts = Counter(sender_id for (sender_id,) in result)
+    decrement_unread(db, receiver_id, read_counts)
+    db.commit()
+    return sum(read_counts.values())
+
+
+# Global chat message writer
+chat_writer = ChatMessageWriter(settings.CHAT_WRITE_BATCH_MS, settings.CHAT_WRITE_MAX_BATCH)
@@ -0,0 +1,158 @@
+"""
+Chunk storage for resumable uploads (local disk backend)
+"""
+import hashlib
+import os
+import shutil
+import logging
+import uuid
+from typing import AsyncIterator, Dict, List, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkChecksumError(Exception):
+    """Raised when a chunk's SHA-256 does not match the declared checksum"""
+    pass
+
+
+class ChunkSizeError(Exception):
+    """Raised when a chunk is larger or smaller than the session expects"""
+    pass
+
+
+class LocalChunkStore:
+    """
+    Stores upload chunks as {index:06d}.chunk files with a .sha256 sidecar
+    under base_dir/{upload_id}/. Chunk writes are atomic (temp file + rename)
+    and idempotent: re-sending a chunk with the same checksum is a no-op.
+    """
+    
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+    
+    def session_dir(self, upload_id: str) -> str:
+        return os.path.join(self.base_dir, upload_id)
+    
+    def _chunk_path(self, upload_id: str, index: int) -> str:
+        return os.path.join(self.session_dir(upload_id), f"{index:06d}.chunk")
+    
+    def stored_checksum(self, upload_id: str, index: int) -> str:
+        """Checksum of a stored chunk, or None if the chunk is missing"""
+        try:
+            with open(self._chunk_path(upload_id, index) + ".sha256") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+    
+    async def write_chunk(
+        self,
+        upload_id: str,
+        index: int,
+        body: AsyncIterator[bytes],
+        expected_size: int,
+        expected_sha256: str
+    ) -> int:
+        """
+        Stream a chunk body to disk, verifying size and checksum
+        
+        Returns:
+            Number of bytes written
+        """
+        expected_sha256 = expected_sha256.lower()
+        if self.stored_checksum(upload_id, index) == expected_sha256:
+            return expected_size
+        
+        session_dir = self.session_dir(upload_id)
+        os.makedirs(session_dir, exist_ok=True)
+        chunk_path = self._chunk_path(upload_id, index)
+        # Unique per write: concurrent PUTs of the same chunk (client retries)
+        # must never share a temp file
+        temp_path = f"{chunk_path}.{uuid.uuid4().hex}.tmp"
+        sidecar_temp_path = temp_path + ".sha256"
+        
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            with open(temp_path, "wb") as out:
+                async for data in body:
+                    written += len(data)
+                    if written > expected_size:
+                        raise ChunkSizeError(f"Chunk {index} exceeds {expected_size} bytes")
+                    digest.update(data)
+                    out.write(data)
+            
+            if written != expected_size:
+                raise ChunkSizeError(f"Chunk {index} has {written} bytes, expected {expected_size}")
+            if digest.hexdigest() != expected_sha256:
+                raise ChunkChecksumError(f"Checksum mismatch for chunk {index}")
+            
+            # The sidecar marks the chunk complete: rename it into place last
+            os.replace(temp_path, chunk_path)
+            with open(sidecar_temp_path, "w") as f:
+                f.write(expected_sha256)
+            os.replace(sidecar_temp_path, chunk_path + ".sha256")
+        finally:
+            for path in (temp_path, sidecar_temp_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        
+        return written
+    
+    def received_chunks(self, upload_id: str) -> Dict[int, int]:
+        """Completed chunks as {index: size}"""
+        session_dir = self.session_dir(upload_id)
+        if not os.path.isdir(session_dir):
+            return {}
+        
+        received = {}
+        for name in os.listdir(session_dir):
+            if not name.endswith(".chunk"):
+                continue
+            path = os.path.join(session_dir, name)
+            if os.path.exists(path + ".sha256"):
+                received[int(name[:-len(".chunk")])] = os.path.getsize(path)
+        return received
+    
+    def assemble(self, upload_id: str, chunk_count: int, dest_path: str, hasher=None) -> int:
+        """
+        Concatenate chunks 0..chunk_count-1 into dest_path, streaming
+        With hasher (a hashlib object), it is updated with the assembled bytes.
+        """
+        written = 0
+        with open(dest_path, "wb") as out:
+            for index in range(chunk_count):
+                with open(self._chunk_path(upload_id, index), "rb") as chunk:
+                    while True:
+                        data = chunk.read(1024 * 1024)
+                        if not data:
+                            break
+                        out.write(data)
+                        if hasher is not None:
+                            hasher.update(data)
+                        written += len(data)
+        return written
+    
+    def delete(self, upload_id: str):
+        """Remove all chunks of a session"""
+        session_dir = self.session_dir(upload_id)
+        if os.path.isdir(session_dir):
+            shutil.rmtree(session_dir, ignore_errors=True)
+
+
+def byte_ranges(received: Dict[int, int], chunk_size: int) -> List[Tuple[int, int]]:
+    """Merge received chunk indices into [start, end) byte ranges"""
+    ranges = []
+    for index in sorted(received):
+        start = index * chunk_size
+        end = start + received[index]
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+# Global chunk store (local disk under the persistent upload volume)
+chunk_store = LocalChunkStore(os.path.join(settings.UPLOAD_FOLDER, "resumable"))
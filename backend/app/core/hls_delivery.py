@@ -0,0 +1,135 @@
+"""
+HTTP delivery of local HLS files
+
+Segments, thumbnails and preview sprites never change once written, so they
+are served with a strong ETag, `Cache-Control: immutable` and byte-range
+support. With HLS_ACCEL_REDIRECT_PREFIX set, the response only carries an
+X-Accel-Redirect header and nginx transfers the file (ranges included).
+"""
+import os
+from typing import Optional, Tuple
+from fastapi import HTTPException, Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from app.config import settings
+from app.core.hls_storage import SEGMENT_CACHE_CONTROL
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """Strong ETag from size and modification time (files are written once)"""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range into inclusive (start, end) offsets
+    
+    Returns None for headers that are ignored (other units, multiple
+    ranges, malformed syntax: the full file is served) and raises
+    ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(f"Unsatisfiable range: {header}")
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    return any(tag.strip() in (etag, "*") for tag in header.split(","))
+
+
+def _iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(READ_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def hls_file_response(
+    request: Request,
+    base_dir: str,
+    relative_path: str,
+    media_type: str,
+    cache_control: str = SEGMENT_CACHE_CONTROL
+) -> Response:
+    """
+    Serve a file below the HLS output directory
+    
+    Args:
+        request: Incoming request (conditional and Range headers)
+        base_dir: HLS output base directory
+        relative_path: Path below base_dir, e.g. "12/480p/segment_003.ts"
+        media_type: Content type of the file
+        cache_control: Cache-Control header value
+    """
+    path = os.path.join(base_dir, relative_path)
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    
+    if settings.HLS_ACCEL_REDIRECT_PREFIX:
+        # nginx serves the file from its internal location, handling
+        # ranges and conditional requests itself
+        return Response(
+            media_type=media_type,
+            headers={
+                "X-Accel-Redirect": settings.HLS_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + relative_path,
+                "Cache-Control": cache_control
+            }
+        )
+    
+    etag = file_etag(stat_result)
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range == etag):
+        size = stat_result.st_size
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{size}"}
+            )
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            return StreamingResponse(
+                _iter_file(path, start, length),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=media_type,
+                headers={
+                    **headers,
+                    "Content-Range": f"bytes {start}-{end}/{size}",
+                    "Content-Length": str(length)
+                }
+            )
+    
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat_result)
@@ -4,18 +4,212 @@ Converts uploaded videos to HLS format using FFmpeg for smooth streaming.
 """
 import os
 import asyncio
+from collections import deque
 import subprocess
 import logging
+import math
+import re
+import resource
+import shutil
+import time
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
+from app.config import settings
+from app.core.utils import probe_video
+from app.core.hls_storage import (
+    HLSSegmentUploader, remote_storage_enabled, remote_hls_url, delete_remote_hls, delete_cold_hls
+)
 
 logger = logging.getLogger(__name__)
 
 # HLS Configuration
 HLS_SEGMENT_DURATION = 4  # seconds per segment
-HLS_PLAYLIST_TYPE = "vod"  # Video on Demand
+# Playlists are written as EVENT so they can be played while FFmpeg is still
+# producing segments, then flipped to VOD once the transcode completes
+HLS_PLAYLIST_TYPE = "event"
 HLS_OUTPUT_DIR = "/app/hls"  # Docker container path
+HLS_MASTER_PLAYLIST = "master.m3u8"
+HLS_LEGACY_PLAYLIST = "playlist.m3u8"  # Single-rendition output of older versions
+HLS_THUMBNAIL = "thumbnail.jpg"
+HLS_SPRITE = "sprite.jpg"
+HLS_PREVIEW_TRACK = "thumbnails.vtt"
+
+# Seek preview sprite: fixed-size tiles, letterboxed, SPRITE_COLUMNS per row
+SPRITE_TILE_WIDTH = 160
+SPRITE_TILE_HEIGHT = 90
+SPRITE_COLUMNS = 10
+SPRITE_MAX_TILES = 200  # Longer videos get a wider interval instead of more tiles
+
+# Encoding settings per rendition, keyed by short-side height
+HLS_RENDITION_PRESETS = {
+    240: {"video_bitrate": "400k", "maxrate": "450k", "bufsize": "800k", "audio_bitrate": "64k"},
+    360: {"video_bitrate": "800k", "maxrate": "900k", "bufsize": "1600k", "audio_bitrate": "96k"},
+    480: {"video_bitrate": "1400k", "maxrate": "1500k", "bufsize": "2800k", "audio_bitrate": "96k"},
+    720: {"video_bitrate": "2800k", "maxrate": "3000k", "bufsize": "5600k", "audio_bitrate": "128k"},
+    1080: {"video_bitrate": "5000k", "maxrate": "5350k", "bufsize": "10000k", "audio_bitrate": "128k"},
+}
+
+# H.264 profiles every HLS client decodes
+HLS_REMUX_PROFILES = ("Baseline", "Constrained Baseline", "Main", "High")
+
+
+def select_renditions(source_width: Optional[int], source_height: Optional[int], ladder: str = None) -> List[int]:
+    """
+    Pick the ladder heights that do not upscale the source.
+    Heights refer to the short side, so portrait videos are handled too.
+    Always returns at least the lowest rendition.
+    """
+    ladder = ladder or settings.HLS_RENDITIONS
+    heights = sorted(int(h) for h in ladder.split(",") if h.strip().isdigit() and int(h) in HLS_RENDITION_PRESETS)
+    if not heights:
+        heights = [480]
+    if not source_width or not source_height:
+        return heights
+    short_side = min(source_width, source_height)
+    return [h for h in heights if h <= short_side] or heights[:1]
+
+
+def is_remux_compatible(probe: dict, ladder: str = None) -> bool:
+    """
+    Whether a source can be segmented with stream copy: H.264 in a widely
+    supported profile, 8-bit 4:2:0, no rotation flag (lost in MPEG-TS),
+    no larger than the biggest rendition of the configured ladder or the
+    remux bitrate cap, and AAC audio (or none).
+    """
+    if not probe or probe.get("video_codec") != "h264":
+        return False
+    if probe.get("profile") not in HLS_REMUX_PROFILES:
+        return False
+    if probe.get("pix_fmt") not in ("yuv420p", "yuvj420p"):
+        return False
+    if probe.get("rotation"):
+        return False
+    if not probe.get("width") or not probe.get("height"):
+        return False
+    if min(probe["width"], probe["height"]) > max(select_renditions(None, None, ladder)):
+        return False
+    if (probe.get("bit_rate") or 0) > settings.HLS_REMUX_MAX_BITRATE_KBPS * 1000:
+        return False
+    if probe.get("has_audio"):
+        return probe.get("audio_codec") == "aac" and 0 < (probe.get("audio_channels") or 0) <= 2
+    return True
+
+
+def input_args(input_path: str) -> List[str]:
+    """FFmpeg input arguments; remote (presigned URL) sources reconnect on errors"""
+    if input_path.startswith(("http://", "https://")):
+        return [
+            "-reconnect", "1",
+            "-reconnect_on_network_error", "1",
+            "-reconnect_delay_max", "10",
+            "-i", input_path
+        ]
+    return ["-i", input_path]
+
+
+def sprite_layout(duration: Optional[float]) -> Optional[dict]:
+    """
+    Tile grid of the seek preview sprite for a video of `duration` seconds,
+    sized so the whole video fits in a single image.
+    Returns None when previews are disabled or the duration is unknown.
+    """
+    if not settings.HLS_PREVIEWS or not duration:
+        return None
+    interval = max(settings.HLS_PREVIEW_INTERVAL_SECONDS, math.ceil(duration / SPRITE_MAX_TILES))
+    count = max(1, math.ceil(duration / interval))
+    columns = min(SPRITE_COLUMNS, count)
+    return {
+        "interval": interval,
+        "count": count,
+        "columns": columns,
+        "rows": math.ceil(count / columns),
+        "tile_width": SPRITE_TILE_WIDTH,
+        "tile_height": SPRITE_TILE_HEIGHT,
+        # Poster frame at 1s, or mid-video for shorter clips
+        "thumbnail_time": min(1.0, duration / 2)
+    }
+
+
+def _vtt_timestamp(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    return f"{hours:02d}:{minutes:02d}:{millis // 1000:02d}.{millis % 1000:03d}"
+
+
+def build_preview_track(layout: dict, duration: float, sprite_url: str = HLS_SPRITE) -> str:
+    """WebVTT thumbnails track: one cue per sprite tile using #xywh= media fragments"""
+    lines = ["WEBVTT", ""]
+    width, height = layout["tile_width"], layout["tile_height"]
+    for i in range(layout["count"]):
+        start = i * layout["interval"]
+        end = min(start + layout["interval"], duration)
+        x = (i % layout["columns"]) * width
+        y = (i // layout["columns"]) * height
+        lines += [
+            f"{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}",
+            f"{sprite_url}#xywh={x},{y},{width},{height}",
+            ""
+        ]
+    return "\n".join(lines)
+
+
+def parse_progress(block: dict, duration: Optional[float]) -> dict:
+    """
+    Convert one FFmpeg `-progress` key=value block into a progress snapshot.
+    Percent is derived from out_time against the source duration.
+    """
+    out_time_us = block.get("out_time_us") or block.get("out_time_ms")  # Both are microseconds
+    try:
+        out_time = max(0.0, int(out_time_us) / 1000000.0)
+    except (TypeError, ValueError):
+        out_time = 0.0
+    
+    finished = block.get("progress") == "end"
+    percent = None
+    if finished:
+        percent = 100
+    elif duration:
+        percent = min(99, int(out_time * 100 / duration))
+    
+    # fps is absent for stream copies; speed looks like "2.5x" or "N/A"
+    try:
+        fps = float(block.get("fps", ""))
+    except ValueError:
+        fps = None
+    try:
+        speed = float(block.get("speed", "").rstrip("x"))
+    except ValueError:
+        speed = None
+    
+    return {
+        "out_time": out_time,
+        "percent": percent,
+        "fps": fps,
+        "speed": speed,
+        "finished": finished
+    }
+
+
+def parse_benchmark_cpu(stderr: str) -> Optional[float]:
+    """CPU seconds (user + system) from FFmpeg's `-benchmark` summary line"""
+    match = re.search(r"bench: utime=([\d.]+)s stime=([\d.]+)s", stderr)
+    if not match:
+        return None
+    return float(match.group(1)) + float(match.group(2))
+
+
+def directory_size(path: str) -> int:
+    """Total bytes of all files below path"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
 
 
 class HLSProcessor:
@@ -30,26 +224,258 @@ class HLSProcessor:
         return os.path.join(self.output_base_dir, str(video_id))
     
     def get_playlist_path(self, video_id: int) -> str:
-        """Get the path to the HLS playlist file"""
-        return os.path.join(self.get_video_output_dir(video_id), "playlist.m3u8")
+        """
+        Get the path to the top-level HLS playlist file
+        (master playlist, or the single playlist of videos processed before the ladder)
+        """
+        output_dir = self.get_video_output_dir(video_id)
+        master_path = os.path.join(output_dir, HLS_MASTER_PLAYLIST)
+        legacy_path = os.path.join(output_dir, HLS_LEGACY_PLAYLIST)
+        if not os.path.exists(master_path) and os.path.exists(legacy_path):
+            return legacy_path
+        return master_path
     
     def get_playlist_url(self, video_id: int) -> str:
-        """Get the URL path for the HLS playlist"""
-        return f"/hls/{video_id}/playlist.m3u8"
+        """Get the URL path for the HLS master playlist"""
+        return f"/hls/{video_id}/{HLS_MASTER_PLAYLIST}"
+    
+    def preview_filters(self, sprite_input: str, thumbnail_input: str, layout: dict) -> List[str]:
+        """
+        Filter chains producing the seek preview sprite and the poster
+        thumbnail from two branches of the already decoded video
+        """
+        width, height = layout["tile_width"], layout["tile_height"]
+        return [
+            f"[{sprite_input}]fps=1/{layout['interval']},"
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+            f"tile={layout['columns']}x{layout['rows']}[sprite]",
+            f"[{thumbnail_input}]trim=start={layout['thumbnail_time']:g},scale=320:-2[thumb]",
+        ]
+    
+    def preview_outputs(self, output_dir: str) -> List[str]:
+        """Single-image outputs for the branches built by preview_filters()"""
+        return [
+            "-map", "[sprite]", "-frames:v", "1", "-update", "1", "-q:v", "5",
+            "-y", os.path.join(output_dir, HLS_SPRITE),
+            "-map", "[thumb]", "-frames:v", "1", "-update", "1",
+            "-y", os.path.join(output_dir, HLS_THUMBNAIL),
+        ]
+    
+    def build_remux_command(
+        self,
+        input_path: str,
+        output_dir: str,
+        rendition: str,
+        has_audio: bool = True,
+        preview_layout: Optional[dict] = None
+    ) -> List[str]:
+        """
+        Build an FFmpeg invocation that only re-packages an already compliant
+        source into HLS segments (stream copy, cut on existing keyframes).
+        With preview_layout, the video is also decoded (not re-encoded) to
+        draw the preview sprite and thumbnail in the same read.
+        """
+        cmd = ["ffmpeg", *input_args(input_path)]
+        if preview_layout:
+            cmd += [
+                "-filter_complex",
+                ";".join(["[0:v]split=2[ps][pt]", *self.preview_filters("ps", "pt", preview_layout)])
+            ]
+        cmd += ["-map", "0:v:0"]
+        stream_map = "v:0"
+        if has_audio:
+            cmd += ["-map", "0:a:0"]
+            stream_map += ",a:0"
+        
+        cmd += [
+            "-c", "copy",                 # No re-encoding
+            "-f", "hls",
+            "-hls_time", str(HLS_SEGMENT_DURATION),
+            "-hls_playlist_type", HLS_PLAYLIST_TYPE,
+            "-hls_segment_filename", os.path.join(output_dir, "%v", "segment_%03d.ts"),
+            "-master_pl_name", HLS_MASTER_PLAYLIST,
+            "-var_stream_map", f"{stream_map},name:{rendition}",
+            "-y",
+            os.path.join(output_dir, "%v", "playlist.m3u8")
+        ]
+        if preview_layout:
+            cmd += self.preview_outputs(output_dir)
+        return cmd
+    
+    def build_ffmpeg_command(
+        self,
+        input_path: str,
+        output_dir: str,
+        heights: List[int],
+        has_audio: bool = True,
+        preview_layout: Optional[dict] = None
+    ) -> List[str]:
+        """
+        Build one FFmpeg invocation that decodes once, splits the video into
+        one scaled branch per rendition and writes all variant playlists plus
+        the master playlist. With preview_layout, two more branches write the
+        preview sprite and thumbnail.
+        """
+        count = len(heights)
+        branches = [f"[v{i}]" for i in range(count)]
+        if preview_layout:
+            branches += ["[ps]", "[pt]"]
+        
+        # [0:v]split=N[v0][v1]...; [v0]scale=...[v0out]; ...
+        # Scale the short side to the target height whatever the orientation
+        filters = [f"[0:v]split={len(branches)}" + "".join(branches)]
+        for i, height in enumerate(heights):
+            filters.append(
+                f"[v{i}]scale=w='if(gt(iw,ih),-2,{height})':h='if(gt(iw,ih),{height},-2)'[v{i}out]"
+            )
+        if preview_layout:
+            filters += self.preview_filters("ps", "pt", preview_layout)
+        
+        cmd = ["ffmpeg", *input_args(input_path), "-filter_complex", ";".join(filters)]
+        
+        stream_map = []
+        for i, height in enumerate(heights):
+            preset = HLS_RENDITION_PRESETS[height]
+            cmd += [
+                "-map", f"[v{i}out]",
+                f"-b:v:{i}", preset["video_bitrate"],
+                f"-maxrate:v:{i}", preset["maxrate"],
+                f"-bufsize:v:{i}", preset["bufsize"],
+            ]
+            entry = f"v:{i}"
+            if has_audio:
+                cmd += ["-map", "0:a:0", f"-b:a:{i}", preset["audio_bitrate"]]
+                entry += f",a:{i}"
+            stream_map.append(f"{entry},name:{height}p")
+        
+        cmd += [
+            "-c:v", "libx264",            # H.264 codec
+            "-preset", "fast",            # Fast encoding
+            "-profile:v", "main",
+            # Keyframes on segment boundaries so renditions switch cleanly
+            "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_DURATION})",
+            "-sc_threshold", "0",
+        ]
+        if has_audio:
+            cmd += [
+                "-c:a", "aac",            # AAC audio
+                "-ar", "44100",           # Audio sample rate
+                "-ac", "2",               # Stereo audio
+            ]
+        cmd += [
+            "-f", "hls",                  # HLS format
+            "-hls_time", str(HLS_SEGMENT_DURATION),
+            "-hls_playlist_type", HLS_PLAYLIST_TYPE,
+            "-hls_segment_filename", os.path.join(output_dir, "%v", "segment_%03d.ts"),
+            "-master_pl_name", HLS_MASTER_PLAYLIST,
+            "-var_stream_map", " ".join(stream_map),
+            "-y",                         # Overwrite output
+            os.path.join(output_dir, "%v", "playlist.m3u8")
+        ]
+        if preview_layout:
+            cmd += self.preview_outputs(output_dir)
+        return cmd
+    
+    async def _run_ffmpeg(
+        self,
+        ffmpeg_cmd: List[str],
+        duration: Optional[float],
+        on_progress: Optional[callable] = None
+    ):
+        """
+        Run FFmpeg with `-progress pipe:1`, reporting each progress block
+        to on_progress as it arrives.
+        
+        Returns:
+            (returncode, tail of stderr, CPU seconds used by FFmpeg)
+        """
+        cmd = [ffmpeg_cmd[0], "-progress", "pipe:1", "-nostats", "-benchmark", *ffmpeg_cmd[1:]]
+        usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        
+        # Drain stderr concurrently so FFmpeg never blocks on a full pipe
+        stderr_tail = deque(maxlen=200)
+        
+        async def read_stderr():
+            async for line in process.stderr:
+                stderr_tail.append(line.decode(errors="replace"))
+        
+        stderr_task = asyncio.create_task(read_stderr())
+        try:
+            block = {}
+            async for raw in process.stdout:
+                key, _, value = raw.decode(errors="replace").strip().partition("=")
+                if not key:
+                    continue
+                block[key] = value
+                # Each progress block ends with progress=continue|end
+                if key == "progress":
+                    if on_progress:
+                        await on_progress(parse_progress(block, duration))
+                    block = {}
+            
+            await process.wait()
+            await stderr_task
+        except asyncio.CancelledError:
+            # Worker shutdown: do not leave FFmpeg running
+            process.kill()
+            await process.wait()
+            stderr_task.cancel()
+            raise
+        
+        stderr = "".join(stderr_tail)
+        cpu_seconds = parse_benchmark_cpu(stderr)
+        if cpu_seconds is None:
+            # Children usage delta; over-counts when other jobs finish meanwhile
+            usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+        
+        return process.returncode, stderr, cpu_seconds
+    
+    def finalize_playlists(self, video_id: int):
+        """
+        Flip the variant playlists from EVENT to VOD once all segments are
+        written, so players treat the video as complete and seekable.
+        """
+        output_dir = self.get_video_output_dir(video_id)
+        for name in os.listdir(output_dir):
+            variant_path = os.path.join(output_dir, name, "playlist.m3u8")
+            if not os.path.exists(variant_path):
+                continue
+            with open(variant_path) as f:
+                content = f.read()
+            content = content.replace("#EXT-X-PLAYLIST-TYPE:EVENT", "#EXT-X-PLAYLIST-TYPE:VOD")
+            if "#EXT-X-ENDLIST" not in content:
+                content = content.rstrip("\n") + "\n#EXT-X-ENDLIST\n"
+            temp_path = variant_path + ".tmp"
+            with open(temp_path, "w") as f:
+                f.write(content)
+            os.replace(temp_path, variant_path)
+    
+    def is_streamable(self, video_id: int) -> bool:
+        """Whether the master playlist of an in-progress transcode is published"""
+        return os.path.exists(os.path.join(self.get_video_output_dir(video_id), HLS_MASTER_PLAYLIST))
     
     async def transcode_to_hls(
         self, 
         input_path: str, 
         video_id: int,
-        on_complete: Optional[callable] = None
+        on_complete: Optional[callable] = None,
+        on_progress: Optional[callable] = None
     ) -> dict:
         """
-        Transcode video to HLS format using FFmpeg.
+        Transcode video to a multi-rendition HLS ladder using FFmpeg.
         
         Args:
             input_path: Path to the source video file
             video_id: Database ID of the video
             on_complete: Optional callback when transcoding completes
+            on_progress: Optional async callback receiving parse_progress() dicts
             
         Returns:
             dict with status, output_dir, playlist_path
@@ -57,49 +483,55 @@ class HLSProcessor:
         output_dir = self.get_video_output_dir(video_id)
         os.makedirs(output_dir, exist_ok=True)
         
-        playlist_path = os.path.join(output_dir, "playlist.m3u8")
-        segment_pattern = os.path.join(output_dir, "segment_%03d.ts")
+        playlist_path = os.path.join(output_dir, HLS_MASTER_PLAYLIST)
         
-        # FFmpeg command for HLS conversion
-        # Single quality, optimized for speed
-        ffmpeg_cmd = [
-            "ffmpeg",
-            "-i", input_path,
-            "-c:v", "libx264",           # H.264 codec
-            "-preset", "fast",            # Fast encoding
-            "-crf", "23",                 # Quality (lower = better, 23 is default)
-            "-c:a", "aac",                # AAC audio
-            "-b:a", "128k",               # Audio bitrate
-            "-ar", "44100",               # Audio sample rate
-            "-ac", "2",                   # Stereo audio
-            "-f", "hls",                  # HLS format
-            "-hls_time", str(HLS_SEGMENT_DURATION),
-            "-hls_playlist_type", HLS_PLAYLIST_TYPE,
-            "-hls_segment_filename", segment_pattern,
-            "-y",                         # Overwrite output
-            playlist_path
-        ]
+        # PyAV opens the (possibly remote) source synchronously
+        probe = await asyncio.to_thread(probe_video, input_path) or {}
+        # Seek previews come out of the same decode, not a second FFmpeg read
+        layout = sprite_layout(probe.get("duration"))
+        
+        if settings.HLS_REMUX_COMPLIANT and is_remux_compatible(probe):
+            # Already H.264/AAC: segment the source as-is, no re-encoding
+            mode = "remux"
+            renditions = [f"{min(probe['width'], probe['height'])}p"]
+            ffmpeg_cmd = self.build_remux_command(
+                input_path, output_dir, renditions[0], has_audio=probe["has_audio"],
+                preview_layout=layout
+            )
+        else:
+            # Skip renditions that would upscale the source
+            mode = "transcode"
+            heights = select_renditions(probe.get("width"), probe.get("height"))
+            renditions = [f"{height}p" for height in heights]
+            ffmpeg_cmd = self.build_ffmpeg_command(
+                input_path, output_dir, heights, has_audio=probe.get("has_audio", True),
+                preview_layout=layout
+            )
+        
+        for name in renditions:
+            os.makedirs(os.path.join(output_dir, name), exist_ok=True)
         
-        logger.info(f"Starting HLS transcoding for video {video_id}")
+        logger.info(f"Starting HLS {mode} for video {video_id} ({', '.join(renditions)})")
         logger.debug(f"FFmpeg command: {' '.join(ffmpeg_cmd)}")
         
         try:
             # Run FFmpeg asynchronously
-            process = await asyncio.create_subprocess_exec(
-                *ffmpeg_cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await process.communicate()
+            started = time.monotonic()
+            returncode, stderr, cpu_seconds = await self._run_ffmpeg(ffmpeg_cmd, probe.get("duration"), on_progress)
+            metrics = {
+                "wall_seconds": round(time.monotonic() - started, 3),
+                "cpu_seconds": round(cpu_seconds, 3),
+                "output_bytes": directory_size(output_dir)
+            }
             
-            if process.returncode != 0:
-                error_msg = stderr.decode() if stderr else "Unknown error"
+            if returncode != 0:
+                error_msg = stderr or "Unknown error"
                 logger.error(f"FFmpeg failed for video {video_id}: {error_msg}")
                 return {
                     "status": "failed",
                     "error": error_msg,
-                    "video_id": video_id
+                    "video_id": video_id,
+                    "metrics": metrics
                 }
             
             # Verify output exists
@@ -111,6 +543,8 @@ class HLSProcessor:
                     "video_id": video_id
                 }
             
+            self.finalize_playlists(video_id)
+            preview_track = self.write_preview_track(video_id, layout, probe.get("duration"))
             logger.info(f"HLS transcoding completed for video {video_id}")
             
             result = {
@@ -118,7 +552,12 @@ class HLSProcessor:
                 "video_id": video_id,
                 "output_dir": output_dir,
                 "playlist_path": playlist_path,
-                "playlist_url": self.get_playlist_url(video_id)
+                "playlist_url": self.get_playlist_url(video_id),
+                "renditions": renditions,
+                "mode": mode,
+                "thumbnail_path": self.get_thumbnail_path(video_id),
+                "preview_track": preview_track,
+                "metrics": metrics
             }
             
             if on_complete:
@@ -134,6 +573,31 @@ class HLSProcessor:
                 "video_id": video_id
             }
     
+    def get_thumbnail_path(self, video_id: int) -> Optional[str]:
+        """Local thumbnail written by the transcode, if any"""
+        thumbnail_path = os.path.join(self.get_video_output_dir(video_id), HLS_THUMBNAIL)
+        return thumbnail_path if os.path.exists(thumbnail_path) else None
+    
+    def write_preview_track(self, video_id: int, layout: Optional[dict], duration: Optional[float]) -> Optional[str]:
+        """
+        Write the WebVTT thumbnails track next to the master playlist once
+        the sprite exists (relative cue URLs resolve against the track URL)
+        
+        Returns:
+            Path to the track or None if no sprite was produced
+        """
+        output_dir = self.get_video_output_dir(video_id)
+        if not layout or not os.path.exists(os.path.join(output_dir, HLS_SPRITE)):
+            return None
+        track_path = os.path.join(output_dir, HLS_PREVIEW_TRACK)
+        with open(track_path, "w") as f:
+            f.write(build_preview_track(layout, duration))
+        return track_path
+    
+    def get_preview_track_url(self, video_id: int) -> str:
+        """Get the URL path for the WebVTT thumbnails track"""
+        return f"/hls/{video_id}/{HLS_PREVIEW_TRACK}"
+    
     async def generate_thumbnail(
         self, 
         input_path: str, 
@@ -154,11 +618,11 @@ class HLSProcessor:
         output_dir = self.get_video_output_dir(video_id)
         os.makedirs(output_dir, exist_ok=True)
         
-        thumbnail_path = os.path.join(output_dir, "thumbnail.jpg")
+        thumbnail_path = os.path.join(output_dir, HLS_THUMBNAIL)
         
         ffmpeg_cmd = [
             "ffmpeg",
-            "-i", input_path,
+            *input_args(input_path),
             "-ss", timestamp,
             "-vframes", "1",
             "-vf", "scale=320:-1",  # 320px width, maintain aspect ratio
@@ -186,6 +650,17 @@ class HLSProcessor:
             logger.exception(f"Error generating thumbnail for video {video_id}: {e}")
             return None
     
+    def clear_output_dir(self, video_id: int):
+        """
+        Remove the local output of a previous run before FFmpeg starts, so
+        stale renditions or an old master playlist (is_streamable) are never
+        served as part of the new output
+        """
+        output_dir = self.get_video_output_dir(video_id)
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+            logger.info(f"Cleared previous HLS output of video {video_id}")
+    
     def delete_hls_files(self, video_id: int) -> bool:
         """
         Delete all HLS files for a video.
@@ -198,11 +673,13 @@ class HLSProcessor:
         """
         output_dir = self.get_video_output_dir(video_id)
         
+        if not delete_remote_hls(video_id) or not delete_cold_hls(video_id):
+            return False
+        
         if not os.path.exists(output_dir):
             return True
         
         try:
-            import shutil
             shutil.rmtree(output_dir)
             logger.info(f"Deleted HLS files for video {video_id}")
             return True
@@ -226,22 +703,68 @@ class HLSProcessor:
         if not os.path.exists(output_dir):
             return {"status": "pending", "video_id": video_id}
         
-        if os.path.exists(playlist_path):
-            # Count segments
+        if os.path.basename(playlist_path) == HLS_LEGACY_PLAYLIST:
+            # Single rendition from before the ladder
             segments = [f for f in os.listdir(output_dir) if f.endswith('.ts')]
             return {
                 "status": "ready",
                 "video_id": video_id,
                 "segments_count": len(segments),
-                "playlist_url": self.get_playlist_url(video_id)
+                "playlist_url": f"/hls/{video_id}/{HLS_LEGACY_PLAYLIST}",
+                "renditions": []
+            }
+        
+        renditions = []
+        for name in sorted(os.listdir(output_dir), key=lambda n: int(n[:-1]) if n[:-1].isdigit() else 0):
+            rendition_dir = os.path.join(output_dir, name)
+            if not os.path.isdir(rendition_dir):
+                continue
+            variant_path = os.path.join(rendition_dir, "playlist.m3u8")
+            segments = [f for f in os.listdir(rendition_dir) if f.endswith('.ts')]
+            ready = False
+            if os.path.exists(variant_path):
+                with open(variant_path) as f:
+                    ready = "#EXT-X-ENDLIST" in f.read()
+            renditions.append({
+                "name": name,
+                "ready": ready,
+                "segments_count": len(segments)
+            })
+        
+        if os.path.exists(playlist_path) and renditions and all(r["ready"] for r in renditions):
+            has_previews = os.path.exists(os.path.join(output_dir, HLS_PREVIEW_TRACK))
+            return {
+                "status": "ready",
+                "video_id": video_id,
+                "segments_count": sum(r["segments_count"] for r in renditions),
+                "playlist_url": self.get_playlist_url(video_id),
+                "preview_track_url": self.get_preview_track_url(video_id) if has_previews else None,
+                "renditions": renditions
             }
         
-        return {"status": "processing", "video_id": video_id}
+        return {"status": "processing", "video_id": video_id, "renditions": renditions}
 
 
 # Singleton instance
 hls_processor = HLSProcessor()
 
+# Minimum seconds between progress writes to the videos table
+PROGRESS_WRITE_INTERVAL = 2.0
+
+
+def _update_video(db_session_factory, video_id: int, values: dict):
+    """Apply a column update to a video row in a short-lived session"""
+    from app.models.video import Video
+    
+    db = db_session_factory()
+    try:
+        db.query(Video).filter(Video.id == video_id).update(values, synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        logger.warning(f"Error updating progress for video {video_id}: {e}")
+    finally:
+        db.close()
+
 
 async def process_video_background(
     input_path: str,
@@ -250,7 +773,7 @@ async def process_video_background(
     cleanup_source: bool = True
 ):
     """
-    Background task to process video to HLS format.
+    Process a video to HLS format (run by the transcode worker pool).
     Updates the database when complete.
     
     Args:
@@ -258,8 +781,12 @@ async def process_video_background(
         video_id: Database ID of the video
         db_session_factory: SQLAlchemy session factory
         cleanup_source: Whether to delete the source file after processing
+    
+    Returns:
+        dict with the final status ('ready' or 'failed') and error if any
     """
     from app.models.video import Video
+    from app.core.video_assets import complete_asset
     
     logger.info(f"Background processing started for video {video_id}")
     
@@ -269,66 +796,88 @@ async def process_video_background(
         video = db.query(Video).filter(Video.id == video_id).first()
         if video:
             video.processing_status = "processing"
+            video.processing_progress = 0
             db.commit()
     except Exception as e:
         logger.error(f"Error updating video status: {e}")
     finally:
         db.close()
     
-    # Check if input_path exists locally, if not try to download from S3
+    # Sources that are not on local disk are read by FFmpeg straight from
+    # object storage through a presigned URL (HTTP range requests)
     local_input = input_path
-    downloaded_temp = False
     
     if not os.path.exists(input_path):
-        import tempfile
-        from app.core.aws import s3_client, settings, HAS_AWS_CREDENTIALS
+        from app.core.aws import HAS_AWS_CREDENTIALS, generate_presigned_url
         
         if not HAS_AWS_CREDENTIALS:
              logger.error(f"File not found locally and no AWS credentials: {input_path}")
              # Fail the video processing
-             db = db_session_factory()
-             try:
-                 video = db.query(Video).filter(Video.id == video_id).first()
-                 if video:
-                     video.processing_status = "failed"
-                     video.error_message = "File not found locally"
-                     db.commit()
-             finally:
-                 db.close()
-             return
-
-        logger.info(f"File not found locally: {input_path}. Attempting S3 download...")
+             _update_video(db_session_factory, video_id, {Video.processing_status: "failed"})
+             return {"status": "failed", "error": "File not found locally", "video_id": video_id}
         
-        try:
-            # Create temp file
-            suffix = os.path.splitext(input_path)[1] or '.mp4'
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                local_input = tmp.name
-            
-            # Download
-            s3_client.download_file(settings.S3_BUCKET_NAME, input_path, local_input)
-            downloaded_temp = True
-            logger.info(f"Downloaded S3 key {input_path} to {local_input}")
-            
-        except Exception as e:
-            logger.error(f"Failed to download from S3: {e}")
-            # Fail the video processing
-            db = db_session_factory()
-            try:
-                video = db.query(Video).filter(Video.id == video_id).first()
-                if video:
-                    video.processing_status = "failed"
-                    db.commit()
-            finally:
-                db.close()
-            return
+        local_input = generate_presigned_url(input_path, expiration=settings.HLS_SOURCE_URL_EXPIRE_SECONDS)
+        if not local_input:
+            _update_video(db_session_factory, video_id, {Video.processing_status: "failed"})
+            return {"status": "failed", "error": "Could not sign S3 source URL", "video_id": video_id}
+        logger.info(f"Reading S3 key {input_path} for video {video_id} over HTTP")
+    
+    # Start from an empty output directory (retries, reprocessing)
+    try:
+        await asyncio.to_thread(hls_processor.clear_output_dir, video_id)
+    except OSError as e:
+        logger.error(f"Could not clear previous HLS output of video {video_id}: {e}")
+        _update_video(db_session_factory, video_id, {Video.processing_status: "failed"})
+        return {"status": "failed", "error": f"Could not clear previous output: {e}", "video_id": video_id}
+    
+    # Upload segments to object storage while they are produced
+    uploader = None
+    if remote_storage_enabled():
+        uploader = HLSSegmentUploader(video_id, hls_processor.get_video_output_dir(video_id))
+        uploader.start()
 
+    # Persist progress at most every PROGRESS_WRITE_INTERVAL seconds, and
+    # publish hls_path as soon as the master playlist exists
+    last_report = {"time": 0.0, "published": False}
+    
+    async def report_progress(progress: dict):
+        values = {}
+        if not last_report["published"] and hls_processor.is_streamable(video_id):
+            last_report["published"] = True
+            values[Video.hls_path] = hls_processor.get_playlist_url(video_id)
+        
+        now = time.monotonic()
+        if progress["finished"] or now - last_report["time"] >= PROGRESS_WRITE_INTERVAL:
+            last_report["time"] = now
+            values[Video.processing_progress] = progress["percent"]
+            values[Video.processing_fps] = progress["fps"]
+            values[Video.processing_speed] = progress["speed"]
+            values[Video.processing_out_time] = progress["out_time"]
+        
+        if values:
+            await asyncio.to_thread(_update_video, db_session_factory, video_id, values)
+    
     try:
         # Transcode to HLS
-        result = await hls_processor.transcode_to_hls(local_input, video_id)
+        result = await hls_processor.transcode_to_hls(local_input, video_id, on_progress=report_progress)
         
-        # Generate thumbnail
-        thumbnail_path = await hls_processor.generate_thumbnail(local_input, video_id)
+        # The transcode writes the thumbnail; separate pass only when it could
+        # not (failed transcode, unknown duration or a video shorter than 1s)
+        thumbnail_path = result.get("thumbnail_path")
+        if not thumbnail_path:
+            thumbnail_path = await hls_processor.generate_thumbnail(local_input, video_id)
+        
+        if uploader:
+            if result["status"] == "ready":
+                try:
+                    await uploader.finish()
+                    result["playlist_url"] = remote_hls_url(video_id, HLS_MASTER_PLAYLIST)
+                except Exception as e:
+                    logger.error(f"Failed to upload HLS output of video {video_id}: {e}")
+                    result = {"status": "failed", "error": f"HLS upload failed: {e}", "video_id": video_id}
+            else:
+                await uploader.abort()
+            uploader = None
         
         # Update database with results
         db = db_session_factory()
@@ -338,26 +887,29 @@ async def process_video_background(
                 video.processing_status = result["status"]
                 if result["status"] == "ready":
                     video.hls_path = result["playlist_url"]
+                    video.processing_progress = 100
                 if thumbnail_path:
-                    video.thumbnail_path = f"/hls/{video_id}/thumbnail.jpg"
+                    video.thumbnail_path = (
+                        remote_hls_url(video_id, HLS_THUMBNAIL) if remote_storage_enabled()
+                        else f"/hls/{video_id}/{HLS_THUMBNAIL}"
+                    )
+                # Videos sharing the same upload get the same output
+                complete_asset(db, video)
                 db.commit()
                 logger.info(f"Video {video_id} processing complete: {result['status']}")
         except Exception as e:
             logger.error(f"Error updating video after processing: {e}")
         finally:
             db.close()
+        
+        return result
             
     finally:
-        # Cleanup temp file if we downloaded it
-        if downloaded_temp and os.path.exists(local_input):
-            try:
-                os.remove(local_input)
-                logger.info(f"Cleaned up temp S3 download: {local_input}")
-            except Exception as e:
-                logger.warning(f"Failed to cleanup temp file: {e}")
+        if uploader:
+            await uploader.abort()
         
-        # Cleanup source file if requested AND it was a local original (not S3 download)
-        if cleanup_source and not downloaded_temp and os.path.exists(input_path):
+        # Cleanup source file if requested AND it was a local original (not an S3 key)
+        if cleanup_source and os.path.exists(input_path):
             try:
                 os.remove(input_path)
                 logger.info(f"Cleaned up source file: {input_path}")
@@ -0,0 +1,224 @@
+"""
+Object storage for HLS output (HLS_STORAGE=s3)
+
+Segments are uploaded while FFmpeg is still writing the rest of the video:
+a segment is uploaded as soon as it is listed in its variant playlist
+(FFmpeg only lists closed segments). Playlists and images are uploaded last,
+after the playlists have been flipped to VOD, and the local copy is removed.
+
+Local trees of long-archived videos can also be moved to a cold tier: one
+tar object per tree in a cheaper storage class, unpacked again when played.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Set
+from app.config import settings
+from app.core.aws import (
+    HAS_AWS_CREDENTIALS, upload_local_file_to_s3, delete_prefix_from_s3,
+    download_s3_file, delete_file_from_s3
+)
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    ".ts": "video/mp2t",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".jpg": "image/jpeg",
+    ".vtt": "text/vtt",
+}
+
+# Segments never change once written; playlists must be revalidated
+SEGMENT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PLAYLIST_CACHE_CONTROL = "no-cache"
+
+# Seconds between scans of the variant playlists for new segments
+SCAN_INTERVAL = 1.0
+
+
+def remote_storage_enabled() -> bool:
+    return settings.HLS_STORAGE == "s3" and bool(HAS_AWS_CREDENTIALS)
+
+
+def hls_key(video_id: int, relative_path: str = "") -> str:
+    """S3 key of an HLS file, relative_path as below the local output dir"""
+    return f"hls/{video_id}/{relative_path}"
+
+
+def remote_hls_url(video_id: int, relative_path: str) -> str:
+    """Public URL of an uploaded HLS file (master.m3u8, thumbnail.jpg, ...)"""
+    if settings.CLOUDFRONT_DOMAIN:
+        return f"https://{settings.CLOUDFRONT_DOMAIN}/{hls_key(video_id, relative_path)}"
+    # Served through the API, which reads from the bucket
+    return f"/api/hls/{video_id}/{relative_path}"
+
+
+def delete_remote_hls(video_id: int) -> bool:
+    """Delete all uploaded HLS files of a video"""
+    if not remote_storage_enabled():
+        return True
+    return delete_prefix_from_s3(hls_key(video_id))
+
+
+def cold_storage_enabled() -> bool:
+    return bool(HAS_AWS_CREDENTIALS)
+
+
+def cold_hls_key(video_id: int) -> str:
+    """S3 key of the cold copy of an HLS tree"""
+    return f"cold/hls/{video_id}.tar"
+
+
+def archive_hls_to_cold(video_id: int, output_dir: str) -> int:
+    """
+    Upload an HLS tree to cold storage as a single uncompressed tar
+    (segments are already compressed). Raises on failure.
+    
+    Returns:
+        Size of the uploaded object in bytes
+    """
+    fd, tar_path = tempfile.mkstemp(suffix=".tar")
+    os.close(fd)
+    try:
+        with tarfile.open(tar_path, "w") as tar:
+            tar.add(output_dir, arcname=".")
+        upload_local_file_to_s3(
+            tar_path, cold_hls_key(video_id), "application/x-tar",
+            bucket=settings.COLD_STORAGE_BUCKET,
+            storage_class=settings.COLD_STORAGE_CLASS
+        )
+        return os.path.getsize(tar_path)
+    finally:
+        os.remove(tar_path)
+
+
+def restore_hls_from_cold(video_id: int, output_dir: str):
+    """Download the cold copy of an HLS tree and unpack it into output_dir (raises on failure)"""
+    staging_dir = output_dir + ".restore"
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    fd, tar_path = tempfile.mkstemp(suffix=".tar")
+    os.close(fd)
+    try:
+        download_s3_file(cold_hls_key(video_id), tar_path, bucket=settings.COLD_STORAGE_BUCKET)
+        with tarfile.open(tar_path) as tar:
+            # Only plain files and directories below the tree
+            members = [
+                m for m in tar.getmembers()
+                if (m.isfile() or m.isdir())
+                and not os.path.isabs(m.name)
+                and ".." not in m.name.split("/")
+            ]
+            tar.extractall(staging_dir, members=members)
+        os.replace(staging_dir, output_dir)
+    finally:
+        os.remove(tar_path)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def delete_cold_hls(video_id: int) -> bool:
+    """Delete the cold copy of an HLS tree (if any)"""
+    if not cold_storage_enabled():
+        return True
+    return delete_file_from_s3(cold_hls_key(video_id), bucket=settings.COLD_STORAGE_BUCKET)
+
+
+class HLSSegmentUploader:
+    """Uploads one video's HLS output to S3 while it is being produced"""
+
+    def __init__(self, video_id: int, output_dir: str, max_workers: Optional[int] = None):
+        self.video_id = video_id
+        self.output_dir = output_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or settings.HLS_UPLOAD_CONCURRENCY)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._uploaded: Set[str] = set()
+        self._watch_task: Optional[asyncio.Task] = None
+        self.uploaded_bytes = 0
+
+    def start(self):
+        self._watch_task = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(SCAN_INTERVAL)
+            try:
+                self._scan_segments()
+            except Exception as e:
+                logger.warning(f"Error scanning HLS output of video {self.video_id}: {e}")
+
+    def _scan_segments(self):
+        """Queue uploads for segments newly listed in any variant playlist"""
+        if not os.path.isdir(self.output_dir):
+            return
+        for name in os.listdir(self.output_dir):
+            variant_path = os.path.join(self.output_dir, name, "playlist.m3u8")
+            if not os.path.exists(variant_path):
+                continue
+            with open(variant_path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        self._submit(f"{name}/{line}", SEGMENT_CACHE_CONTROL)
+
+    def _submit(self, relative_path: str, cache_control: str):
+        if relative_path in self._uploaded or relative_path in self._pending:
+            return
+        local_path = os.path.join(self.output_dir, relative_path)
+        content_type = CONTENT_TYPES.get(os.path.splitext(relative_path)[1], "application/octet-stream")
+        loop = asyncio.get_running_loop()
+        self._pending[relative_path] = loop.run_in_executor(
+            self._executor, self._upload, local_path, relative_path, content_type, cache_control
+        )
+
+    def _upload(self, local_path: str, relative_path: str, content_type: str, cache_control: str) -> int:
+        upload_local_file_to_s3(local_path, hls_key(self.video_id, relative_path), content_type, cache_control)
+        return os.path.getsize(local_path)
+
+    async def _drain(self):
+        """Wait for queued uploads; raises the first upload error"""
+        while self._pending:
+            relative_path, future = next(iter(self._pending.items()))
+            try:
+                self.uploaded_bytes += await future
+            finally:
+                self._pending.pop(relative_path, None)
+            self._uploaded.add(relative_path)
+
+    async def finish(self, remove_local: bool = True):
+        """
+        Upload the remaining segments, then playlists and images, and
+        delete the local output directory
+        """
+        if self._watch_task:
+            self._watch_task.cancel()
+        try:
+            self._scan_segments()
+            await self._drain()
+
+            # Everything not yet uploaded: playlists (now VOD), thumbnails, previews
+            for root, _, files in os.walk(self.output_dir):
+                for filename in files:
+                    relative_path = os.path.relpath(os.path.join(root, filename), self.output_dir).replace(os.sep, "/")
+                    if relative_path in self._uploaded:
+                        continue
+                    cache_control = PLAYLIST_CACHE_CONTROL if filename.endswith(".m3u8") else SEGMENT_CACHE_CONTROL
+                    self._submit(relative_path, cache_control)
+            await self._drain()
+        finally:
+            self._executor.shutdown(wait=False)
+
+        logger.info(f"Uploaded HLS output of video {self.video_id} ({self.uploaded_bytes} bytes)")
+        if remove_local:
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    async def abort(self):
+        """Stop uploading after a failed transcode"""
+        if self._watch_task:
+            self._watch_task.cancel()
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,121 @@
+"""
+Write-behind buffer for denormalized video like counters
+"""
+from threading import Lock
+from typing import Dict, Optional, Tuple
+import logging
+import time
+from sqlalchemy.orm import Session
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LikeCounterBuffer:
+    """
+    Coalesces like/unlike deltas per video in memory and applies them to
+    `videos.likes_count` in one UPDATE per video on flush.
+
+    Increments are commutative, so each worker can keep its own buffer.
+    Deltas lost on a crash are repaired by the reconciliation job.
+    """
+
+    def __init__(self):
+        self._deltas: Dict[int, int] = {}
+        self._lock = Lock()
+
+    def add(self, video_id: int, delta: int):
+        """Record a like (+1) or unlike (-1) for a video"""
+        with self._lock:
+            self._deltas[video_id] = self._deltas.get(video_id, 0) + delta
+
+    def pending(self, video_id: int) -> int:
+        """Delta not yet written to the database for a video"""
+        with self._lock:
+            return self._deltas.get(video_id, 0)
+
+    def flush(self, db: Session) -> int:
+        """
+        Apply buffered deltas to the database.
+        Returns the number of videos updated.
+        """
+        from app.models.video import Video
+
+        with self._lock:
+            deltas = {vid: d for vid, d in self._deltas.items() if d}
+            self._deltas.clear()
+
+        if not deltas:
+            return 0
+
+        try:
+            for video_id, delta in deltas.items():
+                db.query(Video).filter(Video.id == video_id).update(
+                    {Video.likes_count: Video.likes_count + delta},
+                    synchronize_session=False
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put deltas back so the next flush retries them
+            with self._lock:
+                for video_id, delta in deltas.items():
+                    self._deltas[video_id] = self._deltas.get(video_id, 0) + delta
+            raise
+
+        return len(deltas)
+
+    def _drift(self, db: Session) -> Dict[int, Tuple[int, int]]:
+        """video id -> (likes_count, COUNT(*) of video_likes) where they differ"""
+        from sqlalchemy import func
+        from app.models.video import Video, VideoLike
+
+        actual = db.query(func.count(VideoLike.id)).filter(
+            VideoLike.video_id == Video.id
+        ).correlate(Video).scalar_subquery()
+        rows = db.query(Video.id, Video.likes_count, actual).filter(Video.likes_count != actual).all()
+        db.rollback()  # Do not keep the snapshot transaction open
+        return {video_id: (stored, count) for video_id, stored, count in rows}
+
+    def reconcile(self, db: Session, settle_seconds: Optional[float] = None) -> int:
+        """
+        Reset videos.likes_count to COUNT(*) of video_likes where it drifted.
+
+        Every worker buffers its own deltas, so a difference may only be a
+        like committed elsewhere and not flushed yet. Drift is measured twice,
+        more than a flush interval apart, and only videos whose counter and
+        like count did not move in between are repaired; the UPDATE is
+        conditional on the counter observed, so a flush (or another
+        reconcile) racing with it wins.
+        Returns the number of videos repaired.
+        """
+        from app.models.video import Video
+
+        if settle_seconds is None:
+            settle_seconds = max(10, 3 * settings.LIKE_FLUSH_INTERVAL_SECONDS)
+
+        self.flush(db)
+        first = self._drift(db)
+        if not first:
+            return 0
+        time.sleep(settle_seconds)
+        second = self._drift(db)
+
+        repaired = 0
+        try:
+            for video_id, (stored, count) in second.items():
+                if first.get(video_id) != (stored, count) or self.pending(video_id):
+                    continue
+                repaired += db.query(Video).filter(
+                    Video.id == video_id,
+                    Video.likes_count == stored
+                ).update({Video.likes_count: count}, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return repaired
+
+
+# Global like counter buffer
+like_counter = LikeCounterBuffer()
@@ -0,0 +1,94 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, and_, or_
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 200
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key of the last row into an opaque cursor"""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> List[Any]:
+    """Decode an opaque cursor back into sort key values for the given columns"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor length mismatch")
+        decoded = []
+        for column, value in zip(columns, values):
+            if value is not None and isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def _after_cursor(order: Sequence[Tuple[Any, bool]], values: Sequence[Any]):
+    """
+    Build the keyset predicate "row sorts after values" for mixed directions:
+    (c1 > v1) OR (c1 = v1 AND c2 > v2) OR ...
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        prefix = [order[j][0] == values[j] for j in range(i)]
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*prefix, step))
+    return or_(*clauses)
+
+
+def paginate(
+    query: Query,
+    order: Sequence[Tuple[Any, bool]],
+    limit: int,
+    cursor: Optional[str] = None,
+    key: Optional[callable] = None
+) -> Tuple[list, Optional[str]]:
+    """
+    Apply keyset pagination to a query.
+
+    Args:
+        query: Base query (filters already applied, no ORDER BY)
+        order: (column, descending) pairs; the last column must be unique (id)
+        limit: Page size
+        cursor: Opaque cursor returned by a previous page
+        key: Extracts sort key values from a row; defaults to reading the
+             column attribute names off the row
+
+    Returns:
+        (rows, next_cursor) where next_cursor is None on the last page
+    """
+    columns = [column for column, _ in order]
+    if cursor:
+        query = query.filter(_after_cursor(order, decode_cursor(cursor, columns)))
+
+    query = query.order_by(*[c.desc() if d else c.asc() for c, d in order])
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if key is not None:
+            values = key(last)
+        else:
+            values = [getattr(last, column.key) for column in columns]
+        next_cursor = encode_cursor(values)
+
+    return rows, next_cursor
@@ -0,0 +1,127 @@
+"""
+Short-TTL cache of authenticated principals for get_current_principal
+
+Entries are keyed by (sub, revocation_token) from the JWT and hold the user's
+column values plus the end date of any active suspension, so an authenticated
+request needs no SELECTs before handler work. Secret columns (the password
+hash) are never cached: they stay unloaded on a cached principal and are
+fetched from the database only if a handler reads them.
+
+Entries are invalidated after commit whenever a User row is updated or deleted
+through the ORM (revocation, kick, logout, profile changes), and explicitly
+when suspensions change. Invalidation writes a short-lived tombstone rather
+than deleting, so a request that loaded the user before the change cannot
+put the stale principal back. With more than one uvicorn worker,
+CACHE_BACKEND must be a shared backend so invalidations reach every worker.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.config import settings
+from app.core.cache import TTLCache, create_cache_backend
+from app.models.user import User
+
+PRINCIPAL_CACHE_TTL = settings.PRINCIPAL_CACHE_TTL
+
+principal_cache = TTLCache(
+    ttl_seconds=PRINCIPAL_CACHE_TTL, max_entries=4096, namespace='principal',
+    backend=create_cache_backend(settings.CACHE_BACKEND, settings.CACHE_URL)
+)
+
+# Credential material must not reach a shared cache backend
+_SECRET_COLUMNS = {"password"}
+_USER_COLUMNS = [c.key for c in User.__table__.columns if c.key not in _SECRET_COLUMNS]
+
+
+@dataclass
+class Principal:
+    """Authenticated user and the end of their active suspension (if any)"""
+    user: User
+    suspended_until: Optional[datetime] = None
+
+
+def _key(username: str, revocation_token: int) -> str:
+    return f"{username}:{revocation_token or 0}"
+
+
+def get_cached_principal(db: Session, username: str, revocation_token: int) -> Optional[Principal]:
+    """
+    Return the principal from the cache or None on a miss.
+    The user is attached to `db` without a query so handlers can use and
+    modify it like a loaded instance.
+    """
+    if PRINCIPAL_CACHE_TTL <= 0:
+        return None
+    data = principal_cache.get(_key(username, revocation_token))
+    if data is None or data.get("stale"):
+        return None
+
+    user = User(**data["user"])
+    make_transient_to_detached(user)
+    user = db.merge(user, load=False)
+
+    suspended_until = data.get("suspended_until")
+    if suspended_until:
+        suspended_until = datetime.fromisoformat(suspended_until)
+    return Principal(user=user, suspended_until=suspended_until)
+
+
+def cache_principal(user: User, revocation_token: int, suspended_until: Optional[datetime]):
+    """Store a freshly loaded principal"""
+    if PRINCIPAL_CACHE_TTL <= 0:
+        return
+    key = _key(user.username, revocation_token)
+    existing = principal_cache.get(key)
+    if existing is not None and existing.get("stale"):
+        return
+    principal_cache.set(key, {
+        "user": {column: getattr(user, column) for column in _USER_COLUMNS},
+        "suspended_until": suspended_until.isoformat() if suspended_until else None
+    })
+
+
+def _mark_stale(username: str, revocation_token: int):
+    principal_cache.set(_key(username, revocation_token), {"stale": True})
+
+
+def invalidate_principal(username: str, revocation_tokens=()):
+    """Drop cached principals of a user for the given revocation token values"""
+    for token in set(revocation_tokens) or {0}:
+        _mark_stale(username, token)
+
+
+def invalidate_user(user: User):
+    """Drop cached principals for a user (current and previous revocation token)"""
+    current = user.session_revocation_token or 0
+    invalidate_principal(user.username, {current, max(0, current - 1)})
+
+
+def _collect_user_changes(session: Session, flush_context, instances=None):
+    """Remember users changed in this transaction; invalidated after commit"""
+    pending = session.info.setdefault("principal_invalidations", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, User):
+            continue
+        state = inspect(obj)
+        usernames = set(state.attrs.username.history.deleted or ()) | {obj.username}
+        tokens = set(state.attrs.session_revocation_token.history.deleted or ())
+        tokens.add(obj.session_revocation_token or 0)
+        for username in usernames:
+            for token in tokens:
+                pending.add((username, token or 0))
+
+
+def _invalidate_after_commit(session: Session):
+    for username, token in session.info.pop("principal_invalidations", ()):
+        _mark_stale(username, token)
+
+
+def _discard_on_rollback(session: Session):
+    session.info.pop("principal_invalidations", None)
+
+
+event.listen(Session, "before_flush", _collect_user_changes)
+event.listen(Session, "after_commit", _invalidate_after_commit)
+event.listen(Session, "after_rollback", _discard_on_rollback)
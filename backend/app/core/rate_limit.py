@@ -1,83 +1,224 @@
 """
 Rate limiting middleware
+
+Uses GCRA (generic cell rate algorithm): each client key stores a single
+"theoretical arrival time" float, so memory and work per request are O(1)
+regardless of the limit. Rules can target route prefixes/methods and key
+clients by user (JWT subject) instead of IP. State is kept in-process by
+default or in a store shared by all workers (RATE_LIMIT_BACKEND=sqlite|redis);
+shared stores do blocking I/O and are called from a worker thread.
 """
-from fastapi import Request, HTTPException, status
+from fastapi import Request, status
 from fastapi.responses import JSONResponse
-from collections import defaultdict
-from datetime import datetime, timedelta
-from typing import Dict, Tuple
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import math
+import sqlite3
 import time
+from app.config import settings
+from app.core.security import decode_token
 
 
-class RateLimiter:
-    """Simple in-memory rate limiter"""
-    
-    def __init__(self, requests_per_minute: int = 100):
-        self.requests_per_minute = requests_per_minute
-        self.requests: Dict[str, list] = defaultdict(list)
-        self.cleanup_interval = 60  # Clean up old entries every 60 seconds
+@dataclass
+class RateLimitRule:
+    """A limit applied to requests matching a path prefix and methods"""
+    name: str
+    requests_per_minute: int
+    path_prefix: str = "/"
+    methods: Optional[Tuple[str, ...]] = None  # None matches every method
+    per_user: bool = False  # Key by the bearer token's user when present instead of IP
+
+    def matches(self, path: str, method: str) -> bool:
+        if not path.startswith(self.path_prefix):
+            return False
+        return self.methods is None or method in self.methods
+
+
+class LocalGCRAStore:
+    """In-process GCRA state: key -> theoretical arrival time"""
+
+    blocking = False
+
+    def __init__(self, cleanup_interval: float = 60):
+        self._tat: Dict[str, float] = {}
+        self._lock = Lock()
+        self.cleanup_interval = cleanup_interval
         self.last_cleanup = time.time()
-    
-    def _cleanup_old_entries(self):
-        """Remove entries older than 1 minute"""
-        current_time = time.time()
-        if current_time - self.last_cleanup < self.cleanup_interval:
-            return
-        
-        cutoff_time = current_time - 60  # 1 minute ago
-        for ip in list(self.requests.keys()):
-            self.requests[ip] = [
-                req_time for req_time in self.requests[ip]
-                if req_time > cutoff_time
-            ]
-            if not self.requests[ip]:
-                del self.requests[ip]
-        
-        self.last_cleanup = current_time
-    
-    def is_allowed(self, ip: str) -> Tuple[bool, int]:
+
+    def update(self, key: str, now: float, interval: float, burst: int) -> Tuple[bool, float]:
+        """
+        Apply one request to `key`.
+        Returns (is_allowed, tat) where tat is the resulting (or current) TAT.
+        """
+        with self._lock:
+            if now - self.last_cleanup >= self.cleanup_interval:
+                # Keys whose TAT has passed are equivalent to absent keys
+                self._tat = {k: t for k, t in self._tat.items() if t > now}
+                self.last_cleanup = now
+
+            tat = max(self._tat.get(key, now), now)
+            new_tat = tat + interval
+            if new_tat - burst * interval > now:
+                return False, tat
+            self._tat[key] = new_tat
+            return True, new_tat
+
+
+class SQLiteGCRAStore:
+    """
+    GCRA state shared by all workers on one host through a SQLite file
+    (single host only; updates wait up to 5s for the file lock)
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        from threading import local
+        self.path = path
+        self._local = local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+        self.last_cleanup = time.time()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def update(self, key: str, now: float, interval: float, burst: int) -> Tuple[bool, float]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if now - self.last_cleanup >= 60:
+                conn.execute("DELETE FROM rate_limits WHERE tat <= ?", (now,))
+                self.last_cleanup = now
+            row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            tat = max(row[0] if row else now, now)
+            new_tat = tat + interval
+            if new_tat - burst * interval > now:
+                conn.execute("COMMIT")
+                return False, tat
+            conn.execute("INSERT OR REPLACE INTO rate_limits (key, tat) VALUES (?, ?)", (key, new_tat))
+            conn.execute("COMMIT")
+            return True, new_tat
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class RedisGCRAStore:
+    """GCRA state shared through a Redis-compatible server (requires the redis package)"""
+
+    blocking = True
+
+    _SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local interval = tonumber(ARGV[2])
+    local burst = tonumber(ARGV[3])
+    local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+    if tat < now then tat = now end
+    local new_tat = tat + interval
+    if new_tat - burst * interval > now then
+        return {0, tostring(tat)}
+    end
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+    return {1, tostring(new_tat)}
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self._SCRIPT)
+
+    def update(self, key: str, now: float, interval: float, burst: int) -> Tuple[bool, float]:
+        allowed, tat = self._script(keys=["ratelimit:" + key], args=[now, interval, burst])
+        return bool(allowed), float(tat)
+
+
+class RateLimiter:
+    """GCRA rate limiter with per-route and per-user rules"""
+
+    def __init__(self, rules: List[RateLimitRule], store=None):
+        self.rules = rules
+        self.store = store or LocalGCRAStore()
+
+    def match_rule(self, path: str, method: str) -> RateLimitRule:
+        """First matching rule; the last rule should be a catch-all default"""
+        for rule in self.rules:
+            if rule.matches(path, method):
+                return rule
+        return self.rules[-1]
+
+    def is_allowed(self, rule: RateLimitRule, client_key: str) -> Tuple[bool, int, int]:
         """
         Check if request is allowed
-        Returns: (is_allowed, remaining_requests)
+        Returns: (is_allowed, remaining_requests, retry_after_seconds)
         """
-        self._cleanup_old_entries()
-        
-        current_time = time.time()
-        cutoff_time = current_time - 60  # 1 minute ago
-        
-        # Filter requests within the last minute
-        self.requests[ip] = [
-            req_time for req_time in self.requests[ip]
-            if req_time > cutoff_time
-        ]
-        
-        # Check if limit exceeded
-        if len(self.requests[ip]) >= self.requests_per_minute:
-            remaining = 0
-            return False, remaining
-        
-        # Add current request
-        self.requests[ip].append(current_time)
-        remaining = self.requests_per_minute - len(self.requests[ip])
-        
-        return True, remaining
-    
-    def get_remaining(self, ip: str) -> int:
-        """Get remaining requests for an IP"""
-        self._cleanup_old_entries()
-        current_time = time.time()
-        cutoff_time = current_time - 60
-        
-        self.requests[ip] = [
-            req_time for req_time in self.requests[ip]
-            if req_time > cutoff_time
-        ]
-        
-        return max(0, self.requests_per_minute - len(self.requests[ip]))
-
-
-# Global rate limiter instance
-rate_limiter = RateLimiter(requests_per_minute=100)
+        limit = rule.requests_per_minute
+        interval = 60.0 / limit
+        now = time.time()
+
+        allowed, tat = self.store.update(f"{rule.name}:{client_key}", now, interval, limit)
+
+        if not allowed:
+            retry_after = max(1, math.ceil(tat + interval - limit * interval - now))
+            return False, 0, retry_after
+
+        remaining = max(0, int((now - (tat - limit * interval)) / interval))
+        return True, remaining, 0
+
+    async def check(self, rule: RateLimitRule, client_key: str) -> Tuple[bool, int, int]:
+        """is_allowed() without blocking the event loop on shared stores"""
+        if self.store.blocking:
+            return await asyncio.to_thread(self.is_allowed, rule, client_key)
+        return self.is_allowed(rule, client_key)
+
+
+def create_rate_limit_store(name: str, url: Optional[str] = None):
+    """Create a GCRA state store by name ('local', 'sqlite' or 'redis')"""
+    if name == "sqlite":
+        return SQLiteGCRAStore(url or "/tmp/app_rate_limit.sqlite3")
+    if name == "redis":
+        return RedisGCRAStore(url or "redis://localhost:6379/0")
+    return LocalGCRAStore()
+
+
+# Global rate limiter instance (most specific rules first)
+rate_limiter = RateLimiter(
+    rules=[
+        RateLimitRule("upload_chunks", settings.RATE_LIMIT_UPLOAD_CHUNKS_PER_MINUTE,
+                      path_prefix="/api/uploads/sessions/", methods=("PUT",), per_user=True),
+        RateLimitRule("uploads", settings.RATE_LIMIT_UPLOADS_PER_MINUTE,
+                      path_prefix="/api/uploads", methods=("POST", "PUT"), per_user=True),
+        RateLimitRule("hls", settings.RATE_LIMIT_HLS_PER_MINUTE,
+                      path_prefix="/api/hls", per_user=True),
+        RateLimitRule("default", settings.RATE_LIMIT_PER_MINUTE),
+    ],
+    store=create_rate_limit_store(settings.RATE_LIMIT_BACKEND, settings.RATE_LIMIT_URL)
+)
+
+
+def _client_key(request: Request, rule: RateLimitRule) -> str:
+    """
+    Rate limit identity: for per-user rules the subject of a valid access
+    token (signature checked, no database lookup), so all tokens of a user
+    share one limit; else the client IP
+    """
+    if rule.per_user:
+        auth = request.headers.get("authorization", "")
+        if auth.lower().startswith("bearer "):
+            payload = decode_token(auth[7:])
+            if payload and payload.get("type") == "access" and payload.get("sub"):
+                return f"user:{payload['sub']}"
+    return "ip:" + (request.client.host if request.client else "unknown")
 
 
 async def rate_limit_middleware(request: Request, call_next):
@@ -85,31 +226,29 @@ async def rate_limit_middleware(request: Request, call_next):
     # Skip rate limiting for health checks and docs
     if request.url.path in ["/health", "/docs", "/redoc", "/openapi.json"]:
         return await call_next(request)
-    
-    # Get client IP
-    client_ip = request.client.host if request.client else "unknown"
-    
+
+    rule = rate_limiter.match_rule(request.url.path, request.method)
+
     # Check rate limit
-    is_allowed, remaining = rate_limiter.is_allowed(client_ip)
-    
+    is_allowed, remaining, retry_after = await rate_limiter.check(rule, _client_key(request, rule))
+
     if not is_allowed:
         return JSONResponse(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             content={
                 "detail": "Rate limit exceeded. Please try again later.",
-                "retry_after": 60
+                "retry_after": retry_after
             },
             headers={
-                "X-RateLimit-Limit": str(rate_limiter.requests_per_minute),
+                "X-RateLimit-Limit": str(rule.requests_per_minute),
                 "X-RateLimit-Remaining": "0",
-                "Retry-After": "60"
+                "Retry-After": str(retry_after)
             }
         )
-    
+
     # Add rate limit headers
     response = await call_next(request)
-    response.headers["X-RateLimit-Limit"] = str(rate_limiter.requests_per_minute)
+    response.headers["X-RateLimit-Limit"] = str(rule.requests_per_minute)
     response.headers["X-RateLimit-Remaining"] = str(remaining)
-    
-    return response
 
+    return response
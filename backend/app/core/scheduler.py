@@ -7,8 +7,12 @@ from sqlalchemy.orm import Session
 from collections import defaultdict
 from app.database import SessionLocal
 from app.models.video import Video
+from app.models.upload_session import UploadSession
+from app.core.like_counter import like_counter
+from app.core.chunk_store import chunk_store
 from app.config import settings
 from app.services.champion_service import get_week_champions
+from app.services.leaderboard_service import rebuild_star_totals
 from app.core.telegram import send_telegram_document, get_telegram_settings_from_env
 from app.core.pdf_generator import create_champions_pdf
 from app.models.telegram_settings import TelegramSettings
@@ -36,8 +40,10 @@ def auto_archive_videos():
         ).all()
         
         count = 0
+        now = datetime.utcnow()
         for video in videos:
             video.is_archived = True
+            video.archived_at = now
             count += 1
         
         db.commit()
@@ -57,6 +63,113 @@ def auto_archive_videos():
         db.close()
 
 
+def flush_like_counters():
+    """
+    Write buffered like/unlike deltas to videos.likes_count
+    """
+    db: Session = SessionLocal()
+    try:
+        return like_counter.flush(db)
+    except Exception as e:
+        logging.error(f"Error flushing like counters: {e}", exc_info=True)
+        return 0
+    finally:
+        db.close()
+
+
+def reconcile_like_counts():
+    """
+    Repair drift between videos.likes_count and the video_likes table.
+    Only drift that persists across a flush interval is repaired, so deltas
+    still buffered in other workers are not applied twice.
+    """
+    db: Session = SessionLocal()
+    try:
+        repaired = like_counter.reconcile(db)
+        
+        if repaired:
+            logging.info(f"Reconciled like counters for {repaired} videos")
+        return {
+            "status": "success",
+            "repaired_count": repaired
+        }
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error reconciling like counts: {e}", exc_info=True)
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+    finally:
+        db.close()
+
+
+def rebuild_leaderboard():
+    """
+    Rebuild user_star_totals from the ratings table to repair any drift
+    """
+    db: Session = SessionLocal()
+    try:
+        count = rebuild_star_totals(db)
+        logging.info(f"Rebuilt star totals for {count} users")
+        return {"status": "success", "users_count": count}
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error rebuilding leaderboard: {e}", exc_info=True)
+        return {"status": "error", "message": str(e)}
+    finally:
+        db.close()
+
+
+def cleanup_upload_sessions():
+    """
+    Remove resumable upload sessions (and their chunks) that were not
+    completed within UPLOAD_SESSION_EXPIRE_HOURS, plus completed session rows
+    """
+    db: Session = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(hours=settings.UPLOAD_SESSION_EXPIRE_HOURS)
+        sessions = db.query(UploadSession).filter(UploadSession.created_at < cutoff).all()
+        
+        for session in sessions:
+            chunk_store.delete(session.id)
+            db.delete(session)
+        db.commit()
+        
+        if sessions:
+            logging.info(f"Removed {len(sessions)} expired upload sessions")
+        return {"status": "success", "removed_count": len(sessions)}
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error cleaning upload sessions: {e}", exc_info=True)
+        return {"status": "error", "message": str(e)}
+    finally:
+        db.close()
+
+
+def apply_storage_lifecycle():
+    """
+    Reclaim local storage of long-archived videos (drop sources, move HLS
+    trees to cold storage)
+    """
+    from app.core.storage_lifecycle import run_storage_lifecycle
+    
+    db: Session = SessionLocal()
+    try:
+        report = run_storage_lifecycle(db, dry_run=False)
+        logging.info(
+            f"Storage lifecycle reclaimed {report['reclaimed_bytes']} bytes "
+            f"({report['delete_source']['count']} sources, {report['cold_hls']['count']} HLS trees)"
+        )
+        return {"status": "success", "report": report}
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error applying storage lifecycle: {e}", exc_info=True)
+        return {"status": "error", "message": str(e)}
+    finally:
+        db.close()
+
+
 def send_week_champions_to_telegram():
     """
     Send week champions to Telegram automatically as PDF files grouped by class and section
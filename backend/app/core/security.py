@@ -1,8 +1,12 @@
 """
-Security utilities: JWT tokens, password hashing
+Security utilities: JWT tokens, password hashing, signed HLS URLs
 """
 from datetime import datetime, timedelta
 from typing import Optional
+import base64
+import hashlib
+import hmac
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.config import settings
@@ -50,3 +54,38 @@ def decode_token(token: str) -> Optional[dict]:
         return payload
     except JWTError:
         return None
+
+
+def _hls_signature(video_id: int, version: int, expires: int) -> str:
+    digest = hmac.new(
+        settings.SECRET_KEY.encode(),
+        f"hls:{video_id}:{version}:{expires}".encode(),
+        hashlib.sha256
+    ).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode()
+
+
+def create_hls_token(video_id: int, version: int = 0) -> str:
+    """
+    Signed, expiring token authorizing the playlists and segments of one video
+    
+    The expiry is rounded up to a quarter of HLS_TOKEN_EXPIRE_SECONDS so all
+    playlist fetches in that window produce the same segment URLs (cacheable).
+    version (output generation, e.g. master playlist mtime) changes the URLs
+    after a video is reprocessed.
+    """
+    window = max(1, settings.HLS_TOKEN_EXPIRE_SECONDS // 4)
+    expires = (int(time.time()) + settings.HLS_TOKEN_EXPIRE_SECONDS) // window * window + window
+    return f"{version}.{expires}.{_hls_signature(video_id, version, expires)}"
+
+
+def verify_hls_token(video_id: int, token: str) -> bool:
+    """Check an HLS token without touching the database"""
+    try:
+        version, expires, signature = token.split(".", 2)
+        version, expires = int(version), int(expires)
+    except ValueError:
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(signature, _hls_signature(video_id, version, expires))
@@ -0,0 +1,220 @@
+"""
+Storage lifecycle of archived videos
+
+Once every video using a source file / HLS output has been archived for
+long enough, the local volume is reclaimed in two steps:
+
+1. after LIFECYCLE_DELETE_SOURCE_DAYS the uploaded source is deleted, as
+   long as its HLS output exists (reprocessing is no longer possible)
+2. after LIFECYCLE_COLD_HLS_DAYS the local HLS tree is moved to cold
+   object storage (storage_tier 'cold')
+
+A cold tree is restored to local disk when the video is played again
+(storage_tier 'restored'; the cold copy is kept, so moving it back later
+only deletes the local tree).
+"""
+import logging
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.video import Video
+from app.models.video_asset import VideoAsset
+from app.core.hls_processor import hls_processor, directory_size
+from app.core.hls_storage import (
+    cold_storage_enabled, remote_storage_enabled, archive_hls_to_cold, restore_hls_from_cold
+)
+
+logger = logging.getLogger(__name__)
+
+# One restore at a time per HLS tree
+_restore_locks: Dict[int, threading.Lock] = {}
+_restore_locks_guard = threading.Lock()
+
+
+def _output_groups(db: Session, days: int) -> List[dict]:
+    """
+    Ready videos archived for at least `days` days, grouped by the files
+    they use. Deduplicated videos only qualify when every other video of
+    their asset is archived for that long too.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    videos = db.query(Video).filter(
+        Video.is_archived == True,
+        Video.archived_at < cutoff,
+        Video.processing_status == 'ready'
+    ).order_by(Video.id).all()
+
+    groups = {}
+    for video in videos:
+        key = ("asset", video.asset_id) if video.asset_id else ("video", video.id)
+        groups.setdefault(key, []).append(video)
+
+    result = []
+    for (kind, key_id), group_videos in groups.items():
+        if kind == "asset":
+            asset = db.query(VideoAsset).filter(VideoAsset.id == key_id).first()
+            if asset is None:
+                continue
+            still_active = db.query(Video.id).filter(
+                Video.asset_id == key_id,
+                or_(Video.is_archived == False, Video.archived_at == None, Video.archived_at >= cutoff)
+            ).first()
+            if still_active:
+                continue
+            result.append({
+                "video_ids": [v.id for v in group_videos],
+                "asset_id": key_id,
+                "source_path": asset.source_path,
+                "output_id": asset.output_video_id,
+                "storage_tier": group_videos[0].storage_tier,
+                "restored_at": group_videos[0].hls_restored_at
+            })
+        else:
+            video = group_videos[0]
+            result.append({
+                "video_ids": [video.id],
+                "asset_id": None,
+                "source_path": video.filepath,
+                "output_id": video.id,
+                "storage_tier": video.storage_tier,
+                "restored_at": video.hls_restored_at
+            })
+    return result
+
+
+def _set_storage_tier(db: Session, group: dict, tier: str, restored_at=None):
+    """Record the tier on every video sharing the output (does not commit)"""
+    query = db.query(Video)
+    if group["asset_id"]:
+        query = query.filter(Video.asset_id == group["asset_id"])
+    else:
+        query = query.filter(Video.id.in_(group["video_ids"]))
+    query.update({
+        Video.storage_tier: tier,
+        Video.hls_restored_at: restored_at
+    }, synchronize_session=False)
+
+
+def _hls_output_exists(group: dict) -> bool:
+    if group["storage_tier"] in ('cold', 'restored'):
+        return True
+    return hls_processor.is_streamable(group["output_id"]) or remote_storage_enabled()
+
+
+def run_storage_lifecycle(db: Session, dry_run: bool = True) -> dict:
+    """
+    Apply (or with dry_run only report) the lifecycle policy
+
+    Returns:
+        Report with the files and bytes reclaimed (or that would be) per step
+    """
+    report = {
+        "dry_run": dry_run,
+        "generated_at": datetime.utcnow().isoformat(),
+        "delete_source": {"days": settings.LIFECYCLE_DELETE_SOURCE_DAYS, "count": 0, "bytes": 0, "video_ids": []},
+        "cold_hls": {
+            "days": settings.LIFECYCLE_COLD_HLS_DAYS,
+            "enabled": cold_storage_enabled(),
+            "count": 0,
+            "bytes": 0,
+            "video_ids": []
+        },
+        "errors": []
+    }
+
+    # 1. Sources whose HLS output exists
+    if settings.LIFECYCLE_DELETE_SOURCE_DAYS > 0:
+        for group in _output_groups(db, settings.LIFECYCLE_DELETE_SOURCE_DAYS):
+            source_path = group["source_path"]
+            if not os.path.isabs(source_path):
+                source_path = os.path.join(settings.UPLOAD_FOLDER, source_path)
+            # Only local files: S3 keys do not use the local volume
+            if not os.path.isfile(source_path) or not _hls_output_exists(group):
+                continue
+            size = os.path.getsize(source_path)
+            if not dry_run:
+                try:
+                    os.remove(source_path)
+                except OSError as e:
+                    report["errors"].append({"video_ids": group["video_ids"], "error": str(e)})
+                    continue
+            step = report["delete_source"]
+            step["count"] += 1
+            step["bytes"] += size
+            step["video_ids"] += group["video_ids"]
+
+    # 2. Local HLS trees to cold storage
+    if settings.LIFECYCLE_COLD_HLS_DAYS > 0 and cold_storage_enabled():
+        restored_cutoff = datetime.utcnow() - timedelta(days=settings.LIFECYCLE_COLD_HLS_DAYS)
+        for group in _output_groups(db, settings.LIFECYCLE_COLD_HLS_DAYS):
+            output_dir = hls_processor.get_video_output_dir(group["output_id"])
+            if group["storage_tier"] == 'cold' or not os.path.isdir(output_dir):
+                continue
+            restored_at = group["restored_at"]
+            if restored_at is not None:
+                # Played recently: keep it local for another period
+                if restored_at.tzinfo:
+                    restored_at = restored_at.replace(tzinfo=None)
+                if restored_at >= restored_cutoff:
+                    continue
+            size = directory_size(output_dir)
+            if not dry_run:
+                try:
+                    if group["storage_tier"] != 'restored':
+                        archive_hls_to_cold(group["output_id"], output_dir)
+                    _set_storage_tier(db, group, 'cold')
+                    db.commit()
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                except Exception as e:
+                    db.rollback()
+                    report["errors"].append({"video_ids": group["video_ids"], "error": str(e)})
+                    continue
+            step = report["cold_hls"]
+            step["count"] += 1
+            step["bytes"] += size
+            step["video_ids"] += group["video_ids"]
+
+    report["reclaimed_bytes"] = report["delete_source"]["bytes"] + report["cold_hls"]["bytes"]
+    return report
+
+
+def _restore_lock(output_id: int) -> threading.Lock:
+    with _restore_locks_guard:
+        return _restore_locks.setdefault(output_id, threading.Lock())
+
+
+def rehydrate_output(output_id: int):
+    """
+    Bring a cold HLS tree back to local disk (blocking; run in a thread)
+    Concurrent plays of the same video wait for a single download.
+    """
+    with _restore_lock(output_id):
+        output_dir = hls_processor.get_video_output_dir(output_id)
+        if os.path.isdir(output_dir):
+            return
+        logger.info(f"Restoring HLS output {output_id} from cold storage")
+        restore_hls_from_cold(output_id, output_dir)
+
+
+def output_is_cold(db: Session, video: Video) -> bool:
+    """Whether the HLS output a video plays was moved to cold storage"""
+    if video.storage_tier == 'cold':
+        return True
+    if not video.asset_id:
+        return False
+    # Videos sharing an asset share its output and its tier
+    return db.query(Video.id).filter(
+        Video.asset_id == video.asset_id,
+        Video.storage_tier == 'cold'
+    ).first() is not None
+
+
+def mark_restored(db: Session, video: Video):
+    """Record that a cold video's output is back on local disk (does not commit)"""
+    group = {"asset_id": video.asset_id, "video_ids": [video.id]}
+    _set_storage_tier(db, group, 'restored', datetime.utcnow())
@@ -0,0 +1,334 @@
+"""
+Persistent transcoding queue
+
+Jobs live in the transcode_jobs table so they survive restarts. A worker
+pool claims jobs by priority, runs at most a fixed number of FFmpeg
+processes at once (derived from the CPU count), retries failures with
+exponential backoff and requeues jobs whose worker stopped heartbeating.
+
+The pool runs inside the API process (TRANSCODE_WORKER_MODE=embedded) or
+as a separate process with `python -m app.worker`.
+"""
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.transcode_job import TranscodeJob
+
+logger = logging.getLogger(__name__)
+
+
+def default_concurrency() -> int:
+    """Concurrent FFmpeg jobs for this host"""
+    concurrency = max(1, int((os.cpu_count() or 1) * settings.TRANSCODE_JOBS_PER_CORE))
+    if settings.TRANSCODE_MAX_CONCURRENCY > 0:
+        concurrency = min(concurrency, settings.TRANSCODE_MAX_CONCURRENCY)
+    return concurrency
+
+
+def enqueue_transcode(
+    db: Session,
+    video_id: int,
+    input_path: str,
+    priority: int = 0,
+    cleanup_source: bool = False
+) -> TranscodeJob:
+    """
+    Queue a video for HLS processing (does not commit)
+    A job still waiting for or running on the same video is reused instead
+    of duplicated.
+    """
+    job = db.query(TranscodeJob).filter(
+        TranscodeJob.video_id == video_id,
+        TranscodeJob.status.in_(('queued', 'running'))
+    ).order_by(TranscodeJob.id.desc()).first()
+
+    if job is not None and job.status == 'running':
+        return job
+    if job is None:
+        job = TranscodeJob(video_id=video_id, status='queued', attempts=0)
+        db.add(job)
+
+    job.input_path = input_path
+    job.cleanup_source = cleanup_source
+    job.priority = max(priority, job.priority or 0)
+    job.max_attempts = settings.TRANSCODE_MAX_ATTEMPTS
+    job.run_after = datetime.utcnow()
+    return job
+
+
+def get_video_job(db: Session, video_id: int) -> Optional[TranscodeJob]:
+    """Most recent job for a video"""
+    return db.query(TranscodeJob).filter(
+        TranscodeJob.video_id == video_id
+    ).order_by(TranscodeJob.id.desc()).first()
+
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[TranscodeJob]:
+    """
+    Atomically claim the highest-priority runnable job
+    The conditional UPDATE makes concurrent claims from several processes safe.
+    """
+    now = datetime.utcnow()
+    candidates = db.query(TranscodeJob.id).filter(
+        TranscodeJob.status == 'queued',
+        TranscodeJob.run_after <= now
+    ).order_by(
+        TranscodeJob.priority.desc(), TranscodeJob.id
+    ).limit(5).all()
+
+    for (job_id,) in candidates:
+        claimed = db.query(TranscodeJob).filter(
+            TranscodeJob.id == job_id,
+            TranscodeJob.status == 'queued'
+        ).update({
+            TranscodeJob.status: 'running',
+            TranscodeJob.attempts: TranscodeJob.attempts + 1,
+            TranscodeJob.locked_by: worker_id,
+            TranscodeJob.heartbeat_at: now,
+            TranscodeJob.started_at: now
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return db.query(TranscodeJob).filter(TranscodeJob.id == job_id).first()
+
+    return None
+
+
+def heartbeat_job(db: Session, job_id: int, worker_id: str):
+    """Mark a running job as still alive"""
+    db.query(TranscodeJob).filter(
+        TranscodeJob.id == job_id,
+        TranscodeJob.locked_by == worker_id
+    ).update({TranscodeJob.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+
+
+def finish_job(
+    db: Session,
+    job_id: int,
+    succeeded: bool,
+    error: Optional[str] = None,
+    metrics: Optional[dict] = None
+):
+    """
+    Record the outcome and resource usage of a job
+    Failed jobs are retried with exponential backoff until max_attempts.
+    """
+    from app.models.video import Video
+
+    job = db.query(TranscodeJob).filter(TranscodeJob.id == job_id).first()
+    if not job:
+        return
+
+    job.locked_by = None
+    job.last_error = error
+    if metrics:
+        job.wall_seconds = metrics.get("wall_seconds")
+        job.cpu_seconds = metrics.get("cpu_seconds")
+        job.output_bytes = metrics.get("output_bytes")
+
+    if succeeded:
+        job.status = 'done'
+        job.finished_at = datetime.utcnow()
+    elif job.attempts < job.max_attempts:
+        delay = settings.TRANSCODE_RETRY_BACKOFF_SECONDS * (2 ** (job.attempts - 1))
+        job.status = 'queued'
+        job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+        db.query(Video).filter(Video.id == job.video_id).update(
+            {Video.processing_status: 'pending'}, synchronize_session=False
+        )
+        logger.warning(f"Transcode job {job.id} failed (attempt {job.attempts}), retrying in {delay}s")
+    else:
+        job.status = 'failed'
+        job.finished_at = datetime.utcnow()
+        logger.error(f"Transcode job {job.id} failed after {job.attempts} attempts")
+
+    db.commit()
+
+
+def requeue_stale_jobs(db: Session, worker_id: Optional[str] = None) -> int:
+    """
+    Put running jobs back in the queue when their worker stopped heartbeating
+    (crash or restart); jobs that were on their last attempt fail instead, so
+    a video that takes its worker down is not retried forever.
+    With worker_id, release that worker's jobs right away (shutdown: the
+    interrupted attempt does not count).
+    """
+    from app.models.video import Video
+
+    now = datetime.utcnow()
+    query = db.query(TranscodeJob).filter(TranscodeJob.status == 'running')
+    if worker_id:
+        requeued = query.filter(TranscodeJob.locked_by == worker_id).update({
+            TranscodeJob.status: 'queued',
+            TranscodeJob.locked_by: None,
+            TranscodeJob.attempts: TranscodeJob.attempts - 1,
+            TranscodeJob.run_after: now
+        }, synchronize_session=False)
+        db.commit()
+        return requeued
+
+    cutoff = now - timedelta(seconds=settings.TRANSCODE_STALE_AFTER_SECONDS)
+    query = query.filter(TranscodeJob.heartbeat_at < cutoff)
+
+    exhausted = query.filter(TranscodeJob.attempts >= TranscodeJob.max_attempts)
+    failed_video_ids = [video_id for (video_id,) in exhausted.with_entities(TranscodeJob.video_id).all()]
+    if failed_video_ids:
+        exhausted.update({
+            TranscodeJob.status: 'failed',
+            TranscodeJob.locked_by: None,
+            TranscodeJob.last_error: 'Worker stopped heartbeating on the last attempt',
+            TranscodeJob.finished_at: now
+        }, synchronize_session=False)
+        db.query(Video).filter(Video.id.in_(failed_video_ids)).update(
+            {Video.processing_status: 'failed'}, synchronize_session=False
+        )
+        logger.error(f"Transcode jobs of videos {failed_video_ids} failed: worker died on the last attempt")
+
+    requeued = query.filter(TranscodeJob.attempts < TranscodeJob.max_attempts).update({
+        TranscodeJob.status: 'queued',
+        TranscodeJob.locked_by: None,
+        TranscodeJob.run_after: now
+    }, synchronize_session=False)
+    db.commit()
+    return requeued
+
+
+def queue_stats(db: Session) -> dict:
+    """Job counts per status"""
+    rows = db.query(TranscodeJob.status, func.count(TranscodeJob.id)).group_by(TranscodeJob.status).all()
+    return {status: count for status, count in rows}
+
+
+def job_usage_summary(db: Session, days: int = 7) -> dict:
+    """Resource usage of jobs finished in the last `days` days"""
+    since = datetime.utcnow() - timedelta(days=days)
+    count, wall, cpu, output, avg_wall, avg_cpu = db.query(
+        func.count(TranscodeJob.id),
+        func.coalesce(func.sum(TranscodeJob.wall_seconds), 0),
+        func.coalesce(func.sum(TranscodeJob.cpu_seconds), 0),
+        func.coalesce(func.sum(TranscodeJob.output_bytes), 0),
+        func.avg(TranscodeJob.wall_seconds),
+        func.avg(TranscodeJob.cpu_seconds)
+    ).filter(
+        TranscodeJob.status == 'done',
+        TranscodeJob.finished_at >= since
+    ).one()
+
+    return {
+        "days": days,
+        "jobs_done": count,
+        "total_wall_seconds": round(float(wall), 1),
+        "total_cpu_seconds": round(float(cpu), 1),
+        "total_output_bytes": int(output),
+        "avg_wall_seconds": round(float(avg_wall), 1) if avg_wall is not None else None,
+        "avg_cpu_seconds": round(float(avg_cpu), 1) if avg_cpu is not None else None
+    }
+
+
+class TranscodeWorkerPool:
+    """Runs queued transcode jobs with a fixed number of concurrent slots"""
+
+    def __init__(self, db_session_factory, concurrency: Optional[int] = None):
+        self.db_session_factory = db_session_factory
+        self.concurrency = concurrency or default_concurrency()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = asyncio.Event()
+        self._tasks = []
+
+    def _with_db(self, fn, *args):
+        db = self.db_session_factory()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    async def run(self):
+        """Run until stop() is called"""
+        requeued = await asyncio.to_thread(self._with_db, requeue_stale_jobs)
+        if requeued:
+            logger.info(f"Requeued {requeued} stale transcode jobs")
+
+        logger.info(f"Transcode worker {self.worker_id} started with {self.concurrency} slots")
+        self._tasks = [asyncio.create_task(self._slot()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+        try:
+            await self._stopping.wait()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            # Jobs interrupted by shutdown go straight back to the queue
+            await asyncio.to_thread(self._with_db, requeue_stale_jobs, self.worker_id)
+            logger.info(f"Transcode worker {self.worker_id} stopped")
+
+    def stop(self):
+        self._stopping.set()
+
+    async def _slot(self):
+        while not self._stopping.is_set():
+            try:
+                job = await asyncio.to_thread(self._with_db, claim_next_job, self.worker_id)
+            except Exception as e:
+                logger.error(f"Error claiming transcode job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), settings.TRANSCODE_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run_job(job)
+
+    async def _reaper(self):
+        """Periodically requeue jobs abandoned by dead workers"""
+        while not self._stopping.is_set():
+            await asyncio.sleep(settings.TRANSCODE_STALE_AFTER_SECONDS)
+            try:
+                requeued = await asyncio.to_thread(self._with_db, requeue_stale_jobs)
+                if requeued:
+                    logger.info(f"Requeued {requeued} stale transcode jobs")
+            except Exception as e:
+                logger.error(f"Error requeueing stale transcode jobs: {e}")
+
+    async def _heartbeat(self, job_id: int):
+        interval = max(1, settings.TRANSCODE_STALE_AFTER_SECONDS // 4)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self._with_db, heartbeat_job, job_id, self.worker_id)
+            except Exception as e:
+                logger.warning(f"Heartbeat failed for transcode job {job_id}: {e}")
+
+    async def _run_job(self, job: TranscodeJob):
+        from app.core.hls_processor import process_video_background
+
+        logger.info(f"Running transcode job {job.id} for video {job.video_id} (attempt {job.attempts})")
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            result = await process_video_background(
+                job.input_path, job.video_id, self.db_session_factory,
+                cleanup_source=job.cleanup_source
+            )
+            succeeded, error = result["status"] == "ready", result.get("error")
+            metrics = result.get("metrics")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Transcode job {job.id} crashed: {e}")
+            succeeded, error, metrics = False, str(e), None
+        finally:
+            heartbeat.cancel()
+
+        try:
+            await asyncio.to_thread(self._with_db, finish_job, job.id, succeeded, error, metrics)
+        except Exception as e:
+            logger.error(f"Error recording result of transcode job {job.id}: {e}")
@@ -33,6 +33,98 @@ def get_video_duration(file_path: str) -> Optional[float]:
         return None
 
 
+def _stream_rotation(stream) -> int:
+    """Display rotation in degrees from stream metadata or display matrix side data"""
+    rotate = stream.metadata.get('rotate')
+    if rotate:
+        try:
+            return int(float(rotate)) % 360
+        except ValueError:
+            return 0
+    # Newer FFmpeg/PyAV only expose rotation as a display matrix
+    for side_data in getattr(stream, 'side_data', None) or ():
+        rotation = getattr(side_data, 'rotation', None)
+        if rotation:
+            return int(rotation) % 360
+    return 0
+
+
+def probe_video(file_path: str) -> Optional[dict]:
+    """
+    Read stream information of a video file using PyAV
+
+    Args:
+        file_path: Path to video file
+
+    Returns:
+        dict with width, height, duration, codec/profile/pixel format/rotation
+        of the first video stream and codec/channels of the first audio
+        stream (has_audio False when there is none), or None if error
+    """
+    try:
+        with av.open(file_path) as container:
+            video_stream = next((s for s in container.streams if s.type == 'video'), None)
+            if video_stream is None:
+                return None
+            audio_stream = next((s for s in container.streams if s.type == 'audio'), None)
+            codec_context = video_stream.codec_context
+            return {
+                "width": codec_context.width,
+                "height": codec_context.height,
+                "duration": container.duration / 1000000.0 if container.duration else None,
+                "bit_rate": container.bit_rate,
+                "video_codec": codec_context.name,
+                "profile": codec_context.profile,
+                "pix_fmt": codec_context.pix_fmt,
+                "rotation": _stream_rotation(video_stream),
+                "has_audio": audio_stream is not None,
+                "audio_codec": audio_stream.codec_context.name if audio_stream else None,
+                "audio_channels": audio_stream.codec_context.channels if audio_stream else 0
+            }
+    except Exception as e:
+        print(f"Error probing video: {e}")
+        return None
+
+
+class UploadTooLargeError(Exception):
+    """Raised when a streamed upload exceeds the allowed size"""
+    pass
+
+
+async def save_upload_stream(upload, dest_path: str, max_bytes: int, chunk_size: int = 1024 * 1024, hasher=None) -> int:
+    """
+    Copy an UploadFile to dest_path in fixed-size chunks
+    
+    Args:
+        upload: FastAPI UploadFile
+        dest_path: Destination file path
+        max_bytes: Abort with UploadTooLargeError once this many bytes are exceeded
+        chunk_size: Bytes read per chunk (bounds memory use)
+        hasher: Optional hashlib object updated with every chunk
+    
+    Returns:
+        Number of bytes written
+    """
+    written = 0
+    try:
+        with open(dest_path, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+                out.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return written
+
+
 def secure_filename_arabic(filename: str) -> str:
     """
     Secure filename while preserving Arabic characters
@@ -0,0 +1,221 @@
+"""
+Content-addressed video storage
+
+Uploads are hashed (SHA-256) while they are streamed to disk. Videos with
+the same hash share one VideoAsset: a single source file and a single HLS
+output, transcoded once. ref_count tracks how many videos use an asset;
+the files are deleted when the last of them is deleted.
+"""
+import logging
+import os
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.video import Video
+from app.models.video_asset import VideoAsset
+
+logger = logging.getLogger(__name__)
+
+
+def asset_source_path(asset: VideoAsset) -> str:
+    """Absolute path of an asset's source file"""
+    return os.path.join(settings.UPLOAD_FOLDER, asset.source_path)
+
+
+def _insert_asset(db: Session, values: dict) -> bool:
+    """
+    Create the asset row unless one with the same sha256 exists (does not commit)
+    Concurrent first uploads of the same content both get here; the unique
+    index lets exactly one of them create it.
+
+    Returns:
+        True if this call created the asset
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(VideoAsset).values(**values).on_conflict_do_nothing(
+            index_elements=[VideoAsset.sha256]
+        )
+        return db.execute(stmt).rowcount == 1
+
+    # Generic fallback: let the unique index reject the duplicate
+    try:
+        with db.begin_nested():
+            db.add(VideoAsset(**values))
+        return True
+    except IntegrityError:
+        return False
+
+
+def attach_asset(
+    db: Session,
+    video: Video,
+    sha256: str,
+    size: int,
+    relative_path: str
+) -> bool:
+    """
+    Link a newly uploaded video to the asset with the same content (does not commit)
+
+    The first upload of some content creates the asset. Later uploads take a
+    reference: video.filepath then points at the asset's source file, and a
+    ready asset's HLS output is reused as-is.
+
+    Returns:
+        True if the video must be transcoded, False if it reuses the output
+        of an asset that is ready or already being processed
+    """
+    created = _insert_asset(db, {
+        "sha256": sha256,
+        "size": size,
+        "source_path": relative_path,
+        "output_video_id": video.id,
+        "status": 'pending',
+        "ref_count": 1
+    })
+    asset = db.query(VideoAsset).filter(VideoAsset.sha256 == sha256).with_for_update().one()
+    video.asset = asset
+    if created:
+        return True
+
+    asset.ref_count += 1  # Row is locked by the query above
+
+    if not os.path.exists(asset_source_path(asset)):
+        # Source was removed (storage lifecycle); the new upload replaces it
+        asset.source_path = relative_path
+    video.filepath = asset.source_path
+
+    if asset.status == 'ready':
+        video.processing_status = 'ready'
+        video.processing_progress = 100
+        video.hls_path = asset.hls_path
+        video.thumbnail_path = asset.thumbnail_path
+        # The shared HLS tree may have been moved to cold storage meanwhile
+        sibling = db.query(Video.storage_tier, Video.hls_restored_at).filter(
+            Video.asset_id == asset.id,
+            Video.id != video.id
+        ).order_by(Video.id).first()
+        if sibling:
+            video.storage_tier, video.hls_restored_at = sibling
+        return False
+
+    if asset.status == 'failed':
+        # Try again, with this video owning the output
+        asset.status = 'pending'
+        asset.output_video_id = video.id
+        return True
+
+    # Still being transcoded for another video; complete_asset() updates this one
+    video.processing_status = 'pending'
+    return False
+
+
+def reset_asset(db: Session, asset: VideoAsset, output_video_id: int):
+    """
+    Mark an asset for re-encoding into /app/hls/{output_video_id} (does not commit)
+    All videos sharing it go back to pending until complete_asset().
+    """
+    asset.status = 'pending'
+    asset.output_video_id = output_video_id
+    asset.hls_path = None
+    asset.thumbnail_path = None
+    db.query(Video).filter(Video.asset_id == asset.id).update({
+        Video.processing_status: 'pending',
+        Video.hls_path: None
+    }, synchronize_session=False)
+
+
+def complete_asset(db: Session, video: Video):
+    """
+    Record the outcome of the transcode of `video` on its asset and copy it
+    to every other video sharing the asset (does not commit)
+    """
+    if not video.asset_id:
+        return
+    asset = db.query(VideoAsset).filter(VideoAsset.id == video.asset_id).with_for_update().first()
+    if not asset or asset.output_video_id != video.id:
+        # Output has moved to another video since this job was queued
+        return
+
+    asset.status = 'ready' if video.processing_status == 'ready' else 'failed'
+    asset.hls_path = video.hls_path
+    asset.thumbnail_path = video.thumbnail_path
+
+    values = {Video.processing_status: video.processing_status}
+    if asset.status == 'ready':
+        values.update({
+            Video.hls_path: video.hls_path,
+            Video.thumbnail_path: video.thumbnail_path,
+            Video.processing_progress: 100
+        })
+    db.query(Video).filter(
+        Video.asset_id == asset.id,
+        Video.id != video.id
+    ).update(values, synchronize_session=False)
+
+
+def release_asset(db: Session, video: Video) -> dict:
+    """
+    Drop a video's reference to its stored files before the video is deleted
+    (does not commit)
+
+    Returns:
+        dict with source_path and output_video_id of files no other video
+        uses any more; pass it to delete_asset_files() after committing
+    """
+    if not video.asset_id:
+        # Uploaded before deduplication: the files belong to this video alone
+        return {"source_path": video.filepath, "output_video_id": video.id}
+
+    db.query(VideoAsset).filter(VideoAsset.id == video.asset_id).update(
+        {VideoAsset.ref_count: VideoAsset.ref_count - 1}, synchronize_session=False
+    )
+    asset = db.query(VideoAsset).filter(VideoAsset.id == video.asset_id).first()
+    db.refresh(asset)
+
+    if asset.ref_count <= 0:
+        files = {"source_path": asset.source_path, "output_video_id": asset.output_video_id}
+        video.asset_id = None
+        db.delete(asset)
+        return files
+
+    if asset.status != 'ready' and asset.output_video_id == video.id:
+        # The transcode job goes away with this video; hand it to another user of the asset
+        from app.core.transcode_queue import enqueue_transcode
+
+        successor = db.query(Video).filter(
+            Video.asset_id == asset.id,
+            Video.id != video.id
+        ).order_by(Video.id).first()
+        if successor:
+            asset.output_video_id = successor.id
+            enqueue_transcode(db, successor.id, asset_source_path(asset))
+        return {"source_path": None, "output_video_id": video.id}
+
+    return {"source_path": None, "output_video_id": None}
+
+
+def delete_asset_files(files: Optional[dict]):
+    """Delete the files returned by release_asset()"""
+    from app.core.aws import delete_file_from_s3
+    from app.core.hls_processor import hls_processor
+
+    if not files:
+        return
+    if files.get("output_video_id") is not None:
+        hls_processor.delete_hls_files(files["output_video_id"])
+    source_path = files.get("source_path")
+    if source_path:
+        local_path = os.path.join(settings.UPLOAD_FOLDER, source_path)
+        try:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            else:
+                delete_file_from_s3(source_path)
+        except OSError as e:
+            logger.warning(f"Failed to delete video source {source_path}: {e}")
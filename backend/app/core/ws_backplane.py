@@ -0,0 +1,239 @@
+"""
+Pub/sub backplane for WebSocket fan-out across worker processes
+
+Every published message is delivered to the handler of every worker
+(the publisher included); each worker then forwards it to the sockets it
+holds locally. Backends:
+
+- memory: single process, delivery is a direct call
+- local:  several workers on one host; the worker holding an flock on
+          `<path>.lock` runs a small broker on the Unix socket `<path>` and
+          relays frames to all connected workers. If it exits, another
+          worker takes the lock over.
+- redis:  Redis pub/sub for workers on several hosts (requires the redis package)
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+# Frames are newline-delimited JSON; allow large broadcast payloads
+MAX_FRAME_BYTES = 4 * 1024 * 1024
+RECONNECT_DELAY = 0.5
+
+# Unsent bytes the broker keeps for one worker before dropping it as lagging
+MAX_CLIENT_BUFFER_BYTES = 4 * MAX_FRAME_BYTES
+
+
+class InMemoryBackplane:
+    """Single-process backplane: publishing calls the local handler"""
+
+    def __init__(self):
+        self._handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+
+    async def publish(self, message: dict):
+        if self._handler:
+            await self._handler(message)
+
+    async def stop(self):
+        self._handler = None
+
+
+class LocalBrokerBackplane:
+    """Backplane for several worker processes on one host through a Unix socket broker"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._handler: Optional[Handler] = None
+        self._task: Optional[asyncio.Task] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connected = asyncio.Event()
+        self._lock_file = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._broker_clients: Set[asyncio.StreamWriter] = set()
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket backplane broker at {self.path} not reachable yet")
+
+    def _try_become_broker(self) -> bool:
+        """Take the broker lock (non-blocking); the holder binds the socket"""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.path + ".lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _start_broker(self):
+        # Holding the lock means any existing socket file is stale
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._server = await asyncio.start_unix_server(self._serve_worker, path=self.path, limit=MAX_FRAME_BYTES)
+        logger.info(f"WebSocket backplane broker listening on {self.path}")
+
+    async def _serve_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Broker side: relay every frame from one worker to all workers"""
+        self._broker_clients.add(writer)
+        try:
+            while True:
+                frame = await reader.readline()
+                if not frame:
+                    break
+                for client in list(self._broker_clients):
+                    try:
+                        client.write(frame)
+                    except Exception:
+                        self._broker_clients.discard(client)
+                        continue
+                    if client.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER_BYTES:
+                        # A worker that stopped reading: disconnect it (it
+                        # reconnects) instead of buffering without bound
+                        logger.warning("Dropping lagging worker from the WebSocket backplane broker")
+                        self._broker_clients.discard(client)
+                        client.transport.abort()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError:
+            # Frame over MAX_FRAME_BYTES (readline limit overrun): the stream
+            # can no longer be split into frames, so drop this worker
+            logger.warning("Oversized frame on the WebSocket backplane broker, disconnecting worker")
+        finally:
+            self._broker_clients.discard(writer)
+            writer.close()
+
+    async def _run(self):
+        while True:
+            if self._server is None and self._try_become_broker():
+                try:
+                    await self._start_broker()
+                except OSError as e:
+                    logger.error(f"Could not start WebSocket backplane broker: {e}")
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_FRAME_BYTES)
+            except OSError:
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+
+            self._writer = writer
+            self._connected.set()
+            try:
+                while True:
+                    frame = await reader.readline()
+                    if not frame:
+                        break
+                    try:
+                        await self._handler(json.loads(frame))
+                    except Exception as e:
+                        logger.warning(f"Error handling backplane message: {e}")
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            except ValueError:
+                # Frame over MAX_FRAME_BYTES: drop it and resynchronize by reconnecting
+                logger.warning("Oversized WebSocket backplane frame dropped")
+            finally:
+                self._connected.clear()
+                self._writer = None
+                writer.close()
+            logger.warning("Lost connection to WebSocket backplane broker, reconnecting")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def publish(self, message: dict):
+        writer = self._writer
+        if writer is None:
+            # Broker is being replaced: deliver to this worker's sockets at least
+            logger.warning("WebSocket backplane disconnected, delivering locally only")
+            await self._handler(message)
+            return
+        frame = json.dumps(message).encode() + b"\n"
+        if len(frame) > MAX_FRAME_BYTES:
+            # The broker would reject it; other workers miss this message
+            logger.warning(f"WebSocket backplane message of {len(frame)} bytes too large, delivering locally only")
+            await self._handler(message)
+            return
+        writer.write(frame)
+        await writer.drain()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._writer:
+            self._writer.close()
+        if self._server:
+            self._server.close()
+            for client in list(self._broker_clients):
+                client.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class RedisBackplane:
+    """Backplane through Redis pub/sub (requires the redis package)"""
+
+    def __init__(self, url: str, channel: str = "ws:backplane"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("WS_BACKPLANE=redis requires the 'redis' package")
+        self._client = aioredis.Redis.from_url(url)
+        self.channel = channel
+        self._handler: Optional[Handler] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+        pubsub = self._client.pubsub()
+        await pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub):
+        async for item in pubsub.listen():
+            if item.get("type") != "message":
+                continue
+            try:
+                await self._handler(json.loads(item["data"]))
+            except Exception as e:
+                logger.warning(f"Error handling backplane message: {e}")
+
+    async def publish(self, message: dict):
+        await self._client.publish(self.channel, json.dumps(message))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self._client.close()
+
+
+def create_backplane(name: str, url: Optional[str] = None):
+    """Create a backplane by name ('memory', 'local' or 'redis')"""
+    if name == "local":
+        return LocalBrokerBackplane(url or "/tmp/app_ws_backplane.sock")
+    if name == "redis":
+        return RedisBackplane(url or "redis://localhost:6379/0")
+    return InMemoryBackplane()
@@ -0,0 +1,173 @@
+"""
+Broadcast engine for WebSocket pushes
+
+- AudienceIndex: in-memory class / section / role -> user ids, loaded once
+  and kept current by session events whenever a User row is inserted,
+  updated or deleted through the ORM in this process. Changes made by other
+  workers are picked up by a periodic reload and, for connected users, when
+  they (re)connect.
+- SocketSender: bounded outbound queue plus writer task per socket. Fan-out
+  only enqueues already serialized text, so one slow client never delays
+  the others; a client whose queue is full is a slow consumer and is either
+  skipped or disconnected (WS_SLOW_CONSUMER).
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+from fastapi import WebSocket
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_message(message: dict) -> str:
+    """Serialize a payload once for all recipients (same format as send_json)"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class AudienceIndex:
+    """Precomputed broadcast audiences"""
+
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._users: Dict[int, Tuple[Optional[str], Optional[str], Optional[str]]] = {}
+        self._by_class: Dict[str, Set[int]] = {}
+        self._by_section: Dict[Tuple[str, str], Set[int]] = {}
+        self._by_role: Dict[str, Set[int]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _add(self, user_id: int, role, class_name, section_name):
+        self._users[user_id] = (role, class_name, section_name)
+        if role:
+            self._by_role.setdefault(role, set()).add(user_id)
+        if class_name:
+            self._by_class.setdefault(class_name, set()).add(user_id)
+            if section_name:
+                self._by_section.setdefault((class_name, section_name), set()).add(user_id)
+
+    def _remove(self, user_id: int):
+        entry = self._users.pop(user_id, None)
+        if entry is None:
+            return
+        role, class_name, section_name = entry
+        self._by_role.get(role, set()).discard(user_id)
+        self._by_class.get(class_name, set()).discard(user_id)
+        self._by_section.get((class_name, section_name), set()).discard(user_id)
+
+    def load(self, db: Session):
+        """Rebuild the index with one query"""
+        rows = db.query(User.id, User.role, User.class_name, User.section_name).all()
+        with self._lock:
+            self._users, self._by_class, self._by_section, self._by_role = {}, {}, {}, {}
+            for user_id, role, class_name, section_name in rows:
+                self._add(user_id, role, class_name, section_name)
+            self._loaded_at = time.monotonic()
+        logger.info(f"Broadcast audience index loaded ({len(rows)} users)")
+
+    def needs_load(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def update_user(self, user_id: int, role, class_name, section_name):
+        with self._lock:
+            self._remove(user_id)
+            self._add(user_id, role, class_name, section_name)
+
+    def remove_user(self, user_id: int):
+        with self._lock:
+            self._remove(user_id)
+
+    def members(self, class_name: str = None, section_name: str = None, role: str = None) -> Set[int]:
+        """User ids of a class (and section), or of a role"""
+        with self._lock:
+            if class_name and section_name:
+                return set(self._by_section.get((class_name, section_name), ()))
+            if class_name:
+                return set(self._by_class.get(class_name, ()))
+            if role:
+                return set(self._by_role.get(role, ()))
+            return set()
+
+
+audience_index = AudienceIndex(settings.WS_AUDIENCE_REFRESH_SECONDS)
+
+_AUDIENCE_ATTRS = ("role", "class_name", "section_name")
+
+
+def _collect_audience_changes(session: Session, flush_context):
+    """Remember users whose audience changed in this flush; applied after commit"""
+    pending = session.info.setdefault("audience_changes", {})
+    for obj in session.new:
+        if isinstance(obj, User):
+            pending[obj.id] = (obj.role, obj.class_name, obj.section_name)
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[attr].history.has_changes() for attr in _AUDIENCE_ATTRS):
+            pending[obj.id] = (obj.role, obj.class_name, obj.section_name)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            pending[obj.id] = None
+
+
+def _apply_audience_changes(session: Session):
+    for user_id, entry in session.info.pop("audience_changes", {}).items():
+        if entry is None:
+            audience_index.remove_user(user_id)
+        else:
+            audience_index.update_user(user_id, *entry)
+
+
+def _discard_audience_changes(session: Session):
+    session.info.pop("audience_changes", None)
+
+
+event.listen(Session, "after_flush", _collect_audience_changes)
+event.listen(Session, "after_commit", _apply_audience_changes)
+event.listen(Session, "after_rollback", _discard_audience_changes)
+
+
+class SocketSender:
+    """Bounded outbound queue and writer task of one WebSocket"""
+
+    def __init__(self, websocket: WebSocket, on_failure: Callable[[WebSocket], None]):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self.dropped = 0
+        self._on_failure = on_failure
+        self._task = asyncio.create_task(self._run())
+
+    def enqueue(self, text: str) -> bool:
+        """Queue a serialized message; False if the client is too far behind"""
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def _run(self):
+        while True:
+            text = await self.queue.get()
+            try:
+                # asyncio.timeout rather than wait_for: on 3.11 wait_for can
+                # swallow a cancellation that races with a finished send,
+                # leaving the writer task running after close()
+                async with asyncio.timeout(settings.WS_SEND_TIMEOUT_SECONDS):
+                    await self.websocket.send_text(text)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"WebSocket send failed: {e!r}")
+                self._on_failure(self.websocket)
+                return
+
+    def close(self):
+        self._task.cancel()
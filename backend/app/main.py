@@ -5,15 +5,19 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import time
+import asyncio
 from app.config import settings
 from app.database import engine, Base
 from app.api import auth, videos, uploads, comments, ratings, messages, users, admin, posts, reports, hls, websocket, badges, heroes
 from app.core.rate_limit import rate_limit_middleware
 from app.core.metrics import request_metrics
+from app.core.transcode_queue import TranscodeWorkerPool
+from app.core.chat_writer import chat_writer
 from contextlib import asynccontextmanager
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from app.core.scheduler import scheduled_send_champions, auto_archive_videos
+from apscheduler.triggers.interval import IntervalTrigger
+from app.core.scheduler import scheduled_send_champions, auto_archive_videos, flush_like_counters, reconcile_like_counts, rebuild_leaderboard, cleanup_upload_sessions, apply_storage_lifecycle
 from fastapi.staticfiles import StaticFiles
 import os
 
@@ -53,13 +57,75 @@ async def lifespan(app: FastAPI):
         replace_existing=True
     )
     
+    # Flush buffered like counters
+    scheduler.add_job(
+        flush_like_counters,
+        trigger=IntervalTrigger(seconds=settings.LIKE_FLUSH_INTERVAL_SECONDS),
+        id='flush_like_counters',
+        name='Flush buffered like counters',
+        replace_existing=True
+    )
+    
+    # Reconcile like counters (Daily at 3 AM)
+    scheduler.add_job(
+        reconcile_like_counts,
+        trigger=CronTrigger(hour=3, minute=0),
+        id='reconcile_like_counts',
+        name='Reconcile video like counters',
+        replace_existing=True
+    )
+    
+    # Rebuild materialized leaderboard (Daily at 3:30 AM)
+    scheduler.add_job(
+        rebuild_leaderboard,
+        trigger=CronTrigger(hour=3, minute=30),
+        id='rebuild_leaderboard',
+        name='Rebuild star totals leaderboard',
+        replace_existing=True
+    )
+    
+    # Reclaim storage of long-archived videos (Daily at 4 AM)
+    scheduler.add_job(
+        apply_storage_lifecycle,
+        trigger=CronTrigger(hour=4, minute=0),
+        id='apply_storage_lifecycle',
+        name='Apply archived video storage lifecycle',
+        replace_existing=True
+    )
+    
+    # Remove expired resumable upload sessions (Hourly)
+    scheduler.add_job(
+        cleanup_upload_sessions,
+        trigger=IntervalTrigger(hours=1),
+        id='cleanup_upload_sessions',
+        name='Remove expired resumable uploads',
+        replace_existing=True
+    )
+    
     scheduler.start()
     logger.info("Scheduler started with weekly champions job and daily auto-archive.")
     
+    # Transcoding workers (run in a separate process when mode is 'external')
+    transcode_pool = None
+    transcode_task = None
+    if settings.TRANSCODE_WORKER_MODE == "embedded":
+        from app.database import SessionLocal
+        transcode_pool = TranscodeWorkerPool(SessionLocal)
+        transcode_task = asyncio.create_task(transcode_pool.run())
+    
+    # WebSocket backplane (fan-out to sockets held by other workers)
+    await websocket.manager.start()
+    
     yield
     
     # Shutdown
+    await websocket.manager.stop()
+    await chat_writer.close()
+    if transcode_pool:
+        transcode_pool.stop()
+        await transcode_task
     scheduler.shutdown()
+    flush_like_counters()
     logger.info("Scheduler shut down.")
 
 # Create database tables with retry logic
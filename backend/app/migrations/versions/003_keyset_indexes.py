@@ -0,0 +1,31 @@
+"""Add composite indexes for keyset pagination
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_video_archived_timestamp', 'videos', ['is_archived', 'timestamp', 'id'], unique=False)
+    op.create_index('idx_post_timestamp', 'posts', ['timestamp', 'id'], unique=False)
+    op.create_index('idx_comment_video_pinned_timestamp', 'comments', ['video_id', 'is_pinned', 'timestamp', 'id'], unique=False)
+    op.create_index('idx_message_conversation', 'messages', ['sender_id', 'receiver_id', 'timestamp', 'id'], unique=False)
+    op.create_index('idx_user_role_username', 'users', ['role', 'username', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_user_role_username', table_name='users')
+    op.drop_index('idx_message_conversation', table_name='messages')
+    op.drop_index('idx_comment_video_pinned_timestamp', table_name='comments')
+    op.drop_index('idx_post_timestamp', table_name='posts')
+    op.drop_index('idx_video_archived_timestamp', table_name='videos')
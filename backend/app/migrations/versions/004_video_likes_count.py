@@ -0,0 +1,28 @@
+"""Add denormalized likes_count to videos
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('videos', sa.Column('likes_count', sa.Integer(), nullable=False, server_default='0'))
+    # Backfill from existing likes
+    op.execute(
+        "UPDATE videos SET likes_count = "
+        "(SELECT COUNT(*) FROM video_likes WHERE video_likes.video_id = videos.id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('videos', 'likes_count')
@@ -0,0 +1,52 @@
+"""Add materialized user_star_totals leaderboard table
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_star_totals',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('class_name', sa.String(), nullable=True),
+        sa.Column('section_name', sa.String(), nullable=True),
+        sa.Column('total_stars', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('manhaji_stars', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('ithrai_stars', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index('idx_star_totals_total', 'user_star_totals', ['total_stars'], unique=False)
+    op.create_index('idx_star_totals_class_section_total', 'user_star_totals', ['class_name', 'section_name', 'total_stars'], unique=False)
+
+    # Backfill from existing ratings on approved videos
+    op.execute("""
+        INSERT INTO user_star_totals (user_id, class_name, section_name, total_stars, manhaji_stars, ithrai_stars)
+        SELECT v.user_id, u.class_name, u.section_name,
+               SUM(CAST(r.is_awarded AS INTEGER)),
+               SUM(CASE WHEN c.video_type = 'منهجي' THEN CAST(r.is_awarded AS INTEGER) ELSE 0 END),
+               SUM(CASE WHEN c.video_type = 'اثرائي' THEN CAST(r.is_awarded AS INTEGER) ELSE 0 END)
+        FROM videos v
+        JOIN dynamic_video_ratings r ON r.video_id = v.id
+        JOIN rating_criteria c ON r.criterion_id = c.id
+        JOIN users u ON v.user_id = u.id
+        WHERE v.is_approved = true
+        GROUP BY v.user_id, u.class_name, u.section_name
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_star_totals_class_section_total', table_name='user_star_totals')
+    op.drop_index('idx_star_totals_total', table_name='user_star_totals')
+    op.drop_table('user_star_totals')
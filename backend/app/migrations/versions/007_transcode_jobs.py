@@ -0,0 +1,47 @@
+"""Add transcode_jobs table for the persistent transcoding queue
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'transcode_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('video_id', sa.Integer(), nullable=False),
+        sa.Column('input_path', sa.String(), nullable=False),
+        sa.Column('cleanup_source', sa.Boolean(), server_default='false'),
+        sa.Column('status', sa.String(), nullable=False, server_default='queued'),
+        sa.Column('priority', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='3'),
+        sa.Column('run_after', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.Column('locked_by', sa.String(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['video_id'], ['videos.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_transcode_jobs_id'), 'transcode_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_transcode_jobs_video_id'), 'transcode_jobs', ['video_id'], unique=False)
+    op.create_index('idx_transcode_job_claim', 'transcode_jobs', ['status', 'priority', 'run_after'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_transcode_job_claim', table_name='transcode_jobs')
+    op.drop_index(op.f('ix_transcode_jobs_video_id'), table_name='transcode_jobs')
+    op.drop_index(op.f('ix_transcode_jobs_id'), table_name='transcode_jobs')
+    op.drop_table('transcode_jobs')
@@ -0,0 +1,23 @@
+"""Add processing_progress to videos
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('videos', sa.Column('processing_progress', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('videos', 'processing_progress')
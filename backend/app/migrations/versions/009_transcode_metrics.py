@@ -0,0 +1,35 @@
+"""Add transcoding progress and resource usage columns
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('videos', sa.Column('processing_fps', sa.Float(), nullable=True))
+    op.add_column('videos', sa.Column('processing_speed', sa.Float(), nullable=True))
+    op.add_column('videos', sa.Column('processing_out_time', sa.Float(), nullable=True))
+    op.add_column('transcode_jobs', sa.Column('started_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('transcode_jobs', sa.Column('wall_seconds', sa.Float(), nullable=True))
+    op.add_column('transcode_jobs', sa.Column('cpu_seconds', sa.Float(), nullable=True))
+    op.add_column('transcode_jobs', sa.Column('output_bytes', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('transcode_jobs', 'output_bytes')
+    op.drop_column('transcode_jobs', 'cpu_seconds')
+    op.drop_column('transcode_jobs', 'wall_seconds')
+    op.drop_column('transcode_jobs', 'started_at')
+    op.drop_column('videos', 'processing_out_time')
+    op.drop_column('videos', 'processing_speed')
+    op.drop_column('videos', 'processing_fps')
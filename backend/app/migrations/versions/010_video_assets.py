@@ -0,0 +1,47 @@
+"""Add video_assets table for content-addressed deduplication
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'video_assets',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('source_path', sa.String(), nullable=False),
+        sa.Column('output_video_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False, server_default='pending'),
+        sa.Column('hls_path', sa.String(), nullable=True),
+        sa.Column('thumbnail_path', sa.String(), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_video_assets_id'), 'video_assets', ['id'], unique=False)
+    op.create_index(op.f('ix_video_assets_sha256'), 'video_assets', ['sha256'], unique=True)
+    
+    op.add_column('videos', sa.Column('asset_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_videos_asset_id', 'videos', 'video_assets', ['asset_id'], ['id'], ondelete='SET NULL')
+    op.create_index(op.f('ix_videos_asset_id'), 'videos', ['asset_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_videos_asset_id'), table_name='videos')
+    op.drop_constraint('fk_videos_asset_id', 'videos', type_='foreignkey')
+    op.drop_column('videos', 'asset_id')
+    op.drop_index(op.f('ix_video_assets_sha256'), table_name='video_assets')
+    op.drop_index(op.f('ix_video_assets_id'), table_name='video_assets')
+    op.drop_table('video_assets')
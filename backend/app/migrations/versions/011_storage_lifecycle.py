@@ -0,0 +1,29 @@
+"""Add archive timestamp and HLS storage tier to videos
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('videos', sa.Column('archived_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('videos', sa.Column('storage_tier', sa.String(), nullable=False, server_default='hot'))
+    op.add_column('videos', sa.Column('hls_restored_at', sa.DateTime(timezone=True), nullable=True))
+    # Lifecycle ages of videos archived before this revision start now
+    op.execute("UPDATE videos SET archived_at = now() WHERE is_archived = true")
+
+
+def downgrade() -> None:
+    op.drop_column('videos', 'hls_restored_at')
+    op.drop_column('videos', 'storage_tier')
+    op.drop_column('videos', 'archived_at')
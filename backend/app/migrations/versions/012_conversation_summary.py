@@ -0,0 +1,64 @@
+"""Add conversation_summary table for inboxes
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'conversation_summary',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_low_id', sa.Integer(), nullable=False),
+        sa.Column('user_high_id', sa.Integer(), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_message_preview', sa.String(length=200), nullable=True),
+        sa.Column('last_sender_id', sa.Integer(), nullable=True),
+        sa.Column('unread_low', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('unread_high', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['user_low_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_high_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_low_id', 'user_high_id', name='uq_conversation_pair')
+    )
+    op.create_index(op.f('ix_conversation_summary_id'), 'conversation_summary', ['id'], unique=False)
+    op.create_index('idx_conversation_low_recent', 'conversation_summary', ['user_low_id', 'last_message_at', 'id'], unique=False)
+    op.create_index('idx_conversation_high_recent', 'conversation_summary', ['user_high_id', 'last_message_at', 'id'], unique=False)
+    
+    # Backfill from existing messages
+    op.execute("""
+        INSERT INTO conversation_summary (
+            user_low_id, user_high_id, last_message_id, last_message_at,
+            last_message_preview, last_sender_id, unread_low, unread_high
+        )
+        SELECT pairs.low, pairs.high, m.id, m.timestamp, left(m.content, 200), m.sender_id,
+               pairs.unread_low, pairs.unread_high
+        FROM (
+            SELECT least(sender_id, receiver_id) AS low,
+                   greatest(sender_id, receiver_id) AS high,
+                   max(id) AS last_id,
+                   sum(CASE WHEN receiver_id < sender_id AND is_read IS NOT TRUE THEN 1 ELSE 0 END) AS unread_low,
+                   sum(CASE WHEN receiver_id > sender_id AND is_read IS NOT TRUE THEN 1 ELSE 0 END) AS unread_high
+            FROM messages
+            GROUP BY 1, 2
+        ) pairs
+        JOIN messages m ON m.id = pairs.last_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_conversation_high_recent', table_name='conversation_summary')
+    op.drop_index('idx_conversation_low_recent', table_name='conversation_summary')
+    op.drop_index(op.f('ix_conversation_summary_id'), table_name='conversation_summary')
+    op.drop_table('conversation_summary')
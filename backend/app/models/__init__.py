@@ -9,9 +9,14 @@ from app.models.message import Message
 from app.models.post import Post
 from app.models.suspension import Suspension
 from app.models.star_bank import StarBank
+from app.models.star_total import UserStarTotal
 from app.models.telegram_settings import TelegramSettings
 from app.models.device_binding import DeviceBinding
 from app.models.badge import UserBadge, BadgeThreshold
+from app.models.upload_session import UploadSession
+from app.models.transcode_job import TranscodeJob
+from app.models.video_asset import VideoAsset
+from app.models.conversation_summary import ConversationSummary
 
 __all__ = [
     "User",
@@ -24,8 +29,13 @@ __all__ = [
     "Post",
     "Suspension",
     "StarBank",
+    "UserStarTotal",
     "TelegramSettings",
     "DeviceBinding",
     "UserBadge",
     "BadgeThreshold",
+    "UploadSession",
+    "TranscodeJob",
+    "VideoAsset",
+    "ConversationSummary",
 ]
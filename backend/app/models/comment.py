@@ -1,7 +1,7 @@
 """
 Comment model
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -22,3 +22,7 @@ class Comment(Base):
     user = relationship("User", back_populates="comments")
     video = relationship("Video", back_populates="comments")
     parent = relationship("Comment", remote_side=[id], backref="replies")
+    
+    __table_args__ = (
+        Index('idx_comment_video_pinned_timestamp', 'video_id', 'is_pinned', 'timestamp', 'id'),
+    )
@@ -0,0 +1,30 @@
+"""
+Conversation summary model
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, UniqueConstraint
+from app.database import Base
+
+
+class ConversationSummary(Base):
+    """
+    Latest message and unread counts of one conversation, maintained on send
+    and read so inboxes need no per-conversation queries. Each user pair has
+    one row, stored ordered (user_low_id < user_high_id).
+    """
+    __tablename__ = "conversation_summary"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_low_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_high_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    last_message_id = Column(Integer, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    last_message_preview = Column(String(200), nullable=True)
+    last_sender_id = Column(Integer, nullable=True)
+    unread_low = Column(Integer, nullable=False, default=0)  # Unread messages received by user_low_id
+    unread_high = Column(Integer, nullable=False, default=0)  # Unread messages received by user_high_id
+    
+    __table_args__ = (
+        UniqueConstraint('user_low_id', 'user_high_id', name='uq_conversation_pair'),
+        Index('idx_conversation_low_recent', 'user_low_id', 'last_message_at', 'id'),
+        Index('idx_conversation_high_recent', 'user_high_id', 'last_message_at', 'id'),
+    )
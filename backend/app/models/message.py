@@ -24,4 +24,5 @@ class Message(Base):
     
     __table_args__ = (
         Index('idx_message_receiver_read', 'receiver_id', 'is_read'),
+        Index('idx_message_conversation', 'sender_id', 'receiver_id', 'timestamp', 'id'),
     )
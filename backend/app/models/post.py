@@ -1,7 +1,7 @@
 """
 Post model
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -17,3 +17,7 @@ class Post(Base):
     
     # Relationships
     user = relationship("User", back_populates="posts")
+    
+    __table_args__ = (
+        Index('idx_post_timestamp', 'timestamp', 'id'),
+    )
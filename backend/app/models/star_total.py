@@ -0,0 +1,31 @@
+"""
+User star totals model (materialized leaderboard)
+"""
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+
+class UserStarTotal(Base):
+    """
+    Per-user star totals over approved videos, maintained incrementally by
+    rate_video and rebuilt nightly by the scheduler.
+    class_name/section_name are copied from the user so leaderboard reads
+    are an indexed top-K per class/section.
+    """
+    __tablename__ = "user_star_totals"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    class_name = Column(String, nullable=True)
+    section_name = Column(String, nullable=True)
+    total_stars = Column(Integer, nullable=False, default=0)
+    manhaji_stars = Column(Integer, nullable=False, default=0)
+    ithrai_stars = Column(Integer, nullable=False, default=0)
+    
+    # Relationships
+    user = relationship("User")
+    
+    __table_args__ = (
+        Index('idx_star_totals_total', 'total_stars'),
+        Index('idx_star_totals_class_section_total', 'class_name', 'section_name', 'total_stars'),
+    )
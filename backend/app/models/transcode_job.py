@@ -0,0 +1,35 @@
+"""
+Transcoding job queue model
+"""
+from sqlalchemy import Column, Integer, BigInteger, Float, String, DateTime, Boolean, Text, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class TranscodeJob(Base):
+    __tablename__ = "transcode_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    video_id = Column(Integer, ForeignKey("videos.id", ondelete="CASCADE"), nullable=False, index=True)
+    input_path = Column(String, nullable=False)  # Local path or S3 key
+    cleanup_source = Column(Boolean, default=False)
+    status = Column(String, nullable=False, default='queued')  # queued, running, done, failed
+    priority = Column(Integer, nullable=False, default=0)  # Higher runs first
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime(timezone=True), server_default=func.now())  # Retry backoff
+    locked_by = Column(String, nullable=True)  # Worker id while running
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)  # Start of the latest attempt
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Resource usage of the latest attempt
+    wall_seconds = Column(Float, nullable=True)
+    cpu_seconds = Column(Float, nullable=True)  # FFmpeg user + system time
+    output_bytes = Column(BigInteger, nullable=True)
+    
+    __table_args__ = (
+        Index('idx_transcode_job_claim', 'status', 'priority', 'run_after'),
+    )
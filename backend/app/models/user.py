@@ -41,4 +41,5 @@ class User(Base):
     
     __table_args__ = (
         Index('idx_user_class_section', 'class_name', 'section_name'),
+        Index('idx_user_role_username', 'role', 'username', 'id'),
     )
@@ -1,7 +1,7 @@
 """
 Video model
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -18,20 +18,38 @@ class Video(Base):
     video_type = Column(String, nullable=False)  # 'منهجي' or 'اثرائي'
     is_approved = Column(Boolean, default=False, index=True)
     is_archived = Column(Boolean, default=False, index=True)
+    archived_at = Column(DateTime(timezone=True), nullable=True)
     
     # HLS Streaming fields
     hls_path = Column(String, nullable=True)  # Path to .m3u8 playlist
     processing_status = Column(String, default='pending')  # pending, processing, ready, failed
     thumbnail_path = Column(String, nullable=True)  # Path to thumbnail image
+    processing_progress = Column(Integer, nullable=True)  # Percent complete while processing
+    processing_fps = Column(Float, nullable=True)  # Latest FFmpeg progress report
+    processing_speed = Column(Float, nullable=True)  # Encoding speed as a multiple of realtime
+    processing_out_time = Column(Float, nullable=True)  # Seconds of output written
+    
+    # Where the HLS output lives: hot (local disk), cold (object storage
+    # only) or restored (back on disk after a play, cold copy kept)
+    storage_tier = Column(String, nullable=False, default='hot', server_default='hot')
+    hls_restored_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Shared source/HLS output of identical uploads (None for videos uploaded before deduplication)
+    asset_id = Column(Integer, ForeignKey("video_assets.id", ondelete="SET NULL"), nullable=True, index=True)
+    
+    # Denormalized like counter (kept in sync by like/unlike, repaired by scheduler)
+    likes_count = Column(Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     user = relationship("User", back_populates="videos")
+    asset = relationship("VideoAsset", back_populates="videos")
     comments = relationship("Comment", back_populates="video", cascade="all, delete-orphan")
     likes = relationship("VideoLike", back_populates="video", cascade="all, delete-orphan")
     ratings = relationship("DynamicVideoRating", back_populates="video", cascade="all, delete-orphan")
     
     __table_args__ = (
         Index('idx_video_user_approved_archived', 'user_id', 'is_approved', 'is_archived'),
+        Index('idx_video_archived_timestamp', 'is_archived', 'timestamp', 'id'),
     )
 
 
@@ -0,0 +1,29 @@
+"""
+Content-addressed video asset model
+"""
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class VideoAsset(Base):
+    """
+    One stored source file and its HLS output, shared by every video whose
+    upload has the same SHA-256
+    """
+    __tablename__ = "video_assets"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=False, unique=True, index=True)  # Hex digest of the source bytes
+    size = Column(BigInteger, nullable=False)
+    source_path = Column(String, nullable=False)  # Relative to UPLOAD_FOLDER
+    output_video_id = Column(Integer, nullable=False)  # HLS output lives in /app/hls/{output_video_id}
+    status = Column(String, nullable=False, default='pending')  # pending, ready, failed
+    hls_path = Column(String, nullable=True)
+    thumbnail_path = Column(String, nullable=True)
+    ref_count = Column(Integer, nullable=False, default=1)  # Videos using this asset
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    videos = relationship("Video", back_populates="asset")
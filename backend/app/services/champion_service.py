@@ -32,7 +32,7 @@ def calculate_weekly_stars(db: Session, user_id: int, week_start: date) -> int:
     """
     from sqlalchemy import func
     
-    stars = db.query(func.sum(DynamicVideoRating.is_awarded)).join(
+    stars = db.query(func.sum(func.cast(DynamicVideoRating.is_awarded, Integer))).join(
         Video, DynamicVideoRating.video_id == Video.id
     ).join(
         RatingCriterion, DynamicVideoRating.criterion_id == RatingCriterion.id
@@ -124,10 +124,77 @@ def get_superhero_champions(db: Session) -> Tuple[list, int]:
     return champions_list, max_stars
 
 
+def weekly_stars_by_user(db: Session, week_start: date, class_name: str = None, section_name: str = None) -> Dict[int, int]:
+    """
+    Stars earned this week from منهجي videos for every student, in one grouped query
+    Returns: {user_id: stars} (students without stars are omitted)
+    """
+    query = db.query(
+        Video.user_id,
+        func.sum(func.cast(DynamicVideoRating.is_awarded, Integer))
+    ).join(
+        DynamicVideoRating, DynamicVideoRating.video_id == Video.id
+    ).join(
+        RatingCriterion, DynamicVideoRating.criterion_id == RatingCriterion.id
+    ).join(
+        User, Video.user_id == User.id
+    ).filter(
+        RatingCriterion.video_type == 'منهجي',
+        User.role == 'student',
+        func.date(Video.timestamp) >= week_start,
+        Video.is_approved == True
+    )
+    if class_name:
+        query = query.filter(User.class_name == class_name)
+    if section_name:
+        query = query.filter(User.section_name == section_name)
+    
+    rows = query.group_by(Video.user_id).all()
+    return {user_id: int(stars or 0) for user_id, stars in rows}
+
+
+def bulk_upsert_star_bank(db: Session, rows: List[Dict]):
+    """
+    Insert or update star bank rows in a single statement
+    Each row: {'user_id', 'banked_stars', 'last_updated_week_start_date'}
+    Does not commit.
+    """
+    if not rows:
+        return
+    
+    dialect = db.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(StarBank).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StarBank.user_id],
+            set_={
+                'banked_stars': stmt.excluded.banked_stars,
+                'last_updated_week_start_date': stmt.excluded.last_updated_week_start_date
+            }
+        )
+        db.execute(stmt)
+        return
+    
+    # Generic fallback: split into inserts and updates
+    user_ids = [r['user_id'] for r in rows]
+    existing = {
+        uid for (uid,) in db.query(StarBank.user_id).filter(StarBank.user_id.in_(user_ids)).all()
+    }
+    db.bulk_update_mappings(StarBank, [r for r in rows if r['user_id'] in existing])
+    db.bulk_insert_mappings(StarBank, [r for r in rows if r['user_id'] not in existing])
+
+
 def get_week_champions(db: Session, class_name: str = None, section_name: str = None) -> List[Dict]:
     """
     Get week champions based on star bank
     Week starts on Saturday
+    
+    Set-based: one query for students with last week's bank entry, one grouped
+    aggregate for this week's stars, one bulk upsert and a single commit.
     """
     today = date.today()
     start_of_week = get_week_start_date_saturday(today)
@@ -136,40 +203,44 @@ def get_week_champions(db: Session, class_name: str = None, section_name: str =
     # Fixed threshold for Methodological Champion = 5 stars
     CHAMPION_THRESHOLD = 5
     
-    # Get all students
-    query = db.query(User).filter(User.role == 'student')
+    # Get all students with their carried stars from previous week
+    query = db.query(User, StarBank.banked_stars).outerjoin(
+        StarBank,
+        and_(
+            StarBank.user_id == User.id,
+            StarBank.last_updated_week_start_date == start_of_previous_week
+        )
+    ).filter(User.role == 'student')
     if class_name:
         query = query.filter(User.class_name == class_name)
     if section_name:
         query = query.filter(User.section_name == section_name)
     
     students = query.all()
+    if not students:
+        return []
+    
+    # Get new stars this week for all students at once
+    new_stars_by_user = weekly_stars_by_user(db, start_of_week, class_name, section_name)
+    
     champions = []
+    bank_rows = []
     
-    for student in students:
-        student_id = student.id
-        
-        # Get carried stars from previous week
-        carried_stars = 0
-        bank_entry = db.query(StarBank).filter(
-            StarBank.user_id == student_id,
-            StarBank.last_updated_week_start_date == start_of_previous_week
-        ).first()
-        
-        if bank_entry:
-            carried_stars = bank_entry.banked_stars
-        
-        # Get new stars this week
-        new_stars = calculate_weekly_stars(db, student_id, start_of_week)
+    for student, banked_stars in students:
+        carried_stars = banked_stars or 0
+        new_stars = new_stars_by_user.get(student.id, 0)
         total_score_this_week = carried_stars + new_stars
         
-        # Update star bank
-        update_star_bank(db, student_id, start_of_week, carried_stars, new_stars)
+        bank_rows.append({
+            'user_id': student.id,
+            'banked_stars': total_score_this_week,
+            'last_updated_week_start_date': start_of_week
+        })
         
         # Check if champion (total stars >= criteria count)
         if total_score_this_week >= CHAMPION_THRESHOLD:
             champions.append({
-                'id': student_id,
+                'id': student.id,
                 'name': student.full_name or student.username,
                 'class': student.class_name or 'غير محدد',
                 'section': student.section_name or 'غير محدد',
@@ -178,6 +249,10 @@ def get_week_champions(db: Session, class_name: str = None, section_name: str =
                 'new_stars': new_stars
             })
     
+    # Update star bank
+    bulk_upsert_star_bank(db, bank_rows)
+    db.commit()
+    
     return champions
 
 
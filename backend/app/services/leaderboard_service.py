@@ -0,0 +1,139 @@
+"""
+Leaderboard service - maintains the materialized user_star_totals table
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, Integer
+from typing import List, Dict, Optional
+from app.models.user import User
+from app.models.video import Video
+from app.models.rating import DynamicVideoRating, RatingCriterion
+from app.models.star_total import UserStarTotal
+
+
+def _star_totals_query(db: Session):
+    """Aggregate (user_id, manhaji, ithrai) over approved videos"""
+    awarded = func.cast(DynamicVideoRating.is_awarded, Integer)
+    return db.query(
+        Video.user_id,
+        func.coalesce(func.sum(case((RatingCriterion.video_type == 'منهجي', awarded), else_=0)), 0),
+        func.coalesce(func.sum(case((RatingCriterion.video_type == 'اثرائي', awarded), else_=0)), 0),
+        func.coalesce(func.sum(awarded), 0)
+    ).join(
+        DynamicVideoRating, Video.id == DynamicVideoRating.video_id
+    ).join(
+        RatingCriterion, DynamicVideoRating.criterion_id == RatingCriterion.id
+    ).filter(
+        Video.is_approved == True
+    ).group_by(Video.user_id)
+
+
+def refresh_user_star_totals(db: Session, user_id: int) -> Optional[UserStarTotal]:
+    """
+    Recompute one user's totals from the ratings table (does not commit)
+    Used when a change cannot be expressed as a delta (approval, deletion)
+    """
+    row = _star_totals_query(db).filter(Video.user_id == user_id).first()
+    totals = db.query(UserStarTotal).filter(UserStarTotal.user_id == user_id).first()
+
+    if row is None:
+        if totals:
+            db.delete(totals)
+        return None
+
+    _, manhaji, ithrai, total = row
+    if totals is None:
+        user = db.query(User).filter(User.id == user_id).first()
+        totals = UserStarTotal(
+            user_id=user_id,
+            class_name=user.class_name if user else None,
+            section_name=user.section_name if user else None
+        )
+        db.add(totals)
+
+    totals.manhaji_stars = int(manhaji)
+    totals.ithrai_stars = int(ithrai)
+    totals.total_stars = int(total)
+    return totals
+
+
+def apply_star_delta(db: Session, user_id: int, manhaji_delta: int = 0, ithrai_delta: int = 0):
+    """
+    Apply a rating change to a user's totals (does not commit)
+    Must be called after the rating rows are flushed: a missing totals row
+    is created from the aggregate, which already includes the change.
+    """
+    totals = db.query(UserStarTotal).filter(
+        UserStarTotal.user_id == user_id
+    ).with_for_update().first()
+
+    if totals is None:
+        refresh_user_star_totals(db, user_id)
+        return
+
+    totals.manhaji_stars = (totals.manhaji_stars or 0) + manhaji_delta
+    totals.ithrai_stars = (totals.ithrai_stars or 0) + ithrai_delta
+    totals.total_stars = (totals.total_stars or 0) + manhaji_delta + ithrai_delta
+
+
+def sync_user_class(db: Session, user: User):
+    """Copy a user's class/section onto their totals row (does not commit)"""
+    db.query(UserStarTotal).filter(UserStarTotal.user_id == user.id).update({
+        UserStarTotal.class_name: user.class_name,
+        UserStarTotal.section_name: user.section_name
+    }, synchronize_session=False)
+
+
+def rebuild_star_totals(db: Session) -> int:
+    """
+    Rebuild the whole user_star_totals table from the ratings table and commit
+    Returns the number of users with totals
+    """
+    rows = _star_totals_query(db).add_columns(
+        User.class_name, User.section_name
+    ).join(
+        User, Video.user_id == User.id
+    ).group_by(User.class_name, User.section_name).all()
+
+    db.query(UserStarTotal).delete(synchronize_session=False)
+    db.bulk_insert_mappings(UserStarTotal, [
+        {
+            "user_id": user_id,
+            "manhaji_stars": int(manhaji),
+            "ithrai_stars": int(ithrai),
+            "total_stars": int(total),
+            "class_name": class_name,
+            "section_name": section_name
+        }
+        for user_id, manhaji, ithrai, total, class_name, section_name in rows
+    ])
+    db.commit()
+    return len(rows)
+
+
+def get_leaderboard(db: Session, class_name: str = None, section_name: str = None, limit: int = 10) -> List[Dict]:
+    """
+    Top-K users by total stars, filtered by class/section before LIMIT
+    """
+    query = db.query(UserStarTotal, User).join(User, UserStarTotal.user_id == User.id)
+    if class_name:
+        query = query.filter(UserStarTotal.class_name == class_name)
+    if section_name:
+        query = query.filter(UserStarTotal.section_name == section_name)
+
+    results = query.order_by(
+        UserStarTotal.total_stars.desc(), UserStarTotal.user_id
+    ).limit(limit).all()
+
+    return [
+        {
+            "rank": rank,
+            "user_id": user.id,
+            "username": user.username,
+            "full_name": user.full_name,
+            "class_name": user.class_name,
+            "section_name": user.section_name,
+            "total_stars": totals.total_stars or 0,
+            "profile_image": user.profile_image
+        }
+        for rank, (totals, user) in enumerate(results, 1)
+    ]
@@ -1,9 +1,18 @@
 """
 Message service - handles messaging logic
 """
+from datetime import datetime, timezone
+from typing import Dict, List
+from sqlalchemy import and_, case, func, or_
 from sqlalchemy.orm import Session
 from app.models.message import Message
 from app.models.user import User
+from app.models.conversation_summary import ConversationSummary
+
+PREVIEW_LENGTH = 200
+
+# Sort key of conversations without any message
+NO_ACTIVITY = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
 
 def get_unread_count(db: Session, user_id: int) -> int:
@@ -21,5 +30,140 @@ def mark_messages_as_read(db: Session, user_id: int, sender_id: int):
         Message.sender_id == sender_id,
         Message.is_read == False
     ).update({"is_read": True})
+    mark_conversation_read(db, user_id, sender_id)
     db.commit()
 
+
+def _pair(user_a: int, user_b: int):
+    return (user_a, user_b) if user_a <= user_b else (user_b, user_a)
+
+
+def record_messages(db: Session, messages: List[dict]):
+    """
+    Fold newly inserted messages into their conversation summaries with one
+    upsert (does not commit)
+
+    Args:
+        messages: dicts with id, sender_id, receiver_id, content and timestamp
+    """
+    rows = {}
+    for message in messages:
+        low, high = _pair(message["sender_id"], message["receiver_id"])
+        row = rows.setdefault((low, high), {
+            "user_low_id": low, "user_high_id": high,
+            "last_message_id": 0, "unread_low": 0, "unread_high": 0
+        })
+        if message["receiver_id"] != message["sender_id"]:
+            row["unread_low" if message["receiver_id"] == low else "unread_high"] += 1
+        if message["id"] > row["last_message_id"]:
+            row.update({
+                "last_message_id": message["id"],
+                "last_message_at": message["timestamp"],
+                "last_message_preview": message["content"][:PREVIEW_LENGTH],
+                "last_sender_id": message["sender_id"]
+            })
+    rows = list(rows.values())
+    if not rows:
+        return
+
+    summary = ConversationSummary
+    dialect = db.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(summary).values(rows)
+        excluded = stmt.excluded
+        # Concurrent senders may commit out of order: keep the newest message
+        newer = excluded.last_message_id > func.coalesce(summary.last_message_id, 0)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[summary.user_low_id, summary.user_high_id],
+            set_={
+                'unread_low': summary.unread_low + excluded.unread_low,
+                'unread_high': summary.unread_high + excluded.unread_high,
+                'last_message_id': case((newer, excluded.last_message_id), else_=summary.last_message_id),
+                'last_message_at': case((newer, excluded.last_message_at), else_=summary.last_message_at),
+                'last_message_preview': case((newer, excluded.last_message_preview), else_=summary.last_message_preview),
+                'last_sender_id': case((newer, excluded.last_sender_id), else_=summary.last_sender_id)
+            }
+        )
+        db.execute(stmt)
+        return
+
+    # Generic fallback: update existing rows, insert the others
+    for row in rows:
+        existing = db.query(summary).filter(
+            summary.user_low_id == row["user_low_id"],
+            summary.user_high_id == row["user_high_id"]
+        ).with_for_update().first()
+        if existing is None:
+            db.add(summary(**row))
+            continue
+        existing.unread_low += row["unread_low"]
+        existing.unread_high += row["unread_high"]
+        if row["last_message_id"] > (existing.last_message_id or 0):
+            existing.last_message_id = row["last_message_id"]
+            existing.last_message_at = row["last_message_at"]
+            existing.last_message_preview = row["last_message_preview"]
+            existing.last_sender_id = row["last_sender_id"]
+
+
+def mark_conversation_read(db: Session, reader_id: int, other_id: int):
+    """Reset the reader's unread count of a conversation (does not commit)"""
+    low, high = _pair(reader_id, other_id)
+    column = ConversationSummary.unread_low if reader_id == low else ConversationSummary.unread_high
+    db.query(ConversationSummary).filter(
+        ConversationSummary.user_low_id == low,
+        ConversationSummary.user_high_id == high
+    ).update({column: 0}, synchronize_session=False)
+
+
+def decrement_unread(db: Session, reader_id: int, read_counts: Dict[int, int]):
+    """
+    Subtract messages just marked as read, per sender, from the reader's
+    unread counts (does not commit)
+    """
+    for sender_id, count in read_counts.items():
+        low, high = _pair(reader_id, sender_id)
+        column = ConversationSummary.unread_low if reader_id == low else ConversationSummary.unread_high
+        db.query(ConversationSummary).filter(
+            ConversationSummary.user_low_id == low,
+            ConversationSummary.user_high_id == high
+        ).update({
+            column: case((column > count, column - count), else_=0)
+        }, synchronize_session=False)
+
+
+def conversation_inbox(db: Session, user_id: int, role: str):
+    """
+    Users of a role with the summary of their conversation with user_id,
+    in one query (LEFT JOIN on the pair's unique index)
+
+    Returns:
+        (query, order) for keyset pagination, most recent activity first;
+        rows have User, last_message_at, last_message_preview,
+        last_sender_id, unread_count and last_activity
+    """
+    summary = ConversationSummary
+    is_low = summary.user_low_id == user_id
+    unread_count = func.coalesce(
+        case((is_low, summary.unread_low), else_=summary.unread_high), 0
+    ).label("unread_count")
+    last_activity = func.coalesce(summary.last_message_at, NO_ACTIVITY).label("last_activity")
+
+    query = db.query(
+        User,
+        summary.last_message_at,
+        summary.last_message_preview,
+        summary.last_sender_id,
+        unread_count,
+        last_activity
+    ).outerjoin(
+        summary,
+        or_(
+            and_(is_low, summary.user_high_id == User.id),
+            and_(summary.user_low_id == User.id, summary.user_high_id == user_id)
+        )
+    ).filter(User.role == role)
+    return query, [(last_activity, True), (User.id, True)]
@@ -2,8 +2,13 @@
 Video service - handles video-related business logic
 """
 from sqlalchemy.orm import Session
+from collections import defaultdict
 from datetime import datetime, timedelta
-from app.models.video import Video
+from typing import List, Dict
+from app.models.video import Video, VideoLike
+from app.models.rating import DynamicVideoRating, RatingCriterion
+from app.core.aws import get_file_url
+from app.core.like_counter import like_counter
 from app.config import settings
 
 
@@ -26,3 +31,66 @@ def archive_old_videos(db: Session):
     db.commit()
     return len(videos)
 
+
+
+def build_video_feed(db: Session, videos: List[Video], current_user_id: int) -> List[Dict]:
+    """
+    Assemble feed entries for a list of videos in a fixed number of queries.
+    Like counts come from the denormalized `likes_count` column; the caller's
+    own likes and ratings are fetched with grouped IN (...) queries instead
+    of per-video lookups. Callers should load
+    `Video.user` eagerly so publisher info does not lazy-load per row.
+    """
+    if not videos:
+        return []
+    
+    video_ids = [v.id for v in videos]
+    
+    # Videos liked by the current user
+    liked_rows = db.query(VideoLike.video_id).filter(
+        VideoLike.user_id == current_user_id,
+        VideoLike.video_id.in_(video_ids)
+    ).all()
+    user_liked = {row.video_id for row in liked_rows}
+    
+    # Ratings with criterion names
+    ratings_rows = db.query(
+        DynamicVideoRating.id,
+        DynamicVideoRating.video_id,
+        DynamicVideoRating.criterion_id,
+        DynamicVideoRating.is_awarded,
+        RatingCriterion.name
+    ).join(
+        RatingCriterion, DynamicVideoRating.criterion_id == RatingCriterion.id
+    ).filter(
+        DynamicVideoRating.video_id.in_(video_ids)
+    ).order_by(DynamicVideoRating.id).all()
+    ratings_by_video = defaultdict(list)
+    for r in ratings_rows:
+        ratings_by_video[r.video_id].append({
+            "id": r.id,
+            "criterion_id": r.criterion_id,
+            "criterion_name": r.name,
+            "is_awarded": r.is_awarded
+        })
+    
+    result = []
+    for video in videos:
+        result.append({
+            "id": video.id,
+            "title": video.title,
+            "filepath": video.filepath,
+            "file_url": get_file_url(video.filepath),
+            "user_id": video.user_id,
+            "timestamp": video.timestamp,
+            "video_type": video.video_type,
+            "is_approved": video.is_approved,
+            "is_archived": video.is_archived,
+            "likes_count": video.likes_count + like_counter.pending(video.id),
+            "user_likes": video.id in user_liked,
+            "publisher_name": video.user.full_name or video.user.username,
+            "publisher_image": video.user.profile_image,
+            "ratings": ratings_by_video.get(video.id, [])
+        })
+    
+    return result
@@ -0,0 +1,33 @@
+"""
+Standalone transcoding worker
+
+Run next to the API with TRANSCODE_WORKER_MODE=external:
+    python -m app.worker [--concurrency N]
+"""
+import argparse
+import asyncio
+import logging
+import signal
+from app.database import SessionLocal
+from app.core.transcode_queue import TranscodeWorkerPool
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(concurrency: int = None):
+    pool = TranscodeWorkerPool(SessionLocal, concurrency=concurrency)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, pool.stop)
+
+    await pool.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the HLS transcoding worker pool")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Concurrent FFmpeg jobs (default: derived from CPU count)")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
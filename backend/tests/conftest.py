@@ -0,0 +1,32 @@
+"""
+Test fixtures: a throwaway SQLite database built from the models
+"""
+import os
+import tempfile
+
+_tmp_dir = tempfile.mkdtemp(prefix="app-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp_dir}/test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+
+import pytest
+from sqlalchemy import event
+from app.database import Base, SessionLocal, engine
+import app.models  # noqa: F401  (registers every table on Base.metadata)
+
+
+@event.listens_for(engine, "connect")
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    # Enforce foreign keys like PostgreSQL does
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+@pytest.fixture
+def db():
+    """Session on a freshly created schema"""
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
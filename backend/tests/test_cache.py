@@ -0,0 +1,110 @@
+"""
+TTL cache backends: eviction, expiry and single-flight loading
+"""
+import asyncio
+import threading
+import time
+import pytest
+from app.core import cache as cache_module
+from app.core.cache import LocalLRUBackend, SQLiteBackend, TTLCache
+
+BACKENDS = [
+    pytest.param(lambda tmp_path: LocalLRUBackend(), id="local"),
+    pytest.param(lambda tmp_path: SQLiteBackend(str(tmp_path / "cache.sqlite3")), id="sqlite"),
+]
+
+
+class Clock:
+    """Stand-in for the time module with a settable clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(cache_module, "time", fake)
+    return fake
+
+
+def test_local_backend_evicts_least_recently_used():
+    cache = TTLCache(ttl_seconds=60, max_entries=2, backend=LocalLRUBackend())
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.set("c", 3)
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_sqlite_backend_evicts_per_namespace(tmp_path, clock):
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    cache = TTLCache(ttl_seconds=60, max_entries=2, namespace="small", backend=backend)
+    other = TTLCache(ttl_seconds=60, max_entries=2, namespace="other", backend=backend)
+    other.set("kept", 0)
+    for value, key in enumerate("abc"):
+        clock.now += 1
+        cache.set(key, value)
+
+    # The entry closest to expiry goes; other namespaces are not counted
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (None, 1, 2)
+    assert other.get("kept") == 0
+
+
+@pytest.mark.parametrize("make_backend", BACKENDS)
+def test_entries_expire(tmp_path, clock, make_backend):
+    cache = TTLCache(ttl_seconds=10, backend=make_backend(tmp_path))
+    cache.set("key", {"count": 3})
+    clock.now += 10
+    assert cache.get("key") == {"count": 3}
+    clock.now += 1
+    assert cache.get("key") is None
+
+
+@pytest.mark.parametrize("make_backend", BACKENDS)
+def test_get_or_load_runs_one_loader_for_concurrent_misses(tmp_path, make_backend):
+    cache = TTLCache(ttl_seconds=60, backend=make_backend(tmp_path))
+    calls = []
+    results = []
+
+    def loader():
+        calls.append(threading.get_ident())
+        time.sleep(0.2)  # a slow query
+        return 42
+
+    def request():
+        # One event loop per thread, like separate workers
+        results.append(asyncio.run(cache.get_or_load_async("key", loader, wait_timeout=2.0)))
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [42] * 4
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("make_backend", BACKENDS)
+def test_get_or_load_loads_itself_after_wait_timeout(tmp_path, make_backend):
+    cache = TTLCache(ttl_seconds=60, backend=make_backend(tmp_path))
+    # Another worker took the lock and never stored a value
+    assert cache.backend.acquire_lock(cache.prefix + "key", 60)
+
+    value = asyncio.run(cache.get_or_load_async("key", lambda: 7, wait_timeout=0.05))
+    assert value == 7
+    assert cache.get("key") == 7
+
+
+@pytest.mark.parametrize("make_backend", BACKENDS)
+def test_get_or_load_does_not_cache_none(tmp_path, make_backend):
+    cache = TTLCache(ttl_seconds=60, backend=make_backend(tmp_path))
+    assert asyncio.run(cache.get_or_load_async("key", lambda: None)) is None
+    assert cache.get("key") is None
+    # The lock was released, so the next miss loads right away
+    assert cache.backend.acquire_lock(cache.prefix + "key", 1)
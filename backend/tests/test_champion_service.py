@@ -0,0 +1,152 @@
+"""
+Regression test: set-based get_week_champions against the per-student loop
+it replaced
+"""
+from datetime import datetime, timedelta
+from app.models import DynamicVideoRating, RatingCriterion, StarBank, User, Video
+from app.services import champion_service
+from app.services.champion_service import (
+    calculate_weekly_stars,
+    get_week_champions,
+    get_week_start_date_saturday,
+    update_star_bank,
+)
+
+WEEK_START = get_week_start_date_saturday()
+PREVIOUS_WEEK = WEEK_START - timedelta(days=7)
+
+
+def per_student_week_champions(db, class_name=None, section_name=None):
+    """The original implementation: a few queries and a commit per student"""
+    start_of_week = WEEK_START
+    start_of_previous_week = PREVIOUS_WEEK
+    query = db.query(User).filter(User.role == 'student')
+    if class_name:
+        query = query.filter(User.class_name == class_name)
+    if section_name:
+        query = query.filter(User.section_name == section_name)
+
+    champions = []
+    for student in query.all():
+        carried_stars = 0
+        bank_entry = db.query(StarBank).filter(
+            StarBank.user_id == student.id,
+            StarBank.last_updated_week_start_date == start_of_previous_week
+        ).first()
+        if bank_entry:
+            carried_stars = bank_entry.banked_stars
+        new_stars = calculate_weekly_stars(db, student.id, start_of_week)
+        total = carried_stars + new_stars
+        update_star_bank(db, student.id, start_of_week, carried_stars, new_stars)
+        if total >= 5:
+            champions.append({
+                'id': student.id,
+                'name': student.full_name or student.username,
+                'class': student.class_name or 'غير محدد',
+                'section': student.section_name or 'غير محدد',
+                'total_stars': total,
+                'carried_stars': carried_stars,
+                'new_stars': new_stars
+            })
+    return champions
+
+
+# username: (class, section, banked stars, bank week, [(approved, days ago, stars), ...])
+STUDENTS = {
+    "carry_only": ("5", "A", 6, PREVIOUS_WEEK, []),
+    "stale_bank": ("5", "A", 9, PREVIOUS_WEEK - timedelta(days=7), [(True, 0, 2)]),
+    "new_only": ("5", "B", None, None, [(True, 0, 3), (True, 0, 2)]),
+    "mixed": ("6", "A", 2, PREVIOUS_WEEK, [(True, 0, 3)]),
+    "unapproved": ("6", "A", 1, PREVIOUS_WEEK, [(False, 0, 4), (True, 0, 1)]),
+    "last_week_video": ("6", "B", 0, PREVIOUS_WEEK, [(True, 8, 4), (True, 0, 4)]),
+    "no_class": (None, None, 5, PREVIOUS_WEEK, []),
+}
+
+
+def seed(db):
+    admin = User(username="admin", password="x", role="admin")
+    db.add(admin)
+    criteria = [RatingCriterion(name=f"c{i}", key=f"c{i}", video_type='منهجي') for i in range(4)]
+    enrichment = RatingCriterion(name="e", key="e", video_type='اثرائي')
+    db.add_all(criteria + [enrichment])
+    db.flush()
+
+    now = datetime.now()
+    for username, (class_name, section_name, banked, bank_week, videos) in STUDENTS.items():
+        student = User(username=username, password="x", role="student", full_name=username.title(),
+                       class_name=class_name, section_name=section_name)
+        db.add(student)
+        db.flush()
+        if banked is not None:
+            db.add(StarBank(user_id=student.id, banked_stars=banked, last_updated_week_start_date=bank_week))
+        for approved, days_ago, stars in videos:
+            # A week starts at most 6 days ago: 8 days ago is always last week
+            video = Video(title=username, filepath=f"{username}.mp4", user_id=student.id, video_type='منهجي',
+                          is_approved=approved, timestamp=now - timedelta(days=days_ago))
+            db.add(video)
+            db.flush()
+            for i, criterion in enumerate(criteria):
+                db.add(DynamicVideoRating(video_id=video.id, criterion_id=criterion.id,
+                                          is_awarded=i < stars, admin_id=admin.id))
+            # Stars of the other video type never count towards the week
+            db.add(DynamicVideoRating(video_id=video.id, criterion_id=enrichment.id,
+                                      is_awarded=True, admin_id=admin.id))
+    db.commit()
+
+
+def reset_star_bank(db):
+    db.query(StarBank).delete()
+    for username, (_, _, banked, bank_week, _) in STUDENTS.items():
+        if banked is None:
+            continue
+        user_id = db.query(User.id).filter(User.username == username).scalar()
+        db.add(StarBank(user_id=user_id, banked_stars=banked, last_updated_week_start_date=bank_week))
+    db.commit()
+
+
+def star_bank_state(db):
+    return sorted(db.query(StarBank.user_id, StarBank.banked_stars, StarBank.last_updated_week_start_date).all())
+
+
+def by_id(champions):
+    return sorted(champions, key=lambda c: c['id'])
+
+
+def assert_same_as_loop(db, **filters):
+    reset_star_bank(db)
+    expected = per_student_week_champions(db, **filters)
+    expected_bank = star_bank_state(db)
+
+    reset_star_bank(db)
+    actual = get_week_champions(db, **filters)
+    db.expire_all()
+
+    assert by_id(actual) == by_id(expected)
+    assert star_bank_state(db) == expected_bank
+    return actual
+
+
+def test_week_champions_match_per_student_loop(db):
+    seed(db)
+    champions = assert_same_as_loop(db)
+
+    names = {c['name'] for c in champions}
+    assert names == {"Carry_Only", "New_Only", "Mixed", "No_Class"}
+
+
+def test_week_champions_filters_match_per_student_loop(db):
+    seed(db)
+    assert_same_as_loop(db, class_name="5")
+    assert_same_as_loop(db, class_name="6", section_name="A")
+    assert assert_same_as_loop(db, class_name="7") == []
+
+
+def test_week_champions_carry_over_next_week(db, monkeypatch):
+    seed(db)
+    get_week_champions(db)
+    # Next week, this week's bank is the carry-over
+    next_week = WEEK_START + timedelta(days=7)
+    monkeypatch.setattr(champion_service, "get_week_start_date_saturday", lambda d=None: next_week)
+    champions = get_week_champions(db, class_name="6", section_name="A")
+
+    assert {c['name']: c['carried_stars'] for c in champions} == {"Mixed": 5}
@@ -0,0 +1,87 @@
+"""
+ChatMessageWriter: micro-batching, result order and failure isolation
+"""
+import asyncio
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.core.chat_writer import ChatMessageWriter
+from app.models import ConversationSummary, Message, User
+
+
+@pytest.fixture
+def users(db):
+    alice = User(username="alice", password="x", role="student")
+    bob = User(username="bob", password="x", role="admin")
+    db.add_all([alice, bob])
+    db.commit()
+    return alice.id, bob.id
+
+
+def run_writes(writer, writes):
+    """Send all writes concurrently; returns results (or exceptions) in call order"""
+    async def main():
+        try:
+            return await asyncio.gather(
+                *(writer.write(*args) for args in writes), return_exceptions=True
+            )
+        finally:
+            await writer.close()
+    return asyncio.run(main())
+
+
+def spy_batches(writer):
+    batches = []
+    insert_batch = writer._insert_batch
+
+    def spy(db, rows):
+        batches.append([row["content"] for row in rows])
+        return insert_batch(db, rows)
+    writer._insert_batch = spy
+    return batches
+
+
+def test_concurrent_messages_share_one_insert_in_order(db, users):
+    alice, bob = users
+    writer = ChatMessageWriter(window_ms=20, max_batch=200)
+    batches = spy_batches(writer)
+
+    results = run_writes(writer, [(alice, bob, f"m{i}") for i in range(5)])
+
+    assert batches == [["m0", "m1", "m2", "m3", "m4"]]
+    ids = [result["id"] for result in results]
+    assert ids == sorted(ids)
+    stored = dict(db.query(Message.id, Message.content).all())
+    assert [stored[i] for i in ids] == ["m0", "m1", "m2", "m3", "m4"]
+
+    summary = db.query(ConversationSummary).one()
+    assert summary.last_message_id == ids[-1]
+    assert summary.last_message_preview == "m4"
+    # alice < bob: bob is the high side and received all five
+    assert (summary.unread_low, summary.unread_high) == (0, 5)
+
+
+def test_batches_are_capped_at_max_batch(db, users):
+    alice, bob = users
+    writer = ChatMessageWriter(window_ms=20, max_batch=2)
+    batches = spy_batches(writer)
+
+    results = run_writes(writer, [(alice, bob, f"m{i}") for i in range(5)])
+
+    assert batches == [["m0", "m1"], ["m2", "m3"], ["m4"]]
+    assert [r["id"] for r in results] == sorted(r["id"] for r in results)
+
+
+def test_bad_row_fails_only_its_own_message(db, users):
+    alice, bob = users
+    writer = ChatMessageWriter(window_ms=20, max_batch=200)
+    batches = spy_batches(writer)
+
+    results = run_writes(writer, [(alice, bob, "ok1"), (alice, 999999, "bad"), (bob, alice, "ok2")])
+
+    # The batch failed, then every row was retried on its own
+    assert batches == [["ok1", "bad", "ok2"], ["ok1"], ["bad"], ["ok2"]]
+    assert isinstance(results[1], IntegrityError)
+    assert {"id", "timestamp"} <= set(results[0]) and {"id", "timestamp"} <= set(results[2])
+    assert sorted(content for (content,) in db.query(Message.content).all()) == ["ok1", "ok2"]
+    summary = db.query(ConversationSummary).one()
+    assert (summary.unread_low, summary.unread_high) == (1, 1)
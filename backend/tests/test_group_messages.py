@@ -0,0 +1,108 @@
+"""
+Group messages: one INSERT ... SELECT per send and bulk cache invalidation
+"""
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.api.messages import send_message
+from app.core.cache import LocalLRUBackend, SQLiteBackend, TTLCache, unread_cache
+from app.database import SessionLocal
+from app.models import ConversationSummary, Message, User
+from app.schemas.message import MessageCreate
+
+
+@pytest.fixture
+def school(db):
+    admin = User(username="admin", password="x", role="admin", class_name="5", section_name="A")
+    students = [
+        User(username="s1", password="x", role="student", class_name="5", section_name="A"),
+        User(username="s2", password="x", role="student", class_name="5", section_name="A"),
+        User(username="s3", password="x", role="student", class_name="5", section_name="B"),
+        User(username="s4", password="x", role="student", class_name="6", section_name="A"),
+    ]
+    db.add(admin)
+    db.add_all(students)
+    db.commit()
+    return admin, {user.username: user.id for user in students}
+
+
+def send_group(db, admin, class_name, section_name=None):
+    data = MessageCreate(content="Homework", type="group", class_name=class_name, section_name=section_name)
+    return asyncio.run(send_message(data, current_user=admin, db=db))
+
+
+def test_group_message_reaches_every_student_of_the_class(db, school):
+    admin, ids = school
+    for username in ids:
+        unread_cache.set(f"unread_{ids[username]}", 0)
+
+    first = send_group(db, admin, "5")
+
+    rows = db.query(Message.receiver_id, Message.sender_id, Message.content, Message.is_read).all()
+    assert sorted(rows) == sorted(
+        (ids[name], admin.id, "Homework", False) for name in ("s1", "s2", "s3")
+    )
+    assert first["receiver_id"] in {ids["s1"], ids["s2"], ids["s3"]}
+    # Receivers' unread counters were invalidated, the others kept
+    assert [unread_cache.get(f"unread_{ids[name]}") for name in ("s1", "s2", "s3", "s4")] == [None, None, None, 0]
+    # One conversation summary per receiver, unread on the student's side
+    summaries = db.query(ConversationSummary).all()
+    assert len(summaries) == 3
+    for summary in summaries:
+        student_side = summary.unread_high if summary.user_low_id == admin.id else summary.unread_low
+        assert (student_side, summary.last_sender_id, summary.last_message_preview) == (1, admin.id, "Homework")
+
+
+def test_unread_counters_are_invalidated_after_the_commit(db, school, monkeypatch):
+    admin, _ = school
+    visible = []
+
+    def delete_many(keys):
+        # What a concurrent unread-count request would now read and cache
+        other = SessionLocal()
+        try:
+            visible.append(other.query(Message).count())
+        finally:
+            other.close()
+    monkeypatch.setattr(unread_cache, "delete_many", delete_many)
+
+    send_group(db, admin, "5")
+    assert visible == [3]
+
+
+def test_group_message_to_a_section(db, school):
+    admin, ids = school
+    send_group(db, admin, "5", "A")
+    receivers = {receiver_id for (receiver_id,) in db.query(Message.receiver_id).all()}
+    assert receivers == {ids["s1"], ids["s2"]}
+
+
+def test_group_message_to_an_empty_class_writes_nothing(db, school):
+    admin, _ = school
+    with pytest.raises(HTTPException) as error:
+        send_group(db, admin, "9")
+    assert error.value.status_code == 404
+    assert db.query(Message).count() == 0
+    assert db.query(ConversationSummary).count() == 0
+
+
+@pytest.mark.parametrize("make_backend", [
+    lambda tmp_path: LocalLRUBackend(),
+    lambda tmp_path: SQLiteBackend(str(tmp_path / "cache.sqlite3")),
+])
+def test_cache_delete_many(tmp_path, make_backend):
+    cache = TTLCache(ttl_seconds=60, max_entries=2000, namespace="test", backend=make_backend(tmp_path))
+    other = TTLCache(ttl_seconds=60, max_entries=2000, namespace="other", backend=cache.backend)
+    # More keys than one SQLite IN (...) chunk
+    keys = [f"k{i}" for i in range(1200)]
+    for key in keys:
+        cache.set(key, 1)
+    other.set("k0", 2)
+
+    cache.delete_many(keys[:1100] + ["missing"])
+
+    assert all(cache.get(key) is None for key in keys[:1100])
+    assert all(cache.get(key) == 1 for key in keys[1100:])
+    # Keys are namespaced
+    assert other.get("k0") == 2
+    cache.delete_many([])
@@ -0,0 +1,127 @@
+"""
+HLS file delivery: signed tokens, conditional requests and byte ranges
+"""
+import asyncio
+from types import SimpleNamespace
+import pytest
+from starlette.requests import Request
+from app.config import settings
+from app.core import security
+from app.core.hls_delivery import hls_file_response, parse_range
+from app.core.security import create_hls_token, verify_hls_token
+
+CONTENT = bytes(range(100))
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=90-200", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("BYTES = 5-5", (5, 5)),
+    # Ignored: the whole file is served
+    ("items=0-9", None),
+    ("bytes=0-1,5-6", None),
+    ("bytes=abc-", None),
+    ("bytes=1-x", None),
+    ("bytes=-", None),
+    ("bytes=5", None),
+    ("bytes=+1-2", None),
+    ("bytes=9-3", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(CONTENT)) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=100-", 100),
+    ("bytes=-0", 100),
+    ("bytes=-10", 0),
+    ("bytes=0-", 0),
+])
+def test_parse_range_unsatisfiable(header, size):
+    with pytest.raises(ValueError):
+        parse_range(header, size)
+
+
+def test_hls_token_round_trip_and_tampering():
+    token = create_hls_token(12, version=3)
+    assert verify_hls_token(12, token)
+    assert not verify_hls_token(13, token)
+
+    version, expires, signature = token.split(".")
+    assert not verify_hls_token(12, f"4.{expires}.{signature}")
+    assert not verify_hls_token(12, f"{version}.{int(expires) + 1}.{signature}")
+    assert not verify_hls_token(12, f"{version}.{expires}.{signature[:-2]}AA")
+    for malformed in ("", "garbage", "1.2", "a.b.c"):
+        assert not verify_hls_token(12, malformed)
+
+
+def test_hls_token_expires(monkeypatch):
+    token = create_hls_token(12)
+    expires = int(token.split(".")[1])
+    # Valid for at least HLS_TOKEN_EXPIRE_SECONDS, rounded up to a window
+    assert expires >= security.time.time() + settings.HLS_TOKEN_EXPIRE_SECONDS
+
+    monkeypatch.setattr(security, "time", SimpleNamespace(time=lambda: expires))
+    assert verify_hls_token(12, token)
+    monkeypatch.setattr(security, "time", SimpleNamespace(time=lambda: expires + 1))
+    assert not verify_hls_token(12, token)
+
+
+@pytest.fixture
+def segment(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "HLS_ACCEL_REDIRECT_PREFIX", None)
+    (tmp_path / "12").mkdir()
+    (tmp_path / "12" / "segment_000.ts").write_bytes(CONTENT)
+    return str(tmp_path)
+
+
+def serve(base_dir, **headers):
+    request = Request({
+        "type": "http",
+        "method": "GET",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    })
+    return hls_file_response(request, base_dir, "12/segment_000.ts", "video/mp2t")
+
+
+def body(response):
+    async def read():
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return asyncio.run(read())
+
+
+def test_full_file_and_not_modified(segment):
+    response = serve(segment)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["accept-ranges"] == "bytes"
+
+    assert serve(segment, if_none_match=etag).status_code == 304
+    assert serve(segment, if_none_match=f'"other", {etag}').status_code == 304
+    assert serve(segment, if_none_match='"other"').status_code == 200
+
+
+def test_range_requests(segment):
+    partial = serve(segment, range="bytes=10-19")
+    assert partial.status_code == 206
+    assert partial.headers["content-range"] == "bytes 10-19/100"
+    assert partial.headers["content-length"] == "10"
+    assert body(partial) == CONTENT[10:20]
+
+    assert body(serve(segment, range="bytes=-5")) == CONTENT[95:]
+
+    unsatisfiable = serve(segment, range="bytes=100-")
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == "bytes */100"
+
+    # Malformed ranges are ignored
+    assert serve(segment, range="bytes=abc-").status_code == 200
+
+
+def test_if_range_mismatch_serves_the_full_file(segment):
+    etag = serve(segment).headers["etag"]
+    assert serve(segment, range="bytes=0-9", if_range=etag).status_code == 206
+    assert serve(segment, range="bytes=0-9", if_range='"stale"').status_code == 200
@@ -0,0 +1,122 @@
+"""
+HLS processor helpers
+"""
+import asyncio
+import os
+from app.config import settings
+from app.core.hls_processor import (
+    SPRITE_COLUMNS,
+    SPRITE_MAX_TILES,
+    build_preview_track,
+    hls_processor,
+    is_remux_compatible,
+    process_video_background,
+    sprite_layout,
+)
+from app.database import SessionLocal
+from app.models import User, Video
+
+COMPLIANT_PROBE = {
+    "video_codec": "h264", "profile": "High", "pix_fmt": "yuv420p", "rotation": 0,
+    "width": 1280, "height": 720, "bit_rate": 2_000_000,
+    "has_audio": True, "audio_codec": "aac", "audio_channels": 2,
+}
+
+
+def test_remux_is_capped_at_the_configured_ladder():
+    assert is_remux_compatible(COMPLIANT_PROBE, ladder="240,480,720")
+    full_hd = {**COMPLIANT_PROBE, "width": 1920, "height": 1080}
+    # 1080p has a preset but is not in the default ladder: transcode down
+    assert not is_remux_compatible(full_hd, ladder="240,480,720")
+    assert is_remux_compatible(full_hd, ladder="480,1080")
+    assert not is_remux_compatible(COMPLIANT_PROBE, ladder="240,480")
+
+
+def test_remux_cap_follows_portrait_short_side():
+    portrait = {**COMPLIANT_PROBE, "width": 720, "height": 1280}
+    assert is_remux_compatible(portrait, ladder="240,480,720")
+
+
+def test_sprite_layout_grid(monkeypatch):
+    monkeypatch.setattr(settings, "HLS_PREVIEWS", True)
+    monkeypatch.setattr(settings, "HLS_PREVIEW_INTERVAL_SECONDS", 5)
+
+    layout = sprite_layout(123)
+    assert (layout["interval"], layout["count"], layout["columns"], layout["rows"]) == (5, 25, SPRITE_COLUMNS, 3)
+    assert layout["thumbnail_time"] == 1.0
+
+    short = sprite_layout(1.5)
+    assert (short["count"], short["columns"], short["rows"]) == (1, 1, 1)
+    assert short["thumbnail_time"] == 0.75
+
+
+def test_sprite_layout_long_video_widens_interval(monkeypatch):
+    monkeypatch.setattr(settings, "HLS_PREVIEWS", True)
+    monkeypatch.setattr(settings, "HLS_PREVIEW_INTERVAL_SECONDS", 5)
+
+    layout = sprite_layout(3 * 3600)
+    assert layout["count"] <= SPRITE_MAX_TILES
+    assert layout["interval"] * layout["count"] >= 3 * 3600
+
+
+def test_sprite_layout_disabled_or_unknown_duration(monkeypatch):
+    monkeypatch.setattr(settings, "HLS_PREVIEWS", True)
+    assert sprite_layout(None) is None
+    assert sprite_layout(0) is None
+    monkeypatch.setattr(settings, "HLS_PREVIEWS", False)
+    assert sprite_layout(60) is None
+
+
+def test_build_preview_track_cues(monkeypatch):
+    monkeypatch.setattr(settings, "HLS_PREVIEWS", True)
+    monkeypatch.setattr(settings, "HLS_PREVIEW_INTERVAL_SECONDS", 5)
+    layout = sprite_layout(3723.5)
+
+    track = build_preview_track(layout, 3723.5, sprite_url="sprite.jpg")
+    lines = track.split("\n")
+    assert lines[:2] == ["WEBVTT", ""]
+    cues = [lines[i:i + 2] for i in range(2, len(lines) - 1, 3)]
+    assert len(cues) == layout["count"]
+    assert cues[0] == ["00:00:00.000 --> 00:00:19.000", "sprite.jpg#xywh=0,0,160,90"]
+    # Second row of the grid
+    assert cues[SPRITE_COLUMNS][1] == "sprite.jpg#xywh=0,90,160,90"
+    # Last cue ends at the video's end (hours, milliseconds)
+    assert cues[-1][0].endswith(" --> 01:02:03.500")
+    last = layout["count"] - 1
+    x, y = (last % SPRITE_COLUMNS) * 160, (last // SPRITE_COLUMNS) * 90
+    assert cues[-1][1] == f"sprite.jpg#xywh={x},{y},160,90"
+
+
+def test_process_video_starts_from_an_empty_output_dir(db, tmp_path, monkeypatch):
+    user = User(username="student", password="x", role="student")
+    db.add(user)
+    db.flush()
+    video = Video(title="v", filepath="v.mp4", user_id=user.id, video_type='منهجي')
+    db.add(video)
+    db.commit()
+
+    monkeypatch.setattr(hls_processor, "output_base_dir", str(tmp_path / "hls"))
+    output_dir = hls_processor.get_video_output_dir(video.id)
+    # Leftovers of a previous run with a different ladder
+    os.makedirs(os.path.join(output_dir, "1080p"))
+    for name in ("master.m3u8", "1080p/playlist.m3u8", "1080p/segment_000.ts"):
+        open(os.path.join(output_dir, name), "w").close()
+    source = tmp_path / "source.mp4"
+    source.write_bytes(b"video")
+
+    seen = {}
+
+    async def fake_transcode(input_path, video_id, on_progress=None):
+        seen["streamable"] = hls_processor.is_streamable(video_id)
+        seen["files"] = os.listdir(output_dir) if os.path.exists(output_dir) else []
+        return {"status": "failed", "error": "stopped by test", "video_id": video_id}
+
+    async def no_thumbnail(input_path, video_id):
+        return None
+
+    monkeypatch.setattr(hls_processor, "transcode_to_hls", fake_transcode)
+    monkeypatch.setattr(hls_processor, "generate_thumbnail", no_thumbnail)
+    result = asyncio.run(process_video_background(str(source), video.id, SessionLocal, cleanup_source=False))
+
+    assert result["status"] == "failed"
+    assert seen == {"streamable": False, "files": []}
@@ -0,0 +1,120 @@
+"""
+Buffered like counters: flush and cross-worker reconciliation
+"""
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.api.videos import like_video
+from app.core import like_counter as like_counter_module
+from app.core.like_counter import LikeCounterBuffer, like_counter
+from app.database import SessionLocal
+from app.models import User, Video, VideoLike
+
+
+@pytest.fixture
+def videos(db):
+    users = [User(username=f"u{i}", password="x", role="student") for i in range(3)]
+    db.add_all(users)
+    db.flush()
+    clips = [Video(title=f"v{i}", filepath=f"v{i}.mp4", user_id=users[0].id, video_type='منهجي') for i in range(2)]
+    db.add_all(clips)
+    db.commit()
+    return users, clips
+
+
+def likes_count(db, video):
+    db.expire_all()
+    return db.get(Video, video.id).likes_count
+
+
+def test_flush_applies_and_clears_deltas(db, videos):
+    _, (first, second) = videos
+    buffer = LikeCounterBuffer()
+    buffer.add(first.id, 1)
+    buffer.add(first.id, 1)
+    buffer.add(second.id, 1)
+    buffer.add(second.id, -1)
+
+    assert buffer.flush(db) == 1  # second nets to zero
+    assert (likes_count(db, first), likes_count(db, second)) == (2, 0)
+    assert buffer.pending(first.id) == 0
+    assert buffer.flush(db) == 0
+
+
+def test_failed_flush_keeps_deltas(db, videos, monkeypatch):
+    _, (first, _) = videos
+    buffer = LikeCounterBuffer()
+    buffer.add(first.id, 1)
+
+    def fail():
+        raise RuntimeError("database is gone")
+    monkeypatch.setattr(db, "commit", fail)
+    with pytest.raises(RuntimeError):
+        buffer.flush(db)
+    monkeypatch.undo()
+
+    assert buffer.pending(first.id) == 1
+    buffer.flush(db)
+    assert likes_count(db, first) == 1
+
+
+def test_like_video_buffers_the_delta(db, videos):
+    (user, _, _), (first, _) = videos
+    liked = asyncio.run(like_video(first.id, current_user=user, db=db))
+    assert (liked["user_likes"], liked["likes_count"]) == (True, 1)
+    assert like_counter.pending(first.id) == 1
+
+    unliked = asyncio.run(like_video(first.id, current_user=user, db=db))
+    assert (unliked["user_likes"], unliked["likes_count"]) == (False, 0)
+    assert db.query(VideoLike).count() == 0
+    like_counter.flush(db)
+    assert likes_count(db, first) == 0
+
+
+def test_reconcile_repairs_lost_deltas(db, videos):
+    users, (first, second) = videos
+    # Likes committed by a worker that crashed before flushing
+    db.add_all([VideoLike(video_id=first.id, user_id=user.id) for user in users])
+    second.likes_count = 5
+    db.commit()
+
+    assert LikeCounterBuffer().reconcile(db, settle_seconds=0) == 2
+    assert (likes_count(db, first), likes_count(db, second)) == (3, 0)
+
+
+def test_reconcile_skips_likes_buffered_by_another_worker(db, videos, monkeypatch):
+    users, (first, second) = videos
+    this_worker, other_worker = LikeCounterBuffer(), LikeCounterBuffer()
+    # Liked through the other worker, which has not flushed yet
+    db.add(VideoLike(video_id=first.id, user_id=users[0].id))
+    db.commit()
+    other_worker.add(first.id, 1)
+    # Lost delta on the second video
+    db.add(VideoLike(video_id=second.id, user_id=users[0].id))
+    db.commit()
+
+    def settle(seconds):
+        # The other worker flushes while reconcile waits
+        other_db = SessionLocal()
+        try:
+            other_worker.flush(other_db)
+        finally:
+            other_db.close()
+    monkeypatch.setattr(like_counter_module, "time", SimpleNamespace(sleep=settle))
+
+    assert this_worker.reconcile(db, settle_seconds=1) == 1
+    assert (likes_count(db, first), likes_count(db, second)) == (1, 1)
+
+
+def test_reconcile_skips_pending_local_deltas(db, videos, monkeypatch):
+    users, (first, _) = videos
+    buffer = LikeCounterBuffer()
+    db.add(VideoLike(video_id=first.id, user_id=users[0].id))
+    db.commit()
+
+    # Committed before the first snapshot, buffered just after it
+    monkeypatch.setattr(like_counter_module, "time", SimpleNamespace(sleep=lambda seconds: buffer.add(first.id, 1)))
+    assert buffer.reconcile(db, settle_seconds=1) == 0
+
+    buffer.flush(db)
+    assert likes_count(db, first) == 1
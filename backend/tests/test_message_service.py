@@ -0,0 +1,129 @@
+"""
+Conversation summaries maintained alongside messages
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+import pytest
+from app.models import ConversationSummary, User
+from app.services.message_service import (
+    PREVIEW_LENGTH,
+    conversation_inbox,
+    decrement_unread,
+    mark_conversation_read,
+    record_messages,
+)
+
+T0 = datetime(2024, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def users(db):
+    people = [User(username=name, password="x", role=role) for name, role in
+              (("low", "student"), ("high", "admin"), ("other", "student"))]
+    db.add_all(people)
+    db.commit()
+    return [user.id for user in people]
+
+
+def message(message_id, sender_id, receiver_id, content="hi", minutes=0):
+    return {
+        "id": message_id, "sender_id": sender_id, "receiver_id": receiver_id,
+        "content": content, "timestamp": T0 + timedelta(minutes=minutes)
+    }
+
+
+def summary(db, a, b):
+    db.expire_all()
+    return db.query(ConversationSummary).filter(
+        ConversationSummary.user_low_id == min(a, b),
+        ConversationSummary.user_high_id == max(a, b)
+    ).one()
+
+
+def test_record_messages_folds_a_batch_per_pair(db, users):
+    low, high, other = users
+    record_messages(db, [
+        message(1, low, high, "first", 0),
+        message(3, high, low, "third", 2),
+        message(2, low, high, "second", 1),
+        message(4, other, high, "elsewhere", 3),
+    ])
+    db.commit()
+
+    pair = summary(db, low, high)
+    assert (pair.unread_low, pair.unread_high) == (1, 2)
+    assert (pair.last_message_id, pair.last_message_preview, pair.last_sender_id) == (3, "third", high)
+    assert pair.last_message_at == T0 + timedelta(minutes=2)
+    assert db.query(ConversationSummary).count() == 2
+
+
+def test_record_messages_upsert_keeps_newest_when_commits_arrive_out_of_order(db, users):
+    low, high, _ = users
+    record_messages(db, [message(10, low, high, "newer", 5)])
+    db.commit()
+    # A concurrent sender's older message commits afterwards
+    record_messages(db, [message(9, high, low, "older", 4)])
+    db.commit()
+
+    pair = summary(db, low, high)
+    assert (pair.last_message_id, pair.last_message_preview, pair.last_sender_id) == (10, "newer", low)
+    assert (pair.unread_low, pair.unread_high) == (1, 1)
+
+    record_messages(db, [message(11, high, low, "x" * (PREVIEW_LENGTH + 50), 6)])
+    db.commit()
+    pair = summary(db, low, high)
+    assert pair.last_message_id == 11
+    assert pair.last_message_preview == "x" * PREVIEW_LENGTH
+    assert (pair.unread_low, pair.unread_high) == (2, 1)
+
+
+def test_message_to_self_is_never_unread(db, users):
+    low, _, _ = users
+    record_messages(db, [message(1, low, low, "note")])
+    db.commit()
+    pair = summary(db, low, low)
+    assert (pair.unread_low, pair.unread_high, pair.last_message_preview) == (0, 0, "note")
+
+
+def test_decrement_unread_clamps_at_zero(db, users):
+    low, high, other = users
+    record_messages(db, [message(i, high, low) for i in range(1, 4)] + [message(4, other, low)])
+    db.commit()
+
+    decrement_unread(db, low, Counter({high: 2}))
+    db.commit()
+    assert summary(db, low, high).unread_low == 1
+
+    # More reads than counted (e.g. a summary rebuilt in between) never go negative
+    decrement_unread(db, low, Counter({high: 5, other: 1}))
+    db.commit()
+    assert summary(db, low, high).unread_low == 0
+    assert summary(db, low, other).unread_low == 0
+    # The other side of the conversation is untouched
+    record_messages(db, [message(5, low, high)])
+    db.commit()
+    decrement_unread(db, low, Counter({high: 1}))
+    db.commit()
+    assert summary(db, low, high).unread_high == 1
+
+
+def test_mark_conversation_read_resets_only_the_reader(db, users):
+    low, high, _ = users
+    record_messages(db, [message(1, low, high), message(2, high, low)])
+    db.commit()
+    mark_conversation_read(db, high, low)
+    db.commit()
+    pair = summary(db, low, high)
+    assert (pair.unread_low, pair.unread_high) == (1, 0)
+
+
+def test_conversation_inbox_orders_by_last_activity(db, users):
+    low, high, other = users
+    record_messages(db, [message(1, other, high, "older", 0), message(2, low, high, "newer", 1)])
+    db.commit()
+
+    query, order = conversation_inbox(db, high, "student")
+    rows = query.order_by(*(column.desc() for column, _ in order)).all()
+    assert [(row.User.id, row.unread_count, row.last_message_preview) for row in rows] == [
+        (low, 1, "newer"), (other, 1, "older")
+    ]
@@ -0,0 +1,77 @@
+"""
+Transcode queue: deduplication and stale job recovery
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.core.transcode_queue import claim_next_job, enqueue_transcode, requeue_stale_jobs
+from app.models import TranscodeJob, User, Video
+
+
+@pytest.fixture
+def video(db):
+    user = User(username="student", password="x", role="student")
+    db.add(user)
+    db.flush()
+    video = Video(title="v", filepath="v.mp4", user_id=user.id, video_type='منهجي', processing_status='processing')
+    db.add(video)
+    db.commit()
+    return video
+
+
+def add_running_job(db, video, attempts, heartbeat_age=3600, worker="dead:1"):
+    job = TranscodeJob(
+        video_id=video.id, input_path="v.mp4", status='running', attempts=attempts, max_attempts=3,
+        locked_by=worker, heartbeat_at=datetime.utcnow() - timedelta(seconds=heartbeat_age)
+    )
+    db.add(job)
+    db.commit()
+    return job
+
+
+def test_stale_job_with_attempts_left_is_requeued(db, video):
+    job = add_running_job(db, video, attempts=1)
+
+    assert requeue_stale_jobs(db) == 1
+    db.refresh(job)
+    assert (job.status, job.locked_by, job.attempts) == ('queued', None, 1)
+
+
+def test_stale_job_on_last_attempt_fails(db, video):
+    job = add_running_job(db, video, attempts=3)
+
+    assert requeue_stale_jobs(db) == 0
+    db.refresh(job)
+    db.refresh(video)
+    assert job.status == 'failed'
+    assert job.finished_at is not None and job.last_error
+    assert video.processing_status == 'failed'
+
+
+def test_live_job_is_left_alone(db, video):
+    job = add_running_job(db, video, attempts=3, heartbeat_age=0)
+
+    assert requeue_stale_jobs(db) == 0
+    db.refresh(job)
+    assert job.status == 'running'
+
+
+def test_shutdown_release_does_not_count_the_attempt(db, video):
+    job = add_running_job(db, video, attempts=3, heartbeat_age=0, worker="me:1")
+
+    assert requeue_stale_jobs(db, "me:1") == 1
+    db.refresh(job)
+    assert (job.status, job.attempts) == ('queued', 2)
+
+
+def test_enqueue_reuses_queued_and_running_jobs(db, video):
+    queued = enqueue_transcode(db, video.id, "v.mp4")
+    db.commit()
+    assert enqueue_transcode(db, video.id, "v.mp4", priority=5) is queued
+    db.commit()
+    assert queued.priority == 5
+
+    running = claim_next_job(db, "me:1")
+    assert running.id == queued.id
+    assert enqueue_transcode(db, video.id, "v.mp4").id == running.id
+    db.commit()
+    assert db.query(TranscodeJob).count() == 1
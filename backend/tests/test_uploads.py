@@ -0,0 +1,99 @@
+"""
+Resumable upload completion
+"""
+import asyncio
+import hashlib
+import os
+import time
+import pytest
+from fastapi import HTTPException
+from app.api import uploads
+from app.api.uploads import complete_upload_session
+from app.config import settings
+from app.core.chunk_store import chunk_store
+from app.database import SessionLocal
+from app.models import TranscodeJob, UploadSession, User, Video
+
+CONTENT = b"0123456789"
+CHUNK_SIZE = 4
+
+
+@pytest.fixture
+def upload(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setattr(chunk_store, "base_dir", str(tmp_path / "resumable"))
+    monkeypatch.setattr(uploads, "get_video_duration", lambda path: 10.0)
+
+    user = User(username="student", password="x", role="student")
+    db.add(user)
+    db.flush()
+    session = UploadSession(
+        id="u1", user_id=user.id, filename="clip.mp4", title="Clip", video_type='منهجي',
+        total_size=len(CONTENT), chunk_size=CHUNK_SIZE, status='active'
+    )
+    db.add(session)
+    db.commit()
+
+    async def body(data):
+        yield data
+
+    for index in range(session.chunk_count):
+        data = CONTENT[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+        asyncio.run(chunk_store.write_chunk(
+            "u1", index, body(data), len(data), hashlib.sha256(data).hexdigest()
+        ))
+    return user
+
+
+async def complete(user):
+    db = SessionLocal()
+    try:
+        return await complete_upload_session("u1", current_user=user, db=db)
+    except HTTPException as e:
+        return e
+    finally:
+        db.close()
+
+
+def test_concurrent_completions_create_one_video(db, upload, monkeypatch):
+    def slow_duration(path):
+        time.sleep(0.2)  # the first completion is still assembling
+        return 10.0
+    monkeypatch.setattr(uploads, "get_video_duration", slow_duration)
+
+    async def main():
+        return await asyncio.gather(complete(upload), complete(upload))
+    first, second = asyncio.run(main())
+
+    assert first["status"] == "success"
+    assert isinstance(second, HTTPException) and second.status_code == 409
+    assert db.query(Video).count() == 1
+    assert db.query(TranscodeJob).count() == 1
+
+    db.expire_all()
+    session = db.query(UploadSession).one()
+    assert (session.status, session.video_id) == ('completed', first["video_id"])
+    assert not os.path.exists(chunk_store.session_dir("u1"))
+    video = db.query(Video).one()
+    with open(os.path.join(settings.UPLOAD_FOLDER, video.filepath), "rb") as f:
+        assert f.read() == CONTENT
+
+    # Completing again returns the same video
+    again = asyncio.run(complete(upload))
+    assert again["video_id"] == first["video_id"]
+
+
+def test_failed_completion_releases_the_claim(db, upload, monkeypatch):
+    monkeypatch.setattr(uploads, "get_video_duration", lambda path: None)
+    error = asyncio.run(complete(upload))
+
+    assert isinstance(error, HTTPException) and error.status_code == 400
+    db.expire_all()
+    assert db.query(UploadSession).one().status == 'active'
+    assert db.query(Video).count() == 0
+    assert len(chunk_store.received_chunks("u1")) == 3
+    assert not [name for _, _, files in os.walk(settings.UPLOAD_FOLDER) for name in files if name.endswith(".part")]
+
+    # The client can retry
+    monkeypatch.setattr(uploads, "get_video_duration", lambda path: 10.0)
+    assert asyncio.run(complete(upload))["status"] == "success"
@@ -0,0 +1,144 @@
+"""
+Content-addressed assets shared by identical uploads
+"""
+import asyncio
+import os
+import pytest
+from app.api import hls
+from app.config import settings
+from app.core.hls_processor import hls_processor
+from app.core.video_assets import attach_asset, complete_asset, release_asset
+from app.models import TranscodeJob, User, Video, VideoAsset
+
+SHA = "a" * 64
+
+
+@pytest.fixture
+def owner(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(hls_processor, "output_base_dir", str(tmp_path / "hls"))
+    monkeypatch.setattr(settings, "UPLOAD_FOLDER", str(tmp_path))
+    (tmp_path / "first.mp4").write_bytes(b"0123456789")
+    user = User(username="teacher", password="x", role="admin")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def upload(db, user, title="Clip"):
+    """A newly uploaded video attached to the asset of its content"""
+    video = Video(title=title, filepath=f"{title}.mp4", user_id=user.id, video_type='منهجي', is_approved=True)
+    db.add(video)
+    db.flush()
+    needs_transcode = attach_asset(db, video, SHA, 10, f"{title}.mp4")
+    db.commit()
+    return video, needs_transcode
+
+
+def test_identical_uploads_share_one_asset(db, owner):
+    first, first_transcodes = upload(db, owner, "first")
+    second, second_transcodes = upload(db, owner, "second")
+
+    assert (first_transcodes, second_transcodes) == (True, False)
+    asset = db.query(VideoAsset).one()
+    assert (asset.ref_count, asset.output_video_id, asset.status) == (2, first.id, 'pending')
+    assert second.asset_id == asset.id
+    assert second.filepath == "first.mp4"
+    assert second.processing_status == 'pending'
+
+
+def test_complete_asset_propagates_to_every_video(db, owner):
+    first, _ = upload(db, owner, "first")
+    second, _ = upload(db, owner, "second")
+
+    # Only the video owning the output records the outcome
+    complete_asset(db, second)
+    assert db.query(VideoAsset).one().status == 'pending'
+
+    first.processing_status = 'ready'
+    first.hls_path = f"/app/hls/{first.id}/master.m3u8"
+    first.thumbnail_path = f"/app/hls/{first.id}/thumbnail.jpg"
+    complete_asset(db, first)
+    db.commit()
+    db.expire_all()
+
+    assert db.query(VideoAsset).one().status == 'ready'
+    assert (second.processing_status, second.hls_path, second.processing_progress) == (
+        'ready', first.hls_path, 100
+    )
+    # A later upload reuses the output right away
+    third, needs_transcode = upload(db, owner, "third")
+    assert not needs_transcode
+    assert (third.processing_status, third.hls_path) == ('ready', first.hls_path)
+
+
+def test_release_asset_deletes_files_with_the_last_reference(db, owner):
+    first, _ = upload(db, owner, "first")
+    second, _ = upload(db, owner, "second")
+    first.processing_status = 'ready'
+    complete_asset(db, first)
+    db.commit()
+
+    assert release_asset(db, second) == {"source_path": None, "output_video_id": None}
+    db.delete(second)
+    db.commit()
+    assert db.query(VideoAsset).one().ref_count == 1
+
+    assert release_asset(db, first) == {"source_path": "first.mp4", "output_video_id": first.id}
+    db.delete(first)
+    db.commit()
+    assert db.query(VideoAsset).count() == 0
+
+
+def test_deleting_the_owner_of_a_pending_transcode_hands_it_over(db, owner):
+    first, _ = upload(db, owner, "first")
+    second, _ = upload(db, owner, "second")
+    third, _ = upload(db, owner, "third")
+
+    files = release_asset(db, first)
+    db.delete(first)
+    db.commit()
+
+    # The owner's partial output goes, the source stays for the successor
+    assert files == {"source_path": None, "output_video_id": first.id}
+    asset = db.query(VideoAsset).one()
+    assert (asset.ref_count, asset.output_video_id) == (2, second.id)
+    job = db.query(TranscodeJob).one()
+    assert (job.video_id, job.status, job.input_path) == (
+        second.id, 'queued', os.path.join(settings.UPLOAD_FOLDER, "first.mp4")
+    )
+
+
+def test_dedup_upload_of_a_cold_asset_is_rehydrated_on_play(db, owner, monkeypatch):
+    first, _ = upload(db, owner, "first")
+    first.processing_status = 'ready'
+    first.asset.status = 'ready'
+    first.storage_tier = 'cold'
+    db.commit()
+
+    second, needs_transcode = upload(db, owner, "second")
+    assert not needs_transcode
+    assert (second.processing_status, second.storage_tier) == ('ready', 'cold')
+
+    restored = []
+
+    def rehydrate(output_id):
+        output_dir = hls_processor.get_video_output_dir(output_id)
+        os.makedirs(output_dir)
+        with open(os.path.join(output_dir, "master.m3u8"), "w") as f:
+            f.write("#EXTM3U\n720p/playlist.m3u8\n")
+        restored.append(output_id)
+    monkeypatch.setattr(hls, "rehydrate_output", rehydrate)
+
+    # A video attached before its tier was copied still finds the cold tree
+    second.storage_tier = 'hot'
+    db.commit()
+    response = asyncio.run(hls.get_playlist(second.id, current_user=owner, db=db))
+
+    assert restored == [first.id]
+    assert f"/api/hls/{first.id}/720p/playlist.m3u8?token=" in response.body.decode()
+    db.expire_all()
+    assert {video.storage_tier for video in db.query(Video)} == {'restored'}
+
+    # Already on disk: no second download
+    asyncio.run(hls.get_playlist(first.id, current_user=owner, db=db))
+    assert restored == [first.id]
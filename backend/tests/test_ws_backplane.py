@@ -0,0 +1,233 @@
+"""
+WebSocket backplane and cross-worker presence of ConnectionManager
+"""
+import asyncio
+import fcntl
+import json
+from types import SimpleNamespace
+from app.api.websocket import ConnectionManager
+from app.config import settings
+from app.core import ws_backplane
+from app.core.ws_backplane import InMemoryBackplane, LocalBrokerBackplane
+
+
+class SharedBus:
+    """Several in-process 'workers' on one backplane (like the local broker)"""
+
+    def __init__(self):
+        self.handlers = []
+
+    def backplane(self):
+        bus = self
+
+        class Member:
+            async def start(self, handler):
+                self.handler = handler
+                bus.handlers.append(handler)
+
+            async def publish(self, message):
+                # Round-trip through JSON like the real transports
+                for handler in list(bus.handlers):
+                    await handler(json.loads(json.dumps(message)))
+
+            async def stop(self):
+                bus.handlers.remove(self.handler)
+
+        return Member()
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+
+def student(user_id):
+    return SimpleNamespace(id=user_id, role="student", class_name="5", section_name="A")
+
+
+def test_in_memory_backplane_delivers_to_its_handler():
+    received = []
+
+    async def handler(message):
+        received.append(message)
+
+    async def main():
+        backplane = InMemoryBackplane()
+        await backplane.publish({"kind": "ignored"})  # not started yet
+        await backplane.start(handler)
+        await backplane.publish({"kind": "deliver"})
+        await backplane.stop()
+        await backplane.publish({"kind": "after stop"})
+
+    asyncio.run(main())
+    assert received == [{"kind": "deliver"}]
+
+
+def test_presence_and_delivery_across_workers():
+    async def main():
+        bus = SharedBus()
+        a, b = ConnectionManager(bus.backplane()), ConnectionManager(bus.backplane())
+        await a.start()
+        await b.start()
+
+        socket = FakeSocket()
+        await b.connect(socket, student(7))
+        assert a.is_online(7) and 7 in a.get_online_users()
+
+        # A message sent from worker A reaches the socket held by worker B
+        await a.send_personal_message({"type": "ping"}, 7)
+        await asyncio.sleep(0.01)  # let the socket's writer task run
+        assert socket.sent == [{"type": "ping"}]
+
+        await b.disconnect(socket, 7)
+        assert not a.is_online(7)
+
+        # A worker starting later learns the users already online
+        await b.connect(FakeSocket(), student(8))
+        c = ConnectionManager(bus.backplane())
+        await c.start()
+        assert c.is_online(8)
+
+        await b.stop()
+        assert not a.is_online(8) and not c.is_online(8)
+        await a.stop()
+        await c.stop()
+
+    asyncio.run(main())
+
+
+def test_presence_sync_replaces_deltas():
+    async def main():
+        manager = ConnectionManager(InMemoryBackplane())
+        await manager._on_backplane_message({"kind": "presence", "worker": "w1", "online": [1, 2]})
+        await manager._on_backplane_message({"kind": "presence", "worker": "w1", "offline": [1]})
+        await manager._on_backplane_message({"kind": "presence", "worker": "w2", "online": [3]})
+        assert sorted(manager.get_online_users()) == [2, 3]
+
+        # A full sync of w1 overrides whatever deltas were missed
+        await manager._on_backplane_message({"kind": "presence_sync", "worker": "w1", "users": [4]})
+        assert sorted(manager.get_online_users()) == [3, 4]
+
+        # Messages of this worker about itself are ignored
+        await manager._on_backplane_message({"kind": "presence", "worker": manager.worker_id, "online": [9]})
+        assert not manager.is_online(9)
+
+    asyncio.run(main())
+
+
+def test_silent_worker_presence_expires(monkeypatch):
+    monkeypatch.setattr(settings, "WS_PRESENCE_SYNC_SECONDS", 0.02)
+
+    async def main():
+        bus = SharedBus()
+        a = ConnectionManager(bus.backplane())
+        await a.start()
+        # A worker that announced a user and then died without worker_stopped
+        await a._on_backplane_message({"kind": "presence", "worker": "dead", "online": [5]})
+        assert a.is_online(5)
+
+        await asyncio.sleep(0.2)
+        assert not a.is_online(5)
+        assert "dead" not in a.remote_seen
+        await a.stop()
+
+    asyncio.run(main())
+
+
+async def wait_until(condition, timeout=2.0):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def test_local_broker_drops_oversized_frames_and_lagging_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(ws_backplane, "MAX_FRAME_BYTES", 1024)
+    monkeypatch.setattr(ws_backplane, "MAX_CLIENT_BUFFER_BYTES", 64 * 1024)
+    path = str(tmp_path / "bus.sock")
+
+    async def main():
+        received = {"a": [], "b": []}
+
+        async def collect(name):
+            async def handler(message):
+                received[name].append(message)
+            return handler
+
+        a, b = LocalBrokerBackplane(path), LocalBrokerBackplane(path)
+        await a.start(await collect("a"))  # becomes the broker
+        await b.start(await collect("b"))
+
+        # Too large for a frame: this worker only
+        await b.publish({"n": "x" * 2048})
+        assert received["b"] == [{"n": "x" * 2048}]
+
+        # A worker sending an oversized frame is disconnected, the others stay
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(b"x" * 4096 + b"\n")
+        await asyncio.wait_for(reader.read(), timeout=2)
+        writer.close()
+
+        # A worker that stops reading is dropped instead of buffered forever
+        _, lagging = await asyncio.open_unix_connection(path)
+        await wait_until(lambda: len(a._broker_clients) == 3)
+        for n in range(2000):
+            await b.publish({"n": n, "pad": "y" * 512})
+            await asyncio.sleep(0)  # the healthy workers keep reading
+        await wait_until(lambda: len(a._broker_clients) == 2)
+        lagging.close()
+
+        await b.publish({"n": "last"})
+        await wait_until(lambda: received["a"][-1:] == [{"n": "last"}])
+        assert [m["n"] for m in received["a"]] == list(range(2000)) + ["last"]
+        await b.stop()
+        await a.stop()
+
+    asyncio.run(main())
+
+
+def test_worker_reconnects_after_an_oversized_frame(tmp_path, monkeypatch):
+    monkeypatch.setattr(ws_backplane, "MAX_FRAME_BYTES", 1024)
+    monkeypatch.setattr(ws_backplane, "RECONNECT_DELAY", 0.01)
+    path = str(tmp_path / "bus.sock")
+
+    async def main():
+        # Hold the broker lock and play a broker whose first frame is too large
+        lock_file = open(path + ".lock", "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        connections = []
+
+        async def serve(reader, writer):
+            connections.append(writer)
+            if len(connections) == 1:
+                writer.write(b'{"n": "' + b"x" * 4096 + b'"}\n{"n": 1}\n')
+            else:
+                writer.write(b'{"n": 2}\n')
+            await writer.drain()
+
+        server = await asyncio.start_unix_server(serve, path=path)
+        received = []
+
+        async def handler(message):
+            received.append(message)
+
+        worker = LocalBrokerBackplane(path)
+        await worker.start(handler)
+        await wait_until(lambda: received)
+        assert received == [{"n": 2}]
+        assert len(connections) == 2
+        assert not worker._task.done()
+
+        await worker.stop()
+        server.close()
+        lock_file.close()
+
+    asyncio.run(main())
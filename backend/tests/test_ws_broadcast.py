@@ -0,0 +1,143 @@
+"""
+Broadcast audiences and per-socket send queues
+"""
+import asyncio
+import json
+from app.config import settings
+from app.core.ws_broadcast import AudienceIndex, SocketSender, audience_index, serialize_message
+from app.models import User
+
+
+def test_audience_index_update_and_remove():
+    index = AudienceIndex(refresh_seconds=300)
+    index.update_user(1, "student", "5", "A")
+    index.update_user(2, "student", "5", "B")
+    index.update_user(3, "admin", None, None)
+
+    assert index.members(class_name="5") == {1, 2}
+    assert index.members(class_name="5", section_name="A") == {1}
+    assert index.members(role="student") == {1, 2}
+    assert index.members(role="admin") == {3}
+    assert index.members() == set()
+
+    # Moving a student leaves no trace in the old class and section
+    index.update_user(1, "student", "6", "A")
+    assert index.members(class_name="5") == {2}
+    assert index.members(class_name="5", section_name="A") == set()
+    assert index.members(class_name="6", section_name="A") == {1}
+
+    index.remove_user(2)
+    index.remove_user(99)  # unknown ids are ignored
+    assert index.members(class_name="5") == set()
+    assert index.members(role="student") == {1}
+
+
+def test_members_returns_a_copy():
+    index = AudienceIndex(refresh_seconds=300)
+    index.update_user(1, "student", "5", "A")
+    index.members(class_name="5").add(2)
+    assert index.members(class_name="5") == {1}
+
+
+def test_load_replaces_the_index(db):
+    db.add_all([
+        User(username="a", password="x", role="student", class_name="5", section_name="A"),
+        User(username="b", password="x", role="student", class_name="6", section_name="B"),
+    ])
+    db.commit()
+    index = AudienceIndex(refresh_seconds=300)
+    index.update_user(999, "student", "5", "A")
+    assert index.needs_load()
+
+    index.load(db)
+    assert not index.needs_load()
+    assert len(index.members(role="student")) == 2
+    assert 999 not in index.members(class_name="5")
+
+
+def test_committed_user_changes_update_the_global_index(db):
+    user = User(username="moving", password="x", role="student", class_name="5", section_name="A")
+    db.add(user)
+    db.commit()
+    assert user.id in audience_index.members(class_name="5", section_name="A")
+
+    user.class_name = "6"
+    db.flush()
+    # Not applied before the commit, and dropped on rollback
+    assert user.id in audience_index.members(class_name="5")
+    db.rollback()
+    assert user.id in audience_index.members(class_name="5")
+
+    user.class_name = "6"
+    db.commit()
+    assert user.id not in audience_index.members(class_name="5")
+    assert user.id in audience_index.members(class_name="6", section_name="A")
+
+    user_id = user.id
+    db.delete(user)
+    db.commit()
+    assert user_id not in audience_index.members(role="student")
+
+
+class BlockedSocket:
+    """A client that never reads: every send waits until released"""
+
+    def __init__(self):
+        self.sent = []
+        self.release = asyncio.Event()
+
+    async def send_text(self, text):
+        await self.release.wait()
+        self.sent.append(json.loads(text))
+
+
+def test_socket_sender_bounded_queue(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", 2)
+
+    async def main():
+        socket = BlockedSocket()
+        failures = []
+        sender = SocketSender(socket, failures.append)
+        await asyncio.sleep(0)
+
+        assert sender.enqueue(serialize_message({"n": 0}))
+        await asyncio.sleep(0)  # the writer takes it and blocks on the socket
+        assert sender.enqueue(serialize_message({"n": 1}))
+        assert sender.enqueue(serialize_message({"n": 2}))
+        assert not sender.enqueue(serialize_message({"n": 3}))
+        assert sender.dropped == 1
+
+        socket.release.set()
+        await asyncio.sleep(0.01)
+        assert socket.sent == [{"n": 0}, {"n": 1}, {"n": 2}]
+        assert failures == []
+        sender.close()
+
+    asyncio.run(main())
+
+
+def test_socket_sender_send_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_TIMEOUT_SECONDS", 0.01)
+
+    async def main():
+        socket = BlockedSocket()
+        failures = []
+        sender = SocketSender(socket, failures.append)
+        sender.enqueue(serialize_message({"n": 0}))
+        await asyncio.sleep(0.1)
+        assert failures == [socket]
+
+    asyncio.run(main())
+
+
+def test_socket_sender_close_while_sending():
+    async def main():
+        socket = BlockedSocket()
+        sender = SocketSender(socket, lambda ws: None)
+        sender.enqueue(serialize_message({"n": 0}))
+        await asyncio.sleep(0)
+        sender.close()
+        await asyncio.sleep(0)
+        assert sender._task.done()
+
+    asyncio.run(main())